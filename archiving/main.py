@@ -0,0 +1,147 @@
+from aws_lambda_powertools import (
+    Logger,
+    Metrics,
+)
+from aws_lambda_powertools.metrics import (
+    MetricUnit,
+)
+from datetime import (
+    datetime,
+    timezone,
+)
+from gzip import (
+    compress,
+)
+from jobs_store.client import (
+    create_client,
+)
+from jobs_store.logs import (
+    LOG_LEVEL,
+    Payload,
+    sample_log_level,
+)
+from jobs_store.metrics import (
+    MetricsBuffer,
+)
+from jobs_store.records import (
+    decode_record,
+)
+from jobs_store.tracing import (
+    create_tracer,
+)
+from json import (
+    dumps,
+)
+from os import (
+    getenv,
+)
+from typing import (
+    List,
+)
+
+ARCHIVE_BUCKET_NAME = getenv("ARCHIVE_BUCKET_NAME")
+ARCHIVE_PREFIX = getenv("ARCHIVE_PREFIX", "jobs/")
+CONSUMER_ID = getenv("CONSUMER_ID", "archiving")
+logger = Logger(
+    level=LOG_LEVEL,
+    service="archiving",
+)
+metrics = Metrics(
+    namespace=getenv("METRICS_NAMESPACE", "AsynchronousEventProcessing"),
+    service="archiving",
+)
+metrics_buffer = MetricsBuffer()
+s3 = None
+tracer = create_tracer(service="archiving")
+
+
+def get_s3():
+    """
+    Creates the S3 client on first use.
+    """
+    global s3
+
+    if s3 is None:
+        s3 = create_client("s3")
+
+    return s3
+
+
+def is_expired_record(record: dict) -> bool:
+    """
+    Returns whether the record is the deletion of an item by TTL, rather
+    than by a client.
+    """
+    user_identity = record.get("userIdentity", {})
+
+    return record["eventName"] == "REMOVE" and \
+        user_identity.get("type") == "Service" and \
+        user_identity.get("principalId") == "dynamodb.amazonaws.com"
+
+
+def get_archive_key(records: List[dict]) -> str:
+    """
+    Returns the key of the archive of the batch, made of the date of its
+    first record and its sequence number, so that a retried batch
+    overwrites its own archive.
+    """
+    first_record = records[0]["dynamodb"]
+    created = datetime.fromtimestamp(
+        first_record["ApproximateCreationDateTime"], tz=timezone.utc)
+
+    return "".join([
+        ARCHIVE_PREFIX,
+        created.strftime("%Y/%m/%d/"),
+        first_record["SequenceNumber"],
+        ".jsonl.gz",
+    ])
+
+
+@metrics.log_metrics
+def handler(event, context) -> None:
+    """
+    The old images of the jobs expired by TTL in the batch, read from the
+    DynamoDB stream or from the Kinesis data stream of the table, are
+    written, one JSON line per job in the DynamoDB wire format, to a single
+    gzip compressed object. When the write fails, the error is raised so
+    that the whole batch is retried.
+    """
+    sample_log_level(logger)
+    logger.debug("Context %s", context)
+    logger.debug("Event %s", Payload(event))
+
+    metrics_buffer.reset()
+    metrics_buffer.add_metric(
+        "BatchSize", MetricUnit.Count, len(event["Records"]))
+
+    # Records of the Kinesis data stream of the table are decoded first
+    records = [
+        record
+        for record in map(decode_record, event["Records"])
+        if is_expired_record(record)
+    ]
+
+    if records:
+        body = compress("".join(
+            dumps(record["dynamodb"]["OldImage"]) + "\n"
+            for record in records
+        ).encode())
+        key = get_archive_key(records)
+
+        with metrics_buffer.duration("ArchiveDuration"), \
+                tracer.subsegment("put_archive", jobs=len(records)):
+            get_s3().put_object(
+                Body=body,
+                Bucket=ARCHIVE_BUCKET_NAME,
+                ContentEncoding="gzip",
+                ContentType="application/x-ndjson",
+                Key=key,
+            )
+
+        logger.info(f"Archived {len(records)} jobs to {key}")
+
+        metrics_buffer.add_metric("ArchiveSize", MetricUnit.Bytes, len(body))
+
+    metrics_buffer.add_metric(
+        "ArchivedJobs", MetricUnit.Count, len(records))
+    metrics_buffer.publish(metrics, CONSUMER_ID)
@@ -1,144 +1,409 @@
-from awslambdaric.lambda_context import (
-    LambdaContext,
+from __future__ import (
+    annotations,
 )
 from aws_lambda_powertools import (
     Logger,
+    Metrics,
 )
-from boto3 import (
-    client,
+from aws_lambda_powertools.metrics import (
+    MetricUnit,
 )
-from boto3.dynamodb.types import (
-    TypeDeserializer,
-    TypeSerializer,
+from concurrent.futures import (
+    ThreadPoolExecutor,
 )
 from json import (
     loads,
 )
+from jobs_store.client import (
+    create_client,
+)
+from jobs_store.base import (
+    JobStore,
+)
+from jobs_store.codec import (
+    ConsumerStatus,
+    Job,
+    decode_job,
+)
+from jobs_store.factory import (
+    create_completion_notifier,
+    create_job_store,
+)
+from jobs_store.logs import (
+    LOG_LEVEL,
+    Payload,
+    sample_log_level,
+)
+from jobs_store.metrics import (
+    MetricsBuffer,
+)
+from jobs_store.notifications import (
+    LazyCompletionNotifier,
+)
+from jobs_store.records import (
+    decode_kinesis_data,
+)
+from jobs_store.tracing import (
+    create_tracer,
+)
 from os import (
     getenv,
 )
+from time import (
+    monotonic,
+)
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+if TYPE_CHECKING:
+    from awslambdaric.lambda_context import (
+        LambdaContext,
+    )
 
 CONSUMER_ID = getenv("CONSUMER_ID")
-OPTIMISTIC_LOCKING_RETRY_ATTEMPTS = int(
-    getenv("OPTIMISTIC_LOCKING_RETRY_ATTEMPTS"))
-TABLE_NAME = getenv("TABLE_NAME")
-dynamodb = client("dynamodb")
-dynamodbstreams = client("dynamodbstreams")
+ERROR_HANDLING_CONCURRENCY = int(getenv("ERROR_HANDLING_CONCURRENCY", "10"))
+PARALLELIZATION_FACTOR = int(getenv("PARALLELIZATION_FACTOR", "1"))
+# Shard iterators expire 15 minutes after they are returned
+SHARD_ITERATOR_TTL = int(getenv("SHARD_ITERATOR_TTL_SECONDS", "840"))
+STREAM_MAX_EMPTY_PAGES = int(getenv("STREAM_MAX_EMPTY_PAGES", "5"))
+STREAM_MAX_PAGE_SIZE = 1000
+dynamodbstreams = None
+kinesis = None
 logger = Logger(
-    level=getenv("LOG_LEVEL", "DEBUG"),
+    level=LOG_LEVEL,
+    service="error_handling",
+)
+job_store: Optional[JobStore] = None
+metrics = Metrics(
+    namespace=getenv("METRICS_NAMESPACE", "AsynchronousEventProcessing"),
     service="error_handling",
 )
+metrics_buffer = MetricsBuffer()
+tracer = create_tracer(service="error_handling")
+completion_notifier = LazyCompletionNotifier(
+    lambda: create_completion_notifier(get_job_store(), logger=logger),
+    logger=logger,
+    metrics_buffer=metrics_buffer,
+    tracer=tracer,
+)
+# For each shard, the iterator after the last record read, the sequence
+# number of that record and when the iterator expires, kept across warm
+# invocations
+shard_iterators: Dict[Tuple[str, str], Tuple[str, str, float]] = {}
 
 
-def dynamo_obj_to_python_obj(dynamo_obj: dict) -> dict:
-    deserializer = TypeDeserializer()
+def get_dynamodbstreams():
+    """
+    Creates the DynamoDB Streams client on first use.
+    """
+    global dynamodbstreams
 
-    return {
-        k: deserializer.deserialize(v)
-        for k, v in dynamo_obj.items()
-    }
+    if dynamodbstreams is None:
+        dynamodbstreams = create_client("dynamodbstreams")
 
+    return dynamodbstreams
 
-def get_record(message: dict) -> str:
-    batch_info = message["DDBStreamBatchInfo"]
-    shard_iterator = dynamodbstreams.get_shard_iterator(
-        SequenceNumber=batch_info["startSequenceNumber"],
-        ShardId=batch_info["shardId"],
-        ShardIteratorType="AT_SEQUENCE_NUMBER",
-        StreamArn=batch_info["streamArn"],
-    )
-    record = dynamodbstreams.get_records(
-        Limit=1,  # Only one event at a time is processed
-        ShardIterator=shard_iterator["ShardIterator"],
-    )
 
-    return record["Records"][0]["dynamodb"]["NewImage"]
+def get_kinesis():
+    """
+    Creates the Kinesis client on first use.
+    """
+    global kinesis
 
+    if kinesis is None:
+        kinesis = create_client("kinesis")
 
-def python_obj_to_dynamo_obj(python_obj: dict) -> dict:
-    serializer = TypeSerializer()
+    return kinesis
 
-    return {
-        k: serializer.serialize(v)
-        for k, v in python_obj.items()
-    }
 
+def get_stream_client(batch_info: dict):
+    """
+    Returns the client of the stream of the batch, the DynamoDB stream or
+    the Kinesis data stream of the table.
+    """
+    if is_kinesis(batch_info):
+        return get_kinesis()
 
-def upsert(id: str, status: dict) -> None:
-    for retry in range(OPTIMISTIC_LOCKING_RETRY_ATTEMPTS):
-        try:
-            logger.debug(f"Retry number {retry + 1} to update {id}")
-
-            # Get existing item and its version
-            item = dynamodb.get_item(
-                Key={
-                    "id": {
-                        "S": id,
-                    }
-                },
-                TableName=TABLE_NAME,
+    return get_dynamodbstreams()
+
+
+def is_kinesis(batch_info: dict) -> bool:
+    return ":kinesis:" in batch_info["streamArn"]
+
+
+def get_job_store() -> JobStore:
+    """
+    Creates the job store on first use.
+    """
+    global job_store
+
+    if job_store is None:
+        job_store = create_job_store(logger=logger, tracer=tracer)
+
+    return job_store
+
+
+def get_shard_iterator(batch_info: dict) -> Tuple[str, bool]:
+    """
+    Returns an iterator from which the batch can be read, and whether it was
+    cached: the cached one of the shard, if it has not expired and it is
+    before the start of the batch, otherwise a new one at the start of the
+    batch.
+    """
+    key = (batch_info["streamArn"], batch_info["shardId"])
+    cached = shard_iterators.pop(key, None)
+
+    if cached is not None:
+        shard_iterator, sequence_number, expiration = cached
+
+        if monotonic() < expiration and \
+                int(sequence_number) < int(batch_info["startSequenceNumber"]):
+            logger.debug("Reusing the iterator after %s", sequence_number)
+
+            return shard_iterator, True
+
+    with tracer.subsegment(
+            "get_shard_iterator",
+            sequence_number=batch_info["startSequenceNumber"],
+            shard_id=batch_info["shardId"]):
+        if is_kinesis(batch_info):
+            shard_iterator = get_kinesis().get_shard_iterator(
+                ShardId=batch_info["shardId"],
+                ShardIteratorType="AT_SEQUENCE_NUMBER",
+                StartingSequenceNumber=batch_info["startSequenceNumber"],
+                StreamARN=batch_info["streamArn"],
             )
-            item_python = dynamo_obj_to_python_obj(item["Item"])
-            item_current_version = item_python.get("version")
-            item_status = item_python.get("job_status", {})
-
-            logger.debug(f"Current version for {id} is {item_current_version}")
-            logger.debug(f"Current status for {id} is {status}")
-
-            # Set status for this consumer
-            item_status[CONSUMER_ID] = status
-
-            logger.debug(f"Updated status for {id} is {status}")
-
-            # Try update DynamoDB item
-            dynamodb.update_item(
-                # Optimistic locking
-                ConditionExpression="version = :cv",
-                ExpressionAttributeValues={
-                    ":cv": {
-                        "N": str(item_current_version),
-                    },
-                    ":s": {
-                        "M": python_obj_to_dynamo_obj(item_status),
-                    },
-                    ":v": {
-                        "N": str(item_current_version + 1),
-                    },
-                },
-                Key={
-                    "id": {
-                        "S": id,
-                    },
-                },
-                ReturnValues="UPDATED_NEW",
-                TableName=TABLE_NAME,
-                UpdateExpression=f"SET job_status=:s, version=:v",
+        else:
+            shard_iterator = get_dynamodbstreams().get_shard_iterator(
+                SequenceNumber=batch_info["startSequenceNumber"],
+                ShardId=batch_info["shardId"],
+                ShardIteratorType="AT_SEQUENCE_NUMBER",
+                StreamArn=batch_info["streamArn"],
             )
 
-            # Return when update is successful
-            return
-        except dynamodb.exceptions.ConditionalCheckFailedException:
-            logger.warning("Failed to acquire lock, retrying")
-        except Exception as exception:
-            raise exception
+    return shard_iterator["ShardIterator"], False
+
+
+def is_consumer_record(record: dict) -> bool:
+    """
+    Returns whether the record passes the filters of the consumer's event
+    source, as the batch range also spans the records filtered out.
+    """
+    if record["eventName"] == "INSERT":
+        return True
+
+    if record["eventName"] == "MODIFY":
+        consumer_status = record["dynamodb"]["NewImage"]. \
+            get("job_status", {}). \
+            get("M", {}). \
+            get(CONSUMER_ID, {}). \
+            get("M", {})
+
+        return consumer_status.get("status", {}).get("S") == "Checkpointed"
+
+    return False
+
 
-    # Raise error when retry > max attempts
-    raise RuntimeError(
-        f"Max number of retries {OPTIMISTIC_LOCKING_RETRY_ATTEMPTS} exceeded")
+def get_records(message: dict) -> List[Tuple[dict, bool]]:
+    """
+    Returns the new image of every record of the failed batch, paging
+    through the shard from startSequenceNumber to endSequenceNumber, of
+    the DynamoDB stream or of the Kinesis data stream of the table, and
+    whether the record is known to be in the failed batch.
 
+    Under a parallelization factor, the range also spans the records of the
+    batches processed concurrently from the same shard, so it is read up to
+    its end rather than up to batchSize records, and only its first and
+    last records are known to be in the failed batch.
+    """
+    batch_info = message["KinesisBatchInfo"] \
+        if "KinesisBatchInfo" in message else message["DDBStreamBatchInfo"]
+    batch_size = int(batch_info.get("batchSize", 1))
+    end_sequence_number = int(batch_info.get(
+        "endSequenceNumber", batch_info["startSequenceNumber"]))
+    key = (batch_info["streamArn"], batch_info["shardId"])
+    read_to_end = PARALLELIZATION_FACTOR > 1
+    start_sequence_number = int(batch_info["startSequenceNumber"])
+    empty_pages = 0
+    end_reached = False
+    images = []
+    last_sequence_number: Optional[str] = None
+    shard_iterator, cached = get_shard_iterator(batch_info)
 
+    while shard_iterator is not None and not end_reached:
+        try:
+            with tracer.subsegment(
+                    "get_records",
+                    cached=cached,
+                    shard_id=batch_info["shardId"]):
+                page = get_stream_client(batch_info).get_records(
+                    Limit=STREAM_MAX_PAGE_SIZE if read_to_end else min(
+                        batch_size - len(images), STREAM_MAX_PAGE_SIZE),
+                    ShardIterator=shard_iterator,
+                )
+        except get_stream_client(batch_info).exceptions. \
+                ExpiredIteratorException:
+            if not cached:
+                raise
+
+            # The cached iterator expired before its expected expiration
+            logger.warning("Cached shard iterator expired")
+
+            shard_iterator, cached = get_shard_iterator(batch_info)
+
+            continue
+
+        cached = False
+        records = [
+            decode_kinesis_data(record["Data"], record["SequenceNumber"])
+            for record in page["Records"]
+        ] if is_kinesis(batch_info) else page["Records"]
+        shard_iterator = page.get("NextShardIterator")
+
+        if not records:
+            empty_pages += 1
+            end_reached = empty_pages >= STREAM_MAX_EMPTY_PAGES
+
+            continue
+
+        empty_pages = 0
+        last_sequence_number = records[-1]["dynamodb"]["SequenceNumber"]
+
+        for record in records:
+            sequence_number = int(record["dynamodb"]["SequenceNumber"])
+
+            if sequence_number < start_sequence_number:
+                continue
+
+            if sequence_number > end_sequence_number:
+                end_reached = True
+
+                break
+
+            if is_consumer_record(record):
+                images.append((
+                    record["dynamodb"]["NewImage"],
+                    not read_to_end or sequence_number in (
+                        start_sequence_number, end_sequence_number),
+                ))
+
+        end_reached = end_reached or \
+            (not read_to_end and len(images) >= batch_size) or \
+            int(last_sequence_number) >= end_sequence_number
+
+    # Records up to the end of the last page have been read
+    if shard_iterator is not None and last_sequence_number is not None:
+        shard_iterators[key] = (
+            shard_iterator,
+            last_sequence_number,
+            monotonic() + SHARD_ITERATOR_TTL,
+        )
+
+    if not read_to_end and len(images) < batch_size:
+        logger.warning(
+            f"Read {len(images)} of {batch_size} records of the batch")
+
+    return images
+
+
+def record_failure(job: Job, in_batch: bool) -> None:
+    logger.debug("Processing %s", job.id)
+
+    status_failure = ConsumerStatus(
+        seconds=str(job.seconds),
+        status="Failure",
+    )
+
+    # The failed range runs from the first failed record to the end of the
+    # batch, so it also has the jobs that the consumer finished, which keep
+    # their status, and, under a parallelization factor, the jobs of other
+    # batches, which are skipped while they are not started or Running
+    with metrics_buffer.duration("FinalUpsertDuration"):
+        failed = get_job_store().upsert(
+            job.id,
+            CONSUMER_ID,
+            status_failure,
+            unless_finished=True,
+            unless_in_flight=not in_batch,
+        )
+
+    # The notification of a finished job may not have been sent
+    if not failed:
+        logger.info(f"{job.id} already finished or in flight")
+
+    completion_notifier.notify(job.id)
+
+
+@metrics.log_metrics
 def handler(event: dict, context: LambdaContext) -> None:
-    logger.debug(context)
-    logger.debug(event)
+    """
+    The failed jobs of every SNS record in the event are marked as failed
+    by up to ERROR_HANDLING_CONCURRENCY concurrent upserts, each of which
+    succeeds or fails on its own. When any of them fails, an error is
+    raised once all of them are done, so that the event is retried.
+    """
+    sample_log_level(logger)
+    logger.debug("Context %s", context)
+    logger.debug("Event %s", Payload(event))
+
+    get_job_store().reset_statistics()
+    metrics_buffer.reset()
+    metrics_buffer.add_metric(
+        "BatchSize", MetricUnit.Count, len(event["Records"]))
+
+    failures = 0
+    # A job can be in more than one failed batch, its status is set once
+    jobs: Dict[str, Tuple[Job, bool]] = {}
 
-    message = loads(event["Records"][0]["Sns"]["Message"])
-    record = get_record(message)
+    for record in event["Records"]:
+        message = loads(record["Sns"]["Message"])
 
-    logger.debug(f"Processing {record['id']['S']}")
+        try:
+            with metrics_buffer.duration("StreamReadDuration"):
+                images = get_records(message)
+        except Exception:
+            failures += 1
+            metrics_buffer.add_outcome("ReadFailure")
+
+            logger.exception("Failed to read the failed batch", extra=message)
+
+            continue
+
+        metrics_buffer.add_metric(
+            "FailedRecords", MetricUnit.Count, len(images))
+
+        for image, in_batch in images:
+            job = decode_job(image)
+            in_batch = in_batch or (job.id in jobs and jobs[job.id][1])
+            jobs[job.id] = (job, in_batch)
+
+    with ThreadPoolExecutor(
+            max_workers=ERROR_HANDLING_CONCURRENCY) as executor:
+        futures = {
+            id: executor.submit(record_failure, job, in_batch)
+            for id, (job, in_batch) in jobs.items()
+        }
+
+    for id, future in futures.items():
+        if future.exception() is not None:
+            failures += 1
+            metrics_buffer.add_outcome("Failure")
+
+            logger.error(
+                f"Failed to set {id} as Failure",
+                exc_info=future.exception(),
+            )
+        else:
+            metrics_buffer.add_outcome("Success")
 
-    status_failure = {
-        "seconds": record["seconds"]["N"],
-        "status": "Failure",
-    }
+    logger.info("Upsert statistics", extra=get_job_store().statistics)
+    metrics_buffer.add_statistics(get_job_store().statistics)
+    metrics_buffer.publish(metrics, CONSUMER_ID)
 
-    upsert(record["id"]["S"], status_failure)
+    if failures > 0:
+        raise RuntimeError(f"Failed to record {failures} failures")
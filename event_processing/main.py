@@ -1,39 +1,112 @@
 from aws_lambda_powertools import (
     Logger,
+    Metrics,
 )
-from boto3 import (
-    client,
+from aws_lambda_powertools.metrics import (
+    MetricUnit,
 )
-from boto3.dynamodb.types import (
-    TypeDeserializer,
-    TypeSerializer,
+from concurrent.futures import (
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from contextlib import (
+    contextmanager,
+)
+from jobs_store.base import (
+    TERMINAL_STATUSES,
+    JobStore,
+)
+from jobs_store.codec import (
+    ConsumerStatus,
+    Job,
+    decode_job,
+)
+from jobs_store.exceptions import (
+    ConditionalCheckFailedError,
+)
+from jobs_store.factory import (
+    create_completion_notifier,
+    create_job_store,
+)
+from jobs_store.logs import (
+    LOG_LEVEL,
+    Payload,
+    sample_log_level,
+)
+from jobs_store.metrics import (
+    MetricsBuffer,
+)
+from jobs_store.notifications import (
+    LazyCompletionNotifier,
+)
+from jobs_store.records import (
+    decode_record,
+)
+from jobs_store.tracing import (
+    create_tracer,
+)
+from math import (
+    floor,
 )
 from os import (
     getenv,
 )
+from threading import (
+    Event,
+    Lock,
+    Timer,
+)
 from time import (
+    monotonic,
     sleep,
+    time,
+)
+from typing import (
+    Dict,
+    Iterator,
+    List,
+    Optional,
 )
 
+CHECKPOINTING = getenv("CHECKPOINTING", "false") == "true"
 CONSUMER_ID = getenv("CONSUMER_ID")
-OPTIMISTIC_LOCKING_RETRY_ATTEMPTS = int(
-    getenv("OPTIMISTIC_LOCKING_RETRY_ATTEMPTS"))
-TABLE_NAME = getenv("TABLE_NAME")
+RECORD_CONCURRENCY = int(getenv("RECORD_CONCURRENCY", "1"))
+RUNNING_STATUS_THRESHOLD = int(getenv("RUNNING_STATUS_THRESHOLD", "10"))
+RUNNING_STATUS_WRITE_POLICY = getenv("RUNNING_STATUS_WRITE_POLICY", "always")
 TIMEOUT = int(getenv("TIMEOUT"))
-dynamodb = client("dynamodb")
+TIMEOUT_MARGIN = int(getenv("TIMEOUT_MARGIN_MILLISECONDS", "1000")) / 1000
+TRANSPORT = getenv("TRANSPORT", "dynamodb_streams")
 logger = Logger(
-    level=getenv("LOG_LEVEL", "DEBUG"),
+    level=LOG_LEVEL,
+    service="jobs_processing",
+)
+job_store: Optional[JobStore] = None
+metrics = Metrics(
+    namespace=getenv("METRICS_NAMESPACE", "AsynchronousEventProcessing"),
     service="jobs_processing",
 )
+metrics_buffer = MetricsBuffer()
+tracer = create_tracer(service="jobs_processing")
+completion_notifier = LazyCompletionNotifier(
+    lambda: create_completion_notifier(get_job_store(), logger=logger),
+    logger=logger,
+    metrics_buffer=metrics_buffer,
+    tracer=tracer,
+)
 
 
-def dynamo_obj_to_python_obj(dynamo_obj: dict) -> dict:
-    deserializer = TypeDeserializer()
+def get_job_store() -> JobStore:
+    """
+    Creates the job store on first use, so that its client is not created
+    during the cold start of functions that never reach it.
+    """
+    global job_store
 
-    return {
-        k: deserializer.deserialize(v)
-        for k, v in dynamo_obj.items()
-    }
+    if job_store is None:
+        job_store = create_job_store(logger=logger, tracer=tracer)
+
+    return job_store
 
 
 def event_processing(seconds: int) -> str:
@@ -47,78 +120,320 @@ def event_processing(seconds: int) -> str:
     return message
 
 
-def python_obj_to_dynamo_obj(python_obj: dict) -> dict:
-    serializer = TypeSerializer()
-    return {
-        k: serializer.serialize(v)
-        for k, v in python_obj.items()
-    }
+def event_processing_checkpointed(
+    seconds: int,
+    progress: int,
+    deadline: float,
+) -> int:
+    """
+    Processes the job from its progress until it ends or until the deadline,
+    and returns the new progress.
+    """
+    slice_seconds = max(
+        min(seconds - progress, floor(deadline - monotonic())),
+        0,
+    )
+
+    sleep(slice_seconds)
 
+    return progress + slice_seconds
 
-def upsert(id: str, status: dict) -> None:
-    for retry in range(OPTIMISTIC_LOCKING_RETRY_ATTEMPTS):
+
+def process_job_checkpointed(job: Job, deadline: float) -> None:
+    """
+    Processes the job in slices that end before the function times out.
+
+    When the job does not end in time, its progress is stored in the
+    Checkpointed status of this consumer, and the stream record of that
+    write triggers the continuation of the job from the checkpoint.
+    """
+    consumer_status = job.job_status.get(CONSUMER_ID)
+
+    if consumer_status is not None and \
+            consumer_status.status == "Checkpointed":
+        progress = int(consumer_status.progress)
+
+        # Claim the checkpoint, as the records of later writes to the job
+        # carry the same checkpoint until it is claimed
         try:
-            logger.debug(f"Retry number {retry + 1} to update {id}")
+            with tracer.subsegment(
+                    "claim_checkpoint", job_id=job.id, progress=progress):
+                get_job_store().update_consumer_status(
+                    job.id,
+                    CONSUMER_ID,
+                    ConsumerStatus(
+                        progress=consumer_status.progress,
+                        status="Running",
+                    ),
+                    expected_status=consumer_status,
+                )
+        except ConditionalCheckFailedError:
+            logger.info(f"Checkpoint {progress} of {job.id} already claimed")
 
-            # Get existing item and its version
-            item = dynamodb.get_item(
-                Key={
-                    "id": {
-                        "S": id,
-                    }
-                },
-                TableName=TABLE_NAME,
-            )
-            item_python = dynamo_obj_to_python_obj(item["Item"])
-            item_current_version = item_python.get("version")
-            item_status = item_python.get("job_status", {})
+            return
 
-            logger.debug(f"Current version for {id} is {item_current_version}")
-            logger.debug(f"Current status for {id} is {status}")
+        logger.debug("Resuming %s from %s", job.id, progress)
 
-            # Set status for this consumer
-            item_status[CONSUMER_ID] = status
+        with metrics_buffer.duration("ProcessingDuration"), \
+                tracer.subsegment(
+                    "event_processing", job_id=job.id, progress=progress):
+            progress = event_processing_checkpointed(
+                job.seconds, progress, deadline)
+    else:
+        with running_status(job) as running:
+            if not running:
+                logger.info(f"{job.id} already finished")
 
-            logger.debug(f"Updated status for {id} is {status}")
+                return
 
-            # Try update DynamoDB item
-            dynamodb.update_item(
-                # Optimistic locking
-                ConditionExpression="version = :cv",
-                ExpressionAttributeValues={
-                    ":cv": {
-                        "N": str(item_current_version),
-                    },
-                    ":s": {
-                        "M": python_obj_to_dynamo_obj(item_status),
-                    },
-                    ":v": {
-                        "N": str(item_current_version + 1),
-                    },
-                },
-                Key={
-                    "id": {
-                        "S": id,
-                    },
-                },
-                ReturnValues="UPDATED_NEW",
-                TableName=TABLE_NAME,
-                UpdateExpression=f"SET job_status=:s, version=:v",
+            with metrics_buffer.duration("ProcessingDuration"), \
+                    tracer.subsegment(
+                        "event_processing", job_id=job.id, progress=0):
+                progress = event_processing_checkpointed(
+                    job.seconds, 0, deadline)
+
+    if progress < job.seconds:
+        status_checkpointed = ConsumerStatus(
+            progress=str(progress),
+            status="Checkpointed",
+        )
+
+        with metrics_buffer.duration("FinalUpsertDuration"):
+            get_job_store().upsert(
+                job.id, CONSUMER_ID, status=status_checkpointed)
+    else:
+        status_done = ConsumerStatus(
+            results=f"I slept for {job.seconds} seconds",
+            status="Success",
+        )
+
+        with metrics_buffer.duration("FinalUpsertDuration"):
+            get_job_store().upsert(job.id, CONSUMER_ID, status=status_done)
+
+        completion_notifier.notify(job.id)
+
+
+def process_record(record: dict, deadline: float) -> None:
+    job = decode_job(record["dynamodb"]["NewImage"])
+
+    logger.debug("Processing %s", job.id)
+
+    if CHECKPOINTING:
+        process_job_checkpointed(job, deadline)
+
+        return
+
+    # Do not start jobs that cannot end before the function times out
+    if monotonic() + job.seconds > deadline:
+        raise TimeoutError(f"Not enough time left to process {job.id}")
+
+    with running_status(job) as running:
+        if not running:
+            logger.info(f"{job.id} already finished")
+
+            return
+
+        with metrics_buffer.duration("ProcessingDuration"), \
+                tracer.subsegment("event_processing", job_id=job.id):
+            results = event_processing(job.seconds)
+
+    status_done = ConsumerStatus(
+        results=results,
+        status="Success",
+    )
+
+    with metrics_buffer.duration("FinalUpsertDuration"):
+        get_job_store().upsert(job.id, CONSUMER_ID, status=status_done)
+
+    completion_notifier.notify(job.id)
+
+
+def process_record_after(
+    record: dict,
+    deadline: float,
+    previous: Optional[Future],
+) -> None:
+    """
+    Processes the record once the previous record of the same job in the
+    batch has been processed, so that the records of a job keep their
+    order while the records of different jobs are processed concurrently.
+    When the previous record failed, this one fails without being
+    processed, as both are retried or sent to the on-failure destination.
+    """
+    if previous is not None:
+        previous.result()
+
+    process_record(record, deadline)
+
+
+def submit_records(
+    executor: ThreadPoolExecutor,
+    records: List[dict],
+    deadline: float,
+) -> List[Future]:
+    """
+    Submits the records in order, each chained to the previous record of
+    the same job. The records are started in the order they are submitted,
+    so a record never waits for one that has not started.
+    """
+    futures = []
+    previous: Dict[str, Future] = {}
+
+    for record in records:
+        id = record["dynamodb"]["NewImage"]["id"]["S"]
+        future = executor.submit(
+            process_record_after, record, deadline, previous.get(id))
+        previous[id] = future
+
+        futures.append(future)
+
+    return futures
+
+
+def update_window_state(event: dict, outcomes: Dict[str, int]) -> dict:
+    """
+    Adds the outcomes of the batch to the state of its tumbling window, and
+    logs the outcomes of the window with its final invocation.
+    """
+    state = {
+        outcome: event.get("state", {}).get(outcome, 0) +
+        outcomes.get(outcome, 0)
+        for outcome in ["Failure", "Success", "Timeout"]
+    }
+
+    if event.get("isFinalInvokeForWindow"):
+        logger.info(
+            "Window outcomes",
+            extra={
+                "shard_id": event.get("shardId"),
+                "window": event["window"],
+                **state,
+            },
+        )
+
+    return state
+
+
+def is_finished(job: Job) -> bool:
+    """
+    Returns whether this consumer has a terminal status for the job.
+    """
+    with tracer.subsegment("get_job", job_id=job.id):
+        consumer_status = get_job_store().get_job(job.id).job_status.get(
+            CONSUMER_ID)
+
+    return consumer_status is not None and \
+        consumer_status.status in TERMINAL_STATUSES
+
+
+@contextmanager
+def running_status(job: Job) -> Iterator[bool]:
+    """
+    Writes the Running status while the job is processed, according to
+    the write policy, and yields whether the job is to be processed, which
+    it is not when the Running write finds that this consumer already
+    finished it, as for a record delivered again after a partial batch
+    failure. Kinesis can also deliver a record more than once, or after a
+    later one, so with the kinesis transport the status of the consumer is
+    read when the policy writes no Running status before the job starts:
+
+    - always: before the job starts
+    - threshold: before the job starts, if it is expected to last more than
+      RUNNING_STATUS_THRESHOLD seconds
+    - deferred: once the job has lasted RUNNING_STATUS_THRESHOLD seconds,
+      so that it is folded into the final status when the job is quicker
+    """
+    status_running = ConsumerStatus(
+        status="Running",
+    )
+
+    if RUNNING_STATUS_WRITE_POLICY == "always":
+        with metrics_buffer.duration("RunningUpsertDuration"):
+            running = get_job_store().upsert(
+                job.id,
+                CONSUMER_ID,
+                status=status_running,
+                unless_finished=True,
             )
 
-            # Return when update is successful
+        yield running
+    elif RUNNING_STATUS_WRITE_POLICY == "threshold":
+        if job.seconds > RUNNING_STATUS_THRESHOLD:
+            with metrics_buffer.duration("RunningUpsertDuration"):
+                running = get_job_store().upsert(
+                    job.id,
+                    CONSUMER_ID,
+                    status=status_running,
+                    unless_finished=True,
+                )
+        else:
+            running = TRANSPORT != "kinesis" or not is_finished(job)
+
+        yield running
+    elif RUNNING_STATUS_WRITE_POLICY == "deferred":
+        if TRANSPORT == "kinesis" and is_finished(job):
+            yield False
+
             return
-        except dynamodb.exceptions.ConditionalCheckFailedException:
-            logger.warning("Failed to acquire lock, retrying")
-        except Exception as exception:
-            raise exception
 
-    # Raise error when retry > max attempts
-    raise RuntimeError(
-        f"Max number of retries {OPTIMISTIC_LOCKING_RETRY_ATTEMPTS} exceeded")
+        finished = Event()
+        lock = Lock()
+
+        def upsert_running() -> None:
+            # The lock ensures that Running is never written after the
+            # final status
+            with lock:
+                if finished.is_set():
+                    return
 
+                try:
+                    with metrics_buffer.duration("RunningUpsertDuration"):
+                        get_job_store().upsert(
+                            job.id,
+                            CONSUMER_ID,
+                            status=status_running,
+                            unless_finished=True,
+                        )
+                except Exception:
+                    logger.exception(f"Failed to set {job.id} as Running")
 
-def handler(event, context) -> None:
+        timer = Timer(RUNNING_STATUS_THRESHOLD, upsert_running)
+        timer.daemon = True
+
+        timer.start()
+
+        try:
+            yield True
+        finally:
+            with lock:
+                finished.set()
+
+            timer.cancel()
+    else:
+        raise ValueError(("Unsupported running status write policy "
+                          f"{RUNNING_STATUS_WRITE_POLICY}"))
+
+
+def add_record_metrics(record: dict) -> None:
+    """
+    Adds the age of the record in the stream and the size of its payload.
+    """
+    stream_record = record["dynamodb"]
+
+    if "ApproximateCreationDateTime" in stream_record:
+        metrics_buffer.add_metric(
+            "RecordAge",
+            MetricUnit.Milliseconds,
+            (time() - stream_record["ApproximateCreationDateTime"]) * 1000,
+        )
+
+    if "SizeBytes" in stream_record:
+        metrics_buffer.add_metric(
+            "PayloadSize", MetricUnit.Bytes, stream_record["SizeBytes"])
+
+
+@metrics.log_metrics
+def handler(event, context) -> dict:
     """
     The input event is in the following format:
 
@@ -157,24 +472,87 @@ def handler(event, context) -> None:
             "eventSourceARN": "arn:aws:dynamodb:us-east-1:xxxxxxxxx:table/AsynchronousProcessingAPIGatewayDynamoDBStream-EventProcessingJobsTablexxxxxxxxx/stream/2023-06-27T15:24:31.102"
         }
     ]
+
+    Records of the Kinesis data stream of the table are decoded into the
+    same format, with the sequence number of the Kinesis record.
+
+    Every record in the batch is processed, up to RECORD_CONCURRENCY at a
+    time and in order for each job, as within a shard under a
+    parallelization factor, and the sequence numbers of the failed ones,
+    or of the ones that could not end before the function times out, are
+    returned in the following format, so that only those are retried or
+    sent to the on-failure destination:
+
+    "batchItemFailures": [
+        {
+            "itemIdentifier": "946475000000000000011227028182"
+        }
+    ]
+
+    With a tumbling window, the event also has its window and state, and
+    the outcomes of the window so far are returned in the state.
     """
-    logger.debug(context)
-    logger.debug(event)
+    sample_log_level(logger)
+    logger.debug("Context %s", context)
+    logger.debug("Event %s", Payload(event))
 
-    id = event["Records"][0]["dynamodb"]["NewImage"]["id"]["S"]
-    seconds = event["Records"][0]["dynamodb"]["NewImage"]["seconds"]["N"]
+    get_job_store().reset_statistics()
+    metrics_buffer.reset()
+    metrics_buffer.add_metric(
+        "BatchSize", MetricUnit.Count, len(event["Records"]))
 
-    logger.debug(f"Processing {id}")
+    records = [decode_record(record) for record in event["Records"]]
 
-    status_running = {
-        "status": "Running",
-    }
+    for record in records:
+        add_record_metrics(record)
+
+    batch_item_failures = []
+    deadline = monotonic() + \
+        context.get_remaining_time_in_millis() / 1000 - TIMEOUT_MARGIN
+    executor = ThreadPoolExecutor(max_workers=RECORD_CONCURRENCY)
+    futures = submit_records(executor, records, deadline)
+    outcomes: Dict[str, int] = {}
+
+    # Half of the margin is left to write checkpoints at the deadline
+    wait(futures, timeout=max(deadline + TIMEOUT_MARGIN / 2 - monotonic(), 0))
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    for record, future in zip(records, futures):
+        sequence_number = record["dynamodb"]["SequenceNumber"]
+
+        if not future.done() or future.cancelled():
+            outcome = "Timeout"
 
-    upsert(id, status=status_running)
+            logger.error(f"Timed out processing record {sequence_number}")
+        elif future.exception() is not None:
+            outcome = "Failure"
 
-    status_done = {
-        "results": event_processing(int(seconds)),
-        "status": "Success",
+            logger.error(
+                f"Failed to process record {sequence_number}",
+                exc_info=future.exception(),
+            )
+        else:
+            outcome = "Success"
+
+        metrics_buffer.add_outcome(outcome)
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+        if outcome == "Success":
+            continue
+
+        batch_item_failures.append({
+            "itemIdentifier": sequence_number,
+        })
+
+    logger.info("Upsert statistics", extra=get_job_store().statistics)
+    metrics_buffer.add_statistics(get_job_store().statistics)
+    metrics_buffer.publish(metrics, CONSUMER_ID)
+
+    response = {
+        "batchItemFailures": batch_item_failures,
     }
 
-    upsert(id, status=status_done)
+    if "window" in event:
+        response["state"] = update_window_state(event, outcomes)
+
+    return response
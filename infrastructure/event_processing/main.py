@@ -1,19 +1,38 @@
 from aws_cdk import (
+    Annotations,
     BundlingOptions,
     Duration,
     RemovalPolicy,
+    SecretValue,
+    aws_events_targets,
     aws_lambda
 )
 from aws_cdk.aws_dynamodb import (
     Attribute,
     AttributeType,
+    BillingMode,
+    ProjectionType,
     Table,
     TableEncryption,
     StreamViewType
 )
 from aws_cdk.aws_events import (
+    ApiDestination,
+    Authorization,
+    Connection,
     EventBus,
     EventPattern,
+    HttpMethod,
+    Rule,
+    RuleTargetInput,
+)
+from aws_cdk.aws_iam import (
+    PolicyStatement,
+)
+from aws_cdk.aws_kinesis import (
+    CfnStreamConsumer,
+    Stream,
+    StreamEncryption,
 )
 from aws_cdk.aws_kms import (
     Key,
@@ -23,6 +42,7 @@ from aws_cdk.aws_lambda import (
     Function,
     LayerVersion,
     Runtime,
+    Tracing,
 )
 from aws_cdk.aws_lambda_destinations import (
     EventBridgeDestination,
@@ -30,8 +50,17 @@ from aws_cdk.aws_lambda_destinations import (
 )
 from aws_cdk.aws_lambda_event_sources import (
     DynamoEventSource,
+    SnsDlq,
     SnsEventSource,
 )
+from aws_cdk.aws_s3 import (
+    BlockPublicAccess,
+    Bucket,
+    BucketEncryption,
+    LifecycleRule,
+    StorageClass,
+    Transition,
+)
 from aws_cdk.aws_sns import (
     Topic,
 )
@@ -41,6 +70,13 @@ from constructs import (
 from pathlib import (
     Path,
 )
+from typing import (
+    Optional,
+    Sequence,
+)
+
+# Reading a shard of a DynamoDB stream with more functions is throttled
+DYNAMODB_STREAM_MAX_READERS = 2
 
 
 class EventProcessingConstruct(Construct):
@@ -48,17 +84,58 @@ class EventProcessingConstruct(Construct):
         self,
         scope: Construct,
         construct_id: str,
+        archive: bool = False,
+        archive_batch_size: int = 100,
+        archive_batching_window: int = 60,
+        archive_transition_days: int = 0,
+        backoff_base_milliseconds: int = 50,
+        backoff_cap_milliseconds: int = 1000,
+        backoff_strategy: str = "full_jitter",
+        batch_size: int = 1,
+        billing_mode: str = "provisioned",
+        bisect_batch_on_function_error: bool = False,
+        checkpointing: bool = False,
+        client_connect_timeout_milliseconds: int = 1000,
+        client_max_attempts: int = 3,
+        client_max_pool_connections: int = 10,
+        client_read_timeout_milliseconds: int = 5000,
+        client_retry_mode: str = "standard",
+        client_tcp_keepalive: bool = True,
         consumers: int = 2,
+        debug_sample_rate: float = 0.0,
+        error_handling_concurrency: int = 10,
         error_handling_timeout: int = 5,
         event_processing_timeout: int = 300,
+        job_retention_days: int = 0,
+        kinesis_shard_count: int = 1,
+        log_level: str = "INFO",
+        log_max_payload_bytes: int = 2048,
+        log_redacted_keys: Sequence[str] = (),
+        max_batching_window: int = 0,
         max_event_age: int = 21600,
+        max_read_capacity: int = 0,
         max_record_age: int = 21600,
+        max_write_capacity: int = 0,
+        metrics_namespace: str = "AsynchronousEventProcessing",
+        notification_endpoint: Optional[str] = None,
+        notification_endpoint_api_key_secret: Optional[str] = None,
+        notifications: bool = False,
         optmistic_locking_retry_attempts: int = 10,
+        parallelization_factor: int = 1,
         pending_window: int = 7,
         read_capacity: int = 5,
+        record_concurrency: int = 1,
         removal_policy: RemovalPolicy = RemovalPolicy.DESTROY,
         reserved_concurrent_executions: int = 100,
         retry_attempts: int = 0,
+        running_status_threshold: int = 10,
+        running_status_write_policy: str = "always",
+        status_index: bool = False,
+        target_utilization: int = 70,
+        tracing: bool = False,
+        transport: str = "dynamodb_streams",
+        tumbling_window: int = 0,
+        upsert_mode: str = "optimistic_locking",
         write_capacity: int = 5,
     ) -> None:
         super().__init__(
@@ -66,6 +143,44 @@ class EventProcessingConstruct(Construct):
             construct_id,
         )
 
+        if billing_mode not in ["pay_per_request", "provisioned"]:
+            raise ValueError(f"Unsupported billing mode {billing_mode}")
+
+        if transport not in ["dynamodb_streams", "kinesis"]:
+            raise ValueError(f"Unsupported transport {transport}")
+
+        kinesis = transport == "kinesis"
+
+        # Each shard is processed by up to parallelization_factor concurrent
+        # invocations, which keep the order of the records of each job
+        if not 1 <= parallelization_factor <= 10:
+            raise ValueError(
+                f"Unsupported parallelization factor {parallelization_factor}")
+
+        if not 0 <= tumbling_window <= 900:
+            raise ValueError(f"Unsupported tumbling window {tumbling_window}")
+
+        if archive and job_retention_days == 0:
+            raise ValueError("Archiving requires a job retention")
+
+        # Every consumer and the archiving function poll each shard of the
+        # DynamoDB stream, while the error handling functions only read the
+        # ranges of failed batches. With the Kinesis transport, the
+        # consumers have their own enhanced fan-out and the archiving
+        # function polls the Kinesis data stream instead.
+        dynamodb_stream_readers = 0 if kinesis \
+            else consumers + (1 if archive else 0)
+
+        # Past the limit the readers are throttled, which existing stacks
+        # may accept, so they are warned rather than failed
+        if dynamodb_stream_readers > DYNAMODB_STREAM_MAX_READERS:
+            Annotations.of(self).add_warning(
+                (f"{dynamodb_stream_readers} readers of the DynamoDB stream "
+                 f"exceed {DYNAMODB_STREAM_MAX_READERS} and are throttled, "
+                 "use the kinesis transport"))
+
+        provisioned = billing_mode == "provisioned"
+
         self.__error_handling_topic_key = Key(
             self,
             "ErrorHandlingTopicKey",
@@ -86,6 +201,36 @@ class EventProcessingConstruct(Construct):
             pending_window=Duration.days(pending_window),
             removal_policy=removal_policy,
         )
+        self.__jobs_store_layer = LayerVersion(
+            self,
+            "JobsStoreLayer",
+            code=Code.from_asset(
+                str(
+                    Path(__file__).
+                    parent.
+                    parent.
+                    parent.
+                    joinpath("jobs_store").
+                    resolve()
+                ),
+                bundling=BundlingOptions(
+                    command=[
+                        "bash",
+                        "-c",
+                        ("mkdir --parents /asset-output/python/jobs_store && "
+                         "cp /asset-input/*.py "
+                         "--target-directory "
+                         "/asset-output/python/jobs_store"),
+                    ],
+                    image=Runtime.PYTHON_3_9.bundling_image,
+                ),
+            ),
+            compatible_runtimes=[
+                Runtime.PYTHON_3_9,
+            ],
+            description="Jobs store shared by the event processing functions",
+            license="MIT-0",
+        )
         self.__powertools_layer = LayerVersion(
             self,
             "PowertoolsLayer",
@@ -116,22 +261,107 @@ class EventProcessingConstruct(Construct):
             description="AWS Lambda Powertools for Python",
             license="MIT-0",
         )
+        self.finished_jobs_event_bus = EventBus(
+            self,
+            "FinishedJobsEventBus",
+        ) if notifications else None
+        # Every consumer reads the Kinesis data stream of the table through
+        # its own enhanced fan-out, instead of sharing the read throughput
+        # of each shard of the DynamoDB stream, which throttles more than two
+        # readers
+        self.jobs_stream = Stream(
+            self,
+            "JobsStream",
+            encryption=StreamEncryption.MANAGED,
+            shard_count=kinesis_shard_count,
+        ) if kinesis else None
         self.jobs_table = Table(
             self,
             "JobsTable",
+            billing_mode=BillingMode.PROVISIONED if provisioned
+            else BillingMode.PAY_PER_REQUEST,
             encryption=TableEncryption.CUSTOMER_MANAGED,
             encryption_key=self.__jobs_table_key,
+            kinesis_stream=self.jobs_stream,
             partition_key=Attribute(
                 name="id",
                 type=AttributeType.STRING,
             ),
             point_in_time_recovery=True,
-            read_capacity=read_capacity,
+            read_capacity=read_capacity if provisioned else None,
             removal_policy=removal_policy,
-            stream=StreamViewType.NEW_IMAGE,
-            write_capacity=write_capacity,
+            # The archive is made of the old images of the expired jobs, and
+            # every function reads the Kinesis data stream when there is one
+            stream=None if kinesis
+            else StreamViewType.NEW_AND_OLD_IMAGES if archive
+            else StreamViewType.NEW_IMAGE,
+            time_to_live_attribute="expires_at"
+            if job_retention_days > 0 else None,
+            write_capacity=write_capacity if provisioned else None,
         )
 
+        self.status_index_name = "StatusIndex" if status_index else None
+
+        if self.status_index_name is not None:
+            # Jobs created before the overall status was kept are not indexed
+            self.jobs_table.add_global_secondary_index(
+                index_name=self.status_index_name,
+                partition_key=Attribute(
+                    name="overall_status",
+                    type=AttributeType.STRING,
+                ),
+                projection_type=ProjectionType.KEYS_ONLY,
+                read_capacity=read_capacity if provisioned else None,
+                sort_key=Attribute(
+                    name="submitted_at",
+                    type=AttributeType.NUMBER,
+                ),
+                write_capacity=write_capacity if provisioned else None,
+            )
+
+        # Scale the provisioned capacity between the given capacity and the
+        # maximum one, to keep its utilization at the target
+        if provisioned and max_read_capacity > read_capacity:
+            self.jobs_table.auto_scale_read_capacity(
+                max_capacity=max_read_capacity,
+                min_capacity=read_capacity,
+            ).scale_on_utilization(
+                target_utilization_percent=target_utilization,
+            )
+
+            if self.status_index_name is not None:
+                self.jobs_table.\
+                    auto_scale_global_secondary_index_read_capacity(
+                        self.status_index_name,
+                        max_capacity=max_read_capacity,
+                        min_capacity=read_capacity,
+                    ).scale_on_utilization(
+                        target_utilization_percent=target_utilization,
+                    )
+
+        if provisioned and max_write_capacity > write_capacity:
+            self.jobs_table.auto_scale_write_capacity(
+                max_capacity=max_write_capacity,
+                min_capacity=write_capacity,
+            ).scale_on_utilization(
+                target_utilization_percent=target_utilization,
+            )
+
+            # Writes to the table are throttled when the index cannot keep up
+            if self.status_index_name is not None:
+                self.jobs_table.\
+                    auto_scale_global_secondary_index_write_capacity(
+                        self.status_index_name,
+                        max_capacity=max_write_capacity,
+                        min_capacity=write_capacity,
+                    ).scale_on_utilization(
+                        target_utilization_percent=target_utilization,
+                    )
+
+        # The outcomes of each window are aggregated in its state
+        consumer_tumbling_window = Duration.seconds(tumbling_window) \
+            if tumbling_window > 0 else None
+
         for consumer in range(consumers):
             consumer_id = consumer + 1
             consumer_function = Function(
@@ -158,18 +388,45 @@ class EventProcessingConstruct(Construct):
                     ),
                 ),
                 environment={
+                    "BACKOFF_BASE_MILLISECONDS": str(backoff_base_milliseconds),
+                    "BACKOFF_CAP_MILLISECONDS": str(backoff_cap_milliseconds),
+                    "BACKOFF_STRATEGY": backoff_strategy,
+                    "CHECKPOINTING": str(checkpointing).lower(),
+                    "CLIENT_CONNECT_TIMEOUT_MILLISECONDS": str(client_connect_timeout_milliseconds),
+                    "CLIENT_MAX_ATTEMPTS": str(client_max_attempts),
+                    # Every record processed concurrently needs a connection
+                    "CLIENT_MAX_POOL_CONNECTIONS": str(max(client_max_pool_connections, record_concurrency)),
+                    "CLIENT_READ_TIMEOUT_MILLISECONDS": str(client_read_timeout_milliseconds),
+                    "CLIENT_RETRY_MODE": client_retry_mode,
+                    "CLIENT_TCP_KEEPALIVE": str(client_tcp_keepalive).lower(),
                     "CONSUMER_ID": f"consumer_{consumer_id}",
+                    "CONSUMERS": str(consumers),
+                    "DEBUG_SAMPLE_RATE": str(debug_sample_rate),
+                    "LOG_LEVEL": log_level,
+                    "LOG_MAX_PAYLOAD_BYTES": str(log_max_payload_bytes),
+                    "LOG_REDACTED_KEYS": ",".join(log_redacted_keys),
+                    "METRICS_NAMESPACE": metrics_namespace,
                     "OPTIMISTIC_LOCKING_RETRY_ATTEMPTS": str(optmistic_locking_retry_attempts),
+                    "RECORD_CONCURRENCY": str(record_concurrency),
+                    "RETENTION_SECONDS": str(job_retention_days * 86400),
+                    "RUNNING_STATUS_THRESHOLD": str(running_status_threshold),
+                    "RUNNING_STATUS_WRITE_POLICY": running_status_write_policy,
+                    "STATUS_INDEX": str(status_index).lower(),
                     "TABLE_NAME": self.jobs_table.table_name,
+                    "TRACING": str(tracing).lower(),
                     "TIMEOUT": str(event_processing_timeout),
+                    "TRANSPORT": transport,
+                    "UPSERT_MODE": upsert_mode,
                 },
                 handler="main.handler",
                 layers=[
+                    self.__jobs_store_layer,
                     self.__powertools_layer,
                 ],
                 reserved_concurrent_executions=reserved_concurrent_executions,
                 runtime=Runtime.PYTHON_3_9,
                 timeout=Duration.seconds(event_processing_timeout),
+                tracing=Tracing.ACTIVE if tracing else Tracing.DISABLED,
             )
             error_handling_topic = Topic(
                 self,
@@ -200,36 +457,140 @@ class EventProcessingConstruct(Construct):
                     ),
                 ),
                 environment={
+                    "BACKOFF_BASE_MILLISECONDS": str(backoff_base_milliseconds),
+                    "BACKOFF_CAP_MILLISECONDS": str(backoff_cap_milliseconds),
+                    "BACKOFF_STRATEGY": backoff_strategy,
+                    "CLIENT_CONNECT_TIMEOUT_MILLISECONDS": str(client_connect_timeout_milliseconds),
+                    "CLIENT_MAX_ATTEMPTS": str(client_max_attempts),
+                    "CLIENT_MAX_POOL_CONNECTIONS": str(max(
+                        client_max_pool_connections,
+                        error_handling_concurrency,
+                    )),
+                    "CLIENT_READ_TIMEOUT_MILLISECONDS": str(client_read_timeout_milliseconds),
+                    "CLIENT_RETRY_MODE": client_retry_mode,
+                    "CLIENT_TCP_KEEPALIVE": str(client_tcp_keepalive).lower(),
                     "CONSUMER_ID": f"consumer_{consumer_id}",
+                    "CONSUMERS": str(consumers),
+                    "DEBUG_SAMPLE_RATE": str(debug_sample_rate),
+                    "ERROR_HANDLING_CONCURRENCY": str(error_handling_concurrency),
+                    "LOG_LEVEL": log_level,
+                    "LOG_MAX_PAYLOAD_BYTES": str(log_max_payload_bytes),
+                    "LOG_REDACTED_KEYS": ",".join(log_redacted_keys),
+                    "METRICS_NAMESPACE": metrics_namespace,
                     "OPTIMISTIC_LOCKING_RETRY_ATTEMPTS": str(optmistic_locking_retry_attempts),
+                    "PARALLELIZATION_FACTOR": str(parallelization_factor),
+                    "RETENTION_SECONDS": str(job_retention_days * 86400),
+                    "STATUS_INDEX": str(status_index).lower(),
                     "TABLE_NAME": self.jobs_table.table_name,
+                    "TRACING": str(tracing).lower(),
+                    "UPSERT_MODE": upsert_mode,
                 },
                 handler="main.handler",
                 layers=[
+                    self.__jobs_store_layer,
                     self.__powertools_layer,
                 ],
                 max_event_age=Duration.seconds(max_event_age),
-                on_failure=EventBridgeDestination(self.__failed_jobs_event_bus),
+                on_failure=EventBridgeDestination(
+                    self.__failed_jobs_event_bus),
                 reserved_concurrent_executions=reserved_concurrent_executions,
                 retry_attempts=retry_attempts,
                 runtime=Runtime.PYTHON_3_9,
                 timeout=Duration.seconds(error_handling_timeout),
+                tracing=Tracing.ACTIVE if tracing else Tracing.DISABLED,
             )
 
-            consumer_function.add_event_source(
-                DynamoEventSource(
-                    batch_size=1,  # Ensure processing of one event at a time
-                    filters=[
-                        aws_lambda.FilterCriteria.filter(
-                            {
-                                "eventName": aws_lambda.FilterRule.is_equal("INSERT")}),
-                    ],
+            consumer_patterns = [
+                {
+                    "eventName": aws_lambda.FilterRule.is_equal("INSERT"),
+                },
+            ]
+
+            if checkpointing:
+                # Continue jobs from the checkpoints of this consumer
+                consumer_patterns.append(
+                    {
+                        "dynamodb": {
+                            "NewImage": {
+                                "job_status": {
+                                    "M": {
+                                        f"consumer_{consumer_id}": {
+                                            "M": {
+                                                "status": {
+                                                    "S": aws_lambda.FilterRule.is_equal("Checkpointed"),
+                                                },
+                                            },
+                                        },
+                                    },
+                                },
+                            },
+                        },
+                        "eventName": aws_lambda.FilterRule.is_equal("MODIFY"),
+                    })
+
+            # Kinesis records carry the change in their data
+            consumer_filters = [
+                aws_lambda.FilterCriteria.filter(
+                    {"data": pattern} if kinesis else pattern)
+                for pattern in consumer_patterns
+            ]
+
+            if kinesis:
+                stream_consumer = CfnStreamConsumer(
+                    self,
+                    f"Consumer{consumer_id}StreamConsumer",
+                    consumer_name=f"consumer_{consumer_id}",
+                    stream_arn=self.jobs_stream.stream_arn,
+                )
+
+                consumer_function.add_event_source_mapping(
+                    f"Consumer{consumer_id}EventSourceMapping",
+                    batch_size=batch_size,
+                    bisect_batch_on_error=bisect_batch_on_function_error,
+                    event_source_arn=stream_consumer.attr_consumer_arn,
+                    filters=consumer_filters,
+                    max_batching_window=Duration.seconds(
+                        max_batching_window),
                     max_record_age=Duration.seconds(max_record_age),
-                    on_failure=SnsDestination(error_handling_topic),
+                    on_failure=SnsDlq(error_handling_topic),
+                    parallelization_factor=parallelization_factor,
+                    report_batch_item_failures=True,
                     retry_attempts=retry_attempts,
                     starting_position=aws_lambda.StartingPosition.LATEST,
-                    table=self.jobs_table,
-                ))
+                    tumbling_window=consumer_tumbling_window,
+                )
+                consumer_function.add_to_role_policy(
+                    PolicyStatement(
+                        actions=[
+                            "kinesis:DescribeStreamConsumer",
+                            "kinesis:SubscribeToShard",
+                        ],
+                        resources=[
+                            stream_consumer.attr_consumer_arn,
+                        ],
+                    ),
+                )
+                self.jobs_stream.grant_read(consumer_function)
+                self.jobs_stream.grant_read(error_handling_function)
+            else:
+                consumer_function.add_event_source(
+                    DynamoEventSource(
+                        batch_size=batch_size,
+                        bisect_batch_on_error=bisect_batch_on_function_error,
+                        filters=consumer_filters,
+                        max_batching_window=Duration.seconds(
+                            max_batching_window),
+                        max_record_age=Duration.seconds(max_record_age),
+                        on_failure=SnsDestination(error_handling_topic),
+                        parallelization_factor=parallelization_factor,
+                        report_batch_item_failures=True,
+                        retry_attempts=retry_attempts,
+                        starting_position=aws_lambda.StartingPosition.LATEST,
+                        table=self.jobs_table,
+                        tumbling_window=consumer_tumbling_window,
+                    ))
+                self.jobs_table.grant_stream_read(error_handling_function)
+
             consumer_function.node.default_child.add_metadata(
                 "checkov",
                 {
@@ -281,10 +642,214 @@ class EventProcessingConstruct(Construct):
                 consumer_function)
             self.jobs_table.grant_read_write_data(consumer_function)
             self.jobs_table.grant_read_write_data(error_handling_function)
-            self.jobs_table.grant_stream_read(error_handling_function)
+
+            if self.finished_jobs_event_bus is not None:
+                for function in [consumer_function, error_handling_function]:
+                    function.add_environment(
+                        "NOTIFICATION_EVENT_BUS_NAME",
+                        self.finished_jobs_event_bus.event_bus_name,
+                    )
+                    self.finished_jobs_event_bus.grant_put_events_to(function)
 
         self.__failed_jobs_event_bus.archive(
             "FailedJobsEventArchive",
             description="Failed Jobs Event Archive",
             event_pattern=EventPattern(),
         )
+
+        if archive:
+            self.archive_bucket = Bucket(
+                self,
+                "ArchiveBucket",
+                block_public_access=BlockPublicAccess.BLOCK_ALL,
+                encryption=BucketEncryption.S3_MANAGED,
+                enforce_ssl=True,
+                lifecycle_rules=[
+                    LifecycleRule(
+                        transitions=[
+                            Transition(
+                                storage_class=StorageClass.GLACIER,
+                                transition_after=Duration.days(
+                                    archive_transition_days),
+                            ),
+                        ],
+                    ),
+                ],
+                removal_policy=removal_policy,
+            )
+            archiving_function = Function(
+                self,
+                "ArchivingFunction",
+                code=Code.from_asset(
+                    str(
+                        Path(__file__).
+                        parent.
+                        parent.
+                        parent.
+                        joinpath("archiving").
+                        resolve()
+                    ),
+                    bundling=BundlingOptions(
+                        command=[
+                            "bash",
+                            "-c",
+                            ("cp /asset-input/main.py "
+                             "--target /asset-output "
+                             "--update"),
+                        ],
+                        image=Runtime.PYTHON_3_9.bundling_image,
+                    ),
+                ),
+                environment={
+                    "ARCHIVE_BUCKET_NAME": self.archive_bucket.bucket_name,
+                    "CLIENT_CONNECT_TIMEOUT_MILLISECONDS": str(client_connect_timeout_milliseconds),
+                    "CLIENT_MAX_ATTEMPTS": str(client_max_attempts),
+                    "CLIENT_MAX_POOL_CONNECTIONS": str(client_max_pool_connections),
+                    "CLIENT_READ_TIMEOUT_MILLISECONDS": str(client_read_timeout_milliseconds),
+                    "CLIENT_RETRY_MODE": client_retry_mode,
+                    "CLIENT_TCP_KEEPALIVE": str(client_tcp_keepalive).lower(),
+                    "DEBUG_SAMPLE_RATE": str(debug_sample_rate),
+                    "LOG_LEVEL": log_level,
+                    "LOG_MAX_PAYLOAD_BYTES": str(log_max_payload_bytes),
+                    "LOG_REDACTED_KEYS": ",".join(log_redacted_keys),
+                    "METRICS_NAMESPACE": metrics_namespace,
+                    "TRACING": str(tracing).lower(),
+                },
+                handler="main.handler",
+                layers=[
+                    self.__jobs_store_layer,
+                    self.__powertools_layer,
+                ],
+                runtime=Runtime.PYTHON_3_9,
+                timeout=Duration.seconds(60),
+                tracing=Tracing.ACTIVE if tracing else Tracing.DISABLED,
+            )
+
+            # Only the deletions of expired jobs by TTL are archived, and
+            # failed batches are retried until they are older than the
+            # maximum record age
+            archive_pattern = {
+                "eventName": aws_lambda.FilterRule.is_equal("REMOVE"),
+                "userIdentity": {
+                    "principalId": aws_lambda.FilterRule.is_equal("dynamodb.amazonaws.com"),
+                    "type": aws_lambda.FilterRule.is_equal("Service"),
+                },
+            }
+
+            if kinesis:
+                archiving_function.add_event_source_mapping(
+                    "ArchivingEventSourceMapping",
+                    batch_size=archive_batch_size,
+                    event_source_arn=self.jobs_stream.stream_arn,
+                    filters=[
+                        aws_lambda.FilterCriteria.filter(
+                            {"data": archive_pattern}),
+                    ],
+                    max_batching_window=Duration.seconds(
+                        archive_batching_window),
+                    max_record_age=Duration.seconds(max_record_age),
+                    starting_position=aws_lambda.StartingPosition.LATEST,
+                )
+                self.jobs_stream.grant_read(archiving_function)
+            else:
+                archiving_function.add_event_source(
+                    DynamoEventSource(
+                        batch_size=archive_batch_size,
+                        filters=[
+                            aws_lambda.FilterCriteria.filter(archive_pattern),
+                        ],
+                        max_batching_window=Duration.seconds(
+                            archive_batching_window),
+                        max_record_age=Duration.seconds(max_record_age),
+                        starting_position=aws_lambda.StartingPosition.LATEST,
+                        table=self.jobs_table,
+                    ))
+                self.jobs_table.grant_stream_read(archiving_function)
+
+            archiving_function.node.default_child.add_metadata(
+                "checkov",
+                {
+                    "skip": [
+                        {
+                            "comment": ("Failed batches are retried "
+                                        "until they expire"),
+                            "id": "CKV_AWS_116",
+                        },
+                        {
+                            "comment": ("This function is not meant "
+                                        "to be run inside a VPC"),
+                            "id": "CKV_AWS_117",
+                        },
+                        {
+                            "comment": ("A customer managed key "
+                                        "is not required"),
+                            "id": "CKV_AWS_173",
+                        },
+                    ],
+                },
+            )
+            self.archive_bucket.node.default_child.add_metadata(
+                "checkov",
+                {
+                    "skip": [
+                        {
+                            "comment": ("Access logging is not required "
+                                        "for the archive"),
+                            "id": "CKV_AWS_18",
+                        },
+                        {
+                            "comment": ("Archives are written once "
+                                        "and never updated"),
+                            "id": "CKV_AWS_21",
+                        },
+                    ],
+                },
+            )
+            self.archive_bucket.grant_put(archiving_function)
+
+        if self.finished_jobs_event_bus is not None and \
+                notification_endpoint is not None:
+            if notification_endpoint_api_key_secret is None:
+                raise ValueError(
+                    "The notification endpoint requires an API key secret")
+
+            # Deliver the completion events to the endpoint of the clients
+            notification_connection = Connection(
+                self,
+                "NotificationConnection",
+                authorization=Authorization.api_key(
+                    "x-api-key",
+                    SecretValue.secrets_manager(
+                        notification_endpoint_api_key_secret),
+                ),
+                description="Connection to the notification endpoint",
+            )
+            notification_destination = ApiDestination(
+                self,
+                "NotificationDestination",
+                connection=notification_connection,
+                description="Notification endpoint",
+                endpoint=notification_endpoint,
+                http_method=HttpMethod.POST,
+            )
+
+            Rule(
+                self,
+                "NotificationRule",
+                description="Deliver the completion events of the jobs",
+                event_bus=self.finished_jobs_event_bus,
+                event_pattern=EventPattern(
+                    detail_type=[
+                        "Job Finished",
+                    ],
+                    source=[
+                        "jobs",
+                    ],
+                ),
+                targets=[
+                    aws_events_targets.ApiDestination(
+                        notification_destination,
+                        event=RuleTargetInput.from_event_path("$.detail"),
+                    ),
+                ],
+            )
@@ -11,12 +11,12 @@ from aws_cdk.aws_apigateway import (
     IntegrationOptions,
     IntegrationResponse,
     LogGroupLogDestination,
+    MethodDeploymentOptions,
     MethodResponse,
     Model,
     PassthroughBehavior,
     RestApi,
     StageOptions,
-    RequestValidatorOptions,
     JsonSchema,
     JsonSchemaType,
     JsonSchemaVersion,
@@ -48,6 +48,30 @@ from json import (
 from pathlib import (
     Path,
 )
+from re import (
+    MULTILINE,
+    sub,
+)
+from typing import (
+    List,
+)
+
+BATCH_GET_ITEM_MAX_KEYS = 100
+BATCH_EXECUTE_STATEMENT_MAX_STATEMENTS = 25
+TEMPLATES_PATH = Path("infrastructure/jobs_api")
+
+
+def read_template(name: str) -> str:
+    """
+    Reads a mapping template, replacing each #parse directive with the
+    template it names, as API Gateway does not resolve them.
+    """
+    return sub(
+        r'^#parse\("([^"]+)"\)$',
+        lambda match: read_template(match.group(1)).rstrip("\n"),
+        (TEMPLATES_PATH / name).read_text(),
+        flags=MULTILINE,
+    )
 
 
 class JobsApiConstruct(Construct):
@@ -55,6 +79,8 @@ class JobsApiConstruct(Construct):
         self,
         scope: Construct,
         construct_id: str,
+        cache_cluster_size: str = "0.5",
+        cache_ttl: int = 0,
         pending_window: int = 7,
         removal_policy: RemovalPolicy = RemovalPolicy.DESTROY,
         retetion: RetentionDays = RetentionDays.ONE_MONTH,
@@ -65,6 +91,8 @@ class JobsApiConstruct(Construct):
             construct_id,
         )
 
+        self.__cache_ttl = cache_ttl
+
         self.__jobs_api_access_log_group_name = \
             "/aws/apigateway/JobsAPIAccessLogs"
         self.__jobs_api_access_log_key = Key(
@@ -91,6 +119,21 @@ class JobsApiConstruct(Construct):
                 access_log_destination=LogGroupLogDestination(
                     self.__jobs_api_access_log_group,
                 ),
+                cache_cluster_enabled=cache_ttl > 0,
+                cache_cluster_size=cache_cluster_size
+                if cache_ttl > 0 else None,
+                # The stage cache stores every response of a cached method,
+                # whatever its status or Cache-Control header
+                method_options={
+                    "/jobs/{jobId}/GET": MethodDeploymentOptions(
+                        cache_data_encrypted=True,
+                        cache_ttl=Duration.seconds(cache_ttl),
+                        caching_enabled=True,
+                    ),
+                    "/jobs/{jobId}/status/GET": MethodDeploymentOptions(
+                        caching_enabled=False,
+                    ),
+                } if cache_ttl > 0 else None,
                 stage_name=stage_name,
                 tracing_enabled=True,
             ),
@@ -122,8 +165,90 @@ class JobsApiConstruct(Construct):
                 type=JsonSchemaType.OBJECT,
             ),
         )
+        self.__jobs_batch_request_model = Model(
+            self,
+            "JobsBatchRequestModel",
+            content_type="application/json",
+            description="Model for requests to /jobs/batch",
+            model_name="JobsBatchRequest",
+            rest_api=self.__jobs_api,
+            schema=JsonSchema(
+                properties={
+                    "jobs": JsonSchema(
+                        items=JsonSchema(
+                            properties={
+                                "seconds": JsonSchema(
+                                    minimum=1,
+                                    type=JsonSchemaType.INTEGER,
+                                ),
+                            },
+                            required=[
+                                "seconds",
+                            ],
+                            type=JsonSchemaType.OBJECT,
+                        ),
+                        max_items=BATCH_EXECUTE_STATEMENT_MAX_STATEMENTS,
+                        min_items=1,
+                        type=JsonSchemaType.ARRAY,
+                    ),
+                },
+                required=[
+                    "jobs",
+                ],
+                schema=JsonSchemaVersion.DRAFT4,
+                title="Jobs Batch Request Schema",
+                type=JsonSchemaType.OBJECT,
+            ),
+        )
+        self.__jobs_status_request_model = Model(
+            self,
+            "JobsStatusRequestModel",
+            content_type="application/json",
+            description="Model for requests to /jobs/status",
+            model_name="JobsStatusRequest",
+            rest_api=self.__jobs_api,
+            schema=JsonSchema(
+                properties={
+                    "ids": JsonSchema(
+                        items=JsonSchema(
+                            min_length=1,
+                            type=JsonSchemaType.STRING,
+                        ),
+                        max_items=BATCH_GET_ITEM_MAX_KEYS,
+                        min_items=1,
+                        type=JsonSchemaType.ARRAY,
+                        unique_items=True,
+                    ),
+                },
+                required=[
+                    "ids",
+                ],
+                schema=JsonSchemaVersion.DRAFT4,
+                title="Jobs Status Request Schema",
+                type=JsonSchemaType.OBJECT,
+            ),
+        )
+        # Each add_method with request_validator_options adds a construct
+        # named validator to the API, so the validators are shared
+        self.__body_validator = self.__jobs_api.add_request_validator(
+            "JobsAPIBodyValidator",
+            validate_request_body=True,
+            validate_request_parameters=True,
+        )
+        self.__parameters_validator = self.__jobs_api.add_request_validator(
+            "JobsAPIParametersValidator",
+            validate_request_body=False,
+            validate_request_parameters=True,
+        )
         self.__jobs_resource = self.__jobs_api.root.add_resource("jobs")
         self.__job_id_resource = self.__jobs_resource.add_resource("{jobId}")
+        self.__job_id_status_resource = \
+            self.__job_id_resource.add_resource("status") \
+            if cache_ttl > 0 else None
+        self.__jobs_batch_resource = \
+            self.__jobs_resource.add_resource("batch")
+        self.__jobs_status_resource = \
+            self.__jobs_resource.add_resource("status")
         self.__passthrough_behavior = PassthroughBehavior.WHEN_NO_TEMPLATES
         self.jobs_api_execution_role = Role(
             self,
@@ -136,18 +261,20 @@ class JobsApiConstruct(Construct):
             assumed_by=AccountPrincipal(Stack.of(self).account),
         )
 
-        self.__jobs_api.deployment_stage.node.default_child.add_metadata(
-            "checkov",
-            {
-                "skip": [
-                    {
-                        "comment": ("API Gateway caching "
-                                    "is not required"),
-                        "id": "CKV_AWS_120",
-                    },
-                ],
-            },
-        )
+        if cache_ttl == 0:
+            self.__jobs_api.deployment_stage.node.default_child.add_metadata(
+                "checkov",
+                {
+                    "skip": [
+                        {
+                            "comment": ("API Gateway caching "
+                                        "is not required"),
+                            "id": "CKV_AWS_120",
+                        },
+                    ],
+                },
+            )
+
         self.__jobs_api_invoke_role_policy.attach_to_role(
             self.jobs_api_invoke_role,
         )
@@ -155,49 +282,44 @@ class JobsApiConstruct(Construct):
     def add_job_id_method(
         self,
         jobs_table: Table,
+        consumers: int = 2,
     ) -> None:
-        response_template = Path(
-            'infrastructure/jobs_api/get_item_mapping_template.vm').read_text()
-        __job_id_method = self.__job_id_resource.add_method(
-            "GET",
-            authorization_type=AuthorizationType.IAM,
-            integration=AwsIntegration(
-                action="GetItem",
-                options=IntegrationOptions(
-                    credentials_role=self.jobs_api_execution_role,
-                    passthrough_behavior=self.__passthrough_behavior,
-                    integration_responses=[
-                        IntegrationResponse(
-                            response_templates={
-                                "application/json": response_template,
-                            },
-                            status_code="200",
-                        ),
-                    ],
-                    request_templates={
-                        "application/json": dumps({
-                            "Key": {
-                                "id": {
-                                    "S": "$input.params('jobId')",
-                                },
-                            },
-                            "TableName": jobs_table.table_name,
-                        }),
-                    }),
-                service="dynamodb",
+        """
+        Adds GET /jobs/{jobId}. When the stage cache is on, it is keyed on
+        jobId and every response is cached for the cache TTL, so a job in
+        flight can be seen with a stale status for up to the TTL. Such jobs
+        are answered with 202, and GET /jobs/{jobId}/status, which is not
+        cached, is added for clients to poll them until they are finished,
+        when they are answered with 200 and a max-age Cache-Control header.
+        """
+        __job_id_methods = [
+            self.__job_id_resource.add_method(
+                "GET",
+                authorization_type=AuthorizationType.IAM,
+                integration=self.__get_item_integration(
+                    jobs_table, consumers, cache_ttl=self.__cache_ttl),
+                method_responses=self.__get_item_method_responses(
+                    cache_ttl=self.__cache_ttl),
+                request_parameters={
+                    "method.request.path.jobId": True,
+                },
             ),
-            method_responses=[
-                MethodResponse(
-                    response_models={
-                        "application/json": Model.EMPTY_MODEL,
-                    },
-                    response_parameters={
-                        "method.response.header.Content-Type": True,
+        ]
+
+        if self.__job_id_status_resource is not None:
+            __job_id_methods.append(
+                self.__job_id_status_resource.add_method(
+                    "GET",
+                    authorization_type=AuthorizationType.IAM,
+                    integration=self.__get_item_integration(
+                        jobs_table, consumers, cache_ttl=0),
+                    method_responses=self.__get_item_method_responses(
+                        cache_ttl=0),
+                    request_parameters={
+                        "method.request.path.jobId": True,
                     },
-                    status_code="200",
                 ),
-            ],
-        )
+            )
 
         self.__jobs_api_access_log_key.grant_encrypt_decrypt(
             ServicePrincipal(
@@ -224,11 +346,75 @@ class JobsApiConstruct(Construct):
                 ],
                 effect=Effect.ALLOW,
                 resources=[
-                    __job_id_method.method_arn,
+                    __job_id_method.method_arn
+                    for __job_id_method in __job_id_methods
                 ],
             ),
         )
 
+    def __get_item_integration(
+        self,
+        jobs_table: Table,
+        consumers: int,
+        cache_ttl: int,
+    ) -> AwsIntegration:
+        response_template = "\n".join([
+            f"#set($cacheTtl = {cache_ttl})",
+            f"#set($consumers = {consumers})",
+            read_template("get_item_mapping_template.vm"),
+        ])
+
+        return AwsIntegration(
+            action="GetItem",
+            options=IntegrationOptions(
+                cache_key_parameters=[
+                    "method.request.path.jobId",
+                ] if cache_ttl > 0 else None,
+                credentials_role=self.jobs_api_execution_role,
+                passthrough_behavior=self.__passthrough_behavior,
+                integration_responses=[
+                    IntegrationResponse(
+                        response_templates={
+                            "application/json": response_template,
+                        },
+                        status_code="200",
+                    ),
+                ],
+                request_templates={
+                    "application/json": dumps({
+                        "Key": {
+                            "id": {
+                                "S": "$input.params('jobId')",
+                            },
+                        },
+                        "TableName": jobs_table.table_name,
+                    }),
+                }),
+            service="dynamodb",
+        )
+
+    def __get_item_method_responses(
+        self,
+        cache_ttl: int,
+    ) -> List[MethodResponse]:
+        response_parameters = {
+            "method.response.header.Cache-Control": True,
+            "method.response.header.Content-Type": True,
+        } if cache_ttl > 0 else {
+            "method.response.header.Content-Type": True,
+        }
+
+        return [
+            MethodResponse(
+                response_models={
+                    "application/json": Model.EMPTY_MODEL,
+                },
+                response_parameters=response_parameters,
+                status_code=status_code,
+            )
+            for status_code in (["200", "202"] if cache_ttl > 0 else ["200"])
+        ]
+
     def add_jobs_method(
         self,
         jobs_table: Table,
@@ -256,7 +442,11 @@ class JobsApiConstruct(Construct):
                             "Item": {
                                 "id": {"S": "$context.requestId"},
                                 "job_status": {"M": {}},
+                                "overall_status": {"S": "Submitted"},
                                 "seconds": {"N": "$input.path('$.seconds')"},
+                                "submitted_at": {
+                                    "N": "$context.requestTimeEpoch",
+                                },
                                 "version": {"N": "0"},
                             },
                             "TableName": jobs_table.table_name,
@@ -267,10 +457,7 @@ class JobsApiConstruct(Construct):
             request_models={
                 "application/json": self.__jobs_request_model,
             },
-            request_validator_options=RequestValidatorOptions(
-                validate_request_body=True,
-                validate_request_parameters=False,
-            ),
+            request_validator=self.__body_validator,
         )
 
         __jobs_method.add_method_response(
@@ -294,3 +481,212 @@ class JobsApiConstruct(Construct):
                 ],
             ),
         )
+
+    def add_jobs_batch_method(
+        self,
+        jobs_table: Table,
+    ) -> None:
+        """
+        Adds POST /jobs/batch, which creates up to
+        BATCH_EXECUTE_STATEMENT_MAX_STATEMENTS jobs with a single
+        BatchExecuteStatement of INSERT statements, with ids made of the
+        request id and the position of the job in the request. Unlike
+        BatchWriteItem, it answers each statement in order, so the ids of
+        the jobs written are returned, along with the ids and error codes of
+        the jobs that were not, which the client can submit again.
+        """
+        request_template = "\n".join([
+            f'#set($tableName = "{jobs_table.table_name}")',
+            read_template("batch_execute_statement_request_template.vm"),
+        ])
+
+        __jobs_batch_method = self.__jobs_batch_resource.add_method(
+            "POST",
+            authorization_type=AuthorizationType.IAM,
+            integration=AwsIntegration(
+                action="BatchExecuteStatement",
+                options=IntegrationOptions(
+                    credentials_role=self.jobs_api_execution_role,
+                    passthrough_behavior=self.__passthrough_behavior,
+                    integration_responses=[
+                        IntegrationResponse(
+                            response_templates={
+                                "application/json": read_template(
+                                    "batch_execute_statement_mapping_template"
+                                    ".vm"),
+                            },
+                            status_code="200",
+                        ),
+                    ],
+                    request_templates={
+                        "application/json": request_template,
+                    }),
+                service="dynamodb",
+            ),
+            method_responses=[
+                MethodResponse(
+                    response_models={
+                        "application/json": Model.EMPTY_MODEL,
+                    },
+                    response_parameters={
+                        "method.response.header.Content-Type": True,
+                    },
+                    status_code="200",
+                ),
+            ],
+            request_models={
+                "application/json": self.__jobs_batch_request_model,
+            },
+            request_validator=self.__body_validator,
+        )
+
+        self.__jobs_api_invoke_role_policy.add_statements(
+            PolicyStatement(
+                actions=[
+                    "execute-api:Invoke",
+                ],
+                effect=Effect.ALLOW,
+                resources=[
+                    __jobs_batch_method.method_arn,
+                ],
+            ),
+        )
+
+    def add_jobs_list_method(
+        self,
+        index_name: str,
+        jobs_table: Table,
+    ) -> None:
+        """
+        Adds GET /jobs?status=&since=&limit=&cursor=, which queries the
+        status index for the jobs with the given overall status, submitted
+        since the given epoch millisecond when given, newest first. When
+        there are more jobs, the response has an opaque cursor to pass to
+        get the next page.
+        """
+        request_template = "\n".join([
+            f'#set($indexName = "{index_name}")',
+            f'#set($tableName = "{jobs_table.table_name}")',
+            read_template("query_request_template.vm"),
+        ])
+
+        __jobs_list_method = self.__jobs_resource.add_method(
+            "GET",
+            authorization_type=AuthorizationType.IAM,
+            integration=AwsIntegration(
+                action="Query",
+                options=IntegrationOptions(
+                    credentials_role=self.jobs_api_execution_role,
+                    passthrough_behavior=self.__passthrough_behavior,
+                    integration_responses=[
+                        IntegrationResponse(
+                            response_templates={
+                                "application/json": read_template(
+                                    "query_mapping_template.vm"),
+                            },
+                            status_code="200",
+                        ),
+                    ],
+                    request_templates={
+                        "application/json": request_template,
+                    }),
+                service="dynamodb",
+            ),
+            method_responses=[
+                MethodResponse(
+                    response_models={
+                        "application/json": Model.EMPTY_MODEL,
+                    },
+                    response_parameters={
+                        "method.response.header.Content-Type": True,
+                    },
+                    status_code="200",
+                ),
+            ],
+            request_parameters={
+                "method.request.querystring.cursor": False,
+                "method.request.querystring.limit": False,
+                "method.request.querystring.since": False,
+                "method.request.querystring.status": True,
+            },
+            request_validator=self.__parameters_validator,
+        )
+
+        self.__jobs_api_invoke_role_policy.add_statements(
+            PolicyStatement(
+                actions=[
+                    "execute-api:Invoke",
+                ],
+                effect=Effect.ALLOW,
+                resources=[
+                    __jobs_list_method.method_arn,
+                ],
+            ),
+        )
+
+    def add_jobs_status_method(
+        self,
+        jobs_table: Table,
+    ) -> None:
+        """
+        Adds POST /jobs/status, which reads the status of up to
+        BATCH_GET_ITEM_MAX_KEYS distinct jobs with a single BatchGetItem.
+        Each job found is rendered as in GET /jobs/{jobId}, keyed on its id,
+        and the ids of the unprocessed keys are returned so that the client
+        can request them again.
+        """
+        request_template = "\n".join([
+            f'#set($tableName = "{jobs_table.table_name}")',
+            read_template("batch_get_item_request_template.vm"),
+        ])
+
+        __jobs_status_method = self.__jobs_status_resource.add_method(
+            "POST",
+            authorization_type=AuthorizationType.IAM,
+            integration=AwsIntegration(
+                action="BatchGetItem",
+                options=IntegrationOptions(
+                    credentials_role=self.jobs_api_execution_role,
+                    passthrough_behavior=self.__passthrough_behavior,
+                    integration_responses=[
+                        IntegrationResponse(
+                            response_templates={
+                                "application/json": read_template(
+                                    "batch_get_item_mapping_template.vm"),
+                            },
+                            status_code="200",
+                        ),
+                    ],
+                    request_templates={
+                        "application/json": request_template,
+                    }),
+                service="dynamodb",
+            ),
+            method_responses=[
+                MethodResponse(
+                    response_models={
+                        "application/json": Model.EMPTY_MODEL,
+                    },
+                    response_parameters={
+                        "method.response.header.Content-Type": True,
+                    },
+                    status_code="200",
+                ),
+            ],
+            request_models={
+                "application/json": self.__jobs_status_request_model,
+            },
+            request_validator=self.__body_validator,
+        )
+
+        self.__jobs_api_invoke_role_policy.add_statements(
+            PolicyStatement(
+                actions=[
+                    "execute-api:Invoke",
+                ],
+                effect=Effect.ALLOW,
+                resources=[
+                    __jobs_status_method.method_arn,
+                ],
+            ),
+        )
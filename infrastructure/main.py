@@ -22,9 +22,19 @@ class InfrastructureStack(Stack):
         self,
         scope: Construct,
         construct_id: str,
+        archive: bool = False,
+        billing_mode: str = "provisioned",
+        cache_ttl: int = 0,
+        consumers: int = 2,
         error_handling_timeout: int = 5,
         event_processing_timeout: int = 300,
+        job_retention_days: int = 0,
+        max_batching_window: int = 0,
         max_event_age: int = 21600,
+        max_read_capacity: int = 0,
+        max_write_capacity: int = 0,
+        notifications: bool = False,
+        parallelization_factor: int = 1,
         pending_window: int = 7,
         read_capacity: int = 5,
         removal_policy: RemovalPolicy = RemovalPolicy.DESTROY,
@@ -32,6 +42,11 @@ class InfrastructureStack(Stack):
         retetion: RetentionDays = RetentionDays.ONE_MONTH,
         retry_attempts: int = 0,
         stage_name: str = "dev",
+        status_index: bool = False,
+        target_utilization: int = 70,
+        transport: str = "dynamodb_streams",
+        tumbling_window: int = 0,
+        upsert_mode: str = "optimistic_locking",
         write_capacity: int = 5,
         **kwargs,
     ) -> None:
@@ -44,19 +59,34 @@ class InfrastructureStack(Stack):
         self.__event_processing = EventProcessingConstruct(
             self,
             "EventProcessing",
+            archive=archive,
+            billing_mode=billing_mode,
+            consumers=consumers,
             error_handling_timeout=error_handling_timeout,
             event_processing_timeout=event_processing_timeout,
+            job_retention_days=job_retention_days,
+            max_batching_window=max_batching_window,
             max_event_age=max_event_age,
+            max_read_capacity=max_read_capacity,
+            max_write_capacity=max_write_capacity,
+            notifications=notifications,
+            parallelization_factor=parallelization_factor,
             pending_window=pending_window,
             read_capacity=read_capacity,
             removal_policy=removal_policy,
             reserved_concurrent_executions=reserved_concurrent_executions,
             retry_attempts=retry_attempts,
+            status_index=status_index,
+            target_utilization=target_utilization,
+            transport=transport,
+            tumbling_window=tumbling_window,
+            upsert_mode=upsert_mode,
             write_capacity=write_capacity,
         )
         self.__jobs_api = JobsApiConstruct(
             self,
             "JobsApi",
+            cache_ttl=cache_ttl,
             pending_window=pending_window,
             removal_policy=removal_policy,
             retetion=retetion,
@@ -72,10 +102,24 @@ class InfrastructureStack(Stack):
             self.__jobs_api.jobs_api_execution_role)
         self.__event_processing.jobs_table.grant_write_data(
             self.__jobs_api.jobs_api_execution_role)
+        self.__event_processing.jobs_table.grant(
+            self.__jobs_api.jobs_api_execution_role,
+            "dynamodb:PartiQLInsert")
         self.__jobs_api.add_job_id_method(
+            consumers=consumers,
+            jobs_table=self.__event_processing.jobs_table)
+        self.__jobs_api.add_jobs_batch_method(
             jobs_table=self.__event_processing.jobs_table)
         self.__jobs_api.add_jobs_method(
             jobs_table=self.__event_processing.jobs_table)
+        self.__jobs_api.add_jobs_status_method(
+            jobs_table=self.__event_processing.jobs_table)
+
+        if self.__event_processing.status_index_name is not None:
+            self.__jobs_api.add_jobs_list_method(
+                index_name=self.__event_processing.status_index_name,
+                jobs_table=self.__event_processing.jobs_table)
+
         self.add_metadata(
             "cfn-lint", {
                 "config": {
@@ -0,0 +1,31 @@
+from random import (
+    uniform,
+)
+
+
+def backoff(
+    strategy: str,
+    retry: int,
+    previous_delay: float,
+    base: float,
+    cap: float,
+) -> float:
+    """
+    Returns the seconds to wait before the given retry, see
+    https://aws.amazon.com/blogs/architecture/exponential-backoff-and-jitter/
+    """
+    exponential_delay = min(cap, base * 2 ** retry)
+
+    if strategy == "capped_exponential":
+        return exponential_delay
+    elif strategy == "decorrelated_jitter":
+        return min(
+            cap,
+            uniform(base, previous_delay * 3),  # nosec B311
+        )
+    elif strategy == "full_jitter":
+        return uniform(0, exponential_delay)  # nosec B311
+    elif strategy == "none":
+        return 0.0
+    else:
+        raise ValueError(f"Unsupported backoff strategy {strategy}")
@@ -0,0 +1,400 @@
+from abc import (
+    ABC,
+    abstractmethod,
+)
+from jobs_store.backoff import (
+    backoff,
+)
+from jobs_store.codec import (
+    ConsumerStatus,
+    Job,
+)
+from jobs_store.exceptions import (
+    ConditionalCheckFailedError,
+)
+from jobs_store.tracing import (
+    NoOpTracer,
+)
+from logging import (
+    Logger,
+    getLogger,
+)
+from threading import (
+    Lock,
+)
+from time import (
+    sleep,
+    time,
+)
+from typing import (
+    Dict,
+    Optional,
+    Sequence,
+)
+
+TERMINAL_STATUSES = (
+    "Failure",
+    "Success",
+)
+
+
+class JobStore(ABC):
+    """
+    Stores the status of every consumer for each job.
+
+    Backends implement the reads and the conditional writes, while the
+    upsert strategies, the backoff between retries and the per-invocation
+    statistics are shared.
+
+    When the ids of every consumer are given, the overall_status of the
+    job is kept up to date by the upserts, for the status index, and the
+    expiration of the job is set once every consumer has finished it.
+    """
+
+    def __init__(
+        self,
+        backoff_base: float = 0.05,
+        backoff_cap: float = 1.0,
+        backoff_strategy: str = "full_jitter",
+        consumer_ids: Optional[Sequence[str]] = None,
+        logger: Optional[Logger] = None,
+        optimistic_locking_retry_attempts: int = 10,
+        retention_seconds: int = 0,
+        tracer: Optional[NoOpTracer] = None,
+        upsert_mode: str = "optimistic_locking",
+    ) -> None:
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.backoff_strategy = backoff_strategy
+        self.consumer_ids = consumer_ids
+        self.logger = logger if logger is not None else getLogger(__name__)
+        self.optimistic_locking_retry_attempts = \
+            optimistic_locking_retry_attempts
+        self.retention_seconds = retention_seconds
+        self.statistics = {
+            "attempts": 0,
+            "conflicts": 0,
+            "wait_seconds": 0.0,
+        }
+        self.statistics_lock = Lock()
+        self.tracer = tracer if tracer is not None else NoOpTracer()
+        self.upsert_mode = upsert_mode
+
+        if retention_seconds > 0 and consumer_ids is None:
+            raise ValueError("The retention requires the consumer ids")
+
+    @abstractmethod
+    def claim_notification(
+        self,
+        id: str,
+        consumer_ids: Sequence[str],
+    ) -> Optional[Job]:
+        """
+        Marks the job as notified, in a single conditional write, if every
+        consumer has a terminal status and it is not marked yet, and returns
+        the job when it is, so that only one caller sends its notification.
+        """
+
+    @abstractmethod
+    def get_job(self, id: str) -> Job:
+        """
+        Returns the job, raises JobNotFoundError if it does not exist.
+        """
+
+    @abstractmethod
+    def release_notification(self, id: str) -> None:
+        """
+        Removes the notified mark of the job, if it is set, so that the
+        notification of a claim whose event could not be sent is claimed
+        again.
+        """
+
+    @abstractmethod
+    def update_consumer_status(
+        self,
+        id: str,
+        consumer_id: str,
+        status: ConsumerStatus,
+        expected_status: Optional[ConsumerStatus] = None,
+        overall_status: Optional[str] = None,
+        unless_finished: bool = False,
+        unless_in_flight: bool = False,
+    ) -> None:
+        """
+        Sets the status of a single consumer, and the overall status of the
+        job when given, and increments the version,
+        raises
+        ConditionalCheckFailedError if the job does not exist or, when an
+        expected status is given, if any attribute set on it differs from
+        the current status of the consumer, or, when unless_finished, if the
+        consumer has a terminal status, or, when unless_in_flight, if the
+        consumer has no status or a Running one.
+        """
+
+    @abstractmethod
+    def update_job_status(
+        self,
+        id: str,
+        job_status: Dict[str, ConsumerStatus],
+        version: int,
+        expires_at: Optional[int] = None,
+        overall_status: Optional[str] = None,
+    ) -> None:
+        """
+        Replaces the status of every consumer, and sets the expiration and
+        the overall status of the job when given, and increments the
+        version, raises
+        ConditionalCheckFailedError if the version is not the given one.
+        """
+
+    def get_expires_at(
+        self,
+        job_status: Dict[str, ConsumerStatus],
+    ) -> Optional[int]:
+        """
+        Returns the epoch second at which the job expires, when a retention
+        is set and every consumer has a terminal status, so that a job is
+        never expired while a consumer is still processing it.
+        """
+        if self.retention_seconds == 0 or \
+                self.get_overall_status(job_status) in (None, "Running"):
+            return None
+
+        return int(time()) + self.retention_seconds
+
+    def get_overall_status(
+        self,
+        job_status: Dict[str, ConsumerStatus],
+    ) -> Optional[str]:
+        """
+        Returns Success or Failure once every consumer has a terminal
+        status, Running before, or None when it is not kept up to date.
+        """
+        if self.consumer_ids is None:
+            return None
+
+        statuses = [
+            job_status[consumer_id].status
+            if consumer_id in job_status else None
+            for consumer_id in self.consumer_ids
+        ]
+
+        if not all(status in TERMINAL_STATUSES for status in statuses):
+            return "Running"
+
+        return "Failure" if "Failure" in statuses else "Success"
+
+    def is_skipped(
+        self,
+        consumer_status: Optional[ConsumerStatus],
+        unless_finished: bool = False,
+        unless_in_flight: bool = False,
+    ) -> bool:
+        """
+        Returns whether an upsert with these conditions skips a consumer
+        with this status.
+        """
+        status = consumer_status.status \
+            if consumer_status is not None else None
+
+        return (unless_finished and status in TERMINAL_STATUSES) or \
+            (unless_in_flight and status in (None, "Running"))
+
+    def increment_statistic(self, name: str, value: float = 1) -> None:
+        # Upserts can run concurrently in threads sharing this store
+        with self.statistics_lock:
+            self.statistics[name] += value
+
+    def reset_statistics(self) -> None:
+        with self.statistics_lock:
+            self.statistics["attempts"] = 0
+            self.statistics["conflicts"] = 0
+            self.statistics["wait_seconds"] = 0.0
+
+    def upsert(
+        self,
+        id: str,
+        consumer_id: str,
+        status: ConsumerStatus,
+        unless_finished: bool = False,
+        unless_in_flight: bool = False,
+    ) -> bool:
+        """
+        Sets the status of the consumer, and returns whether it did, which
+        it does not only when unless_finished and the consumer already has
+        a terminal status, or when unless_in_flight and the consumer has no
+        status or a Running one, checked in the same conditional write.
+        """
+        if self.upsert_mode == "nested_attribute":
+            return self.upsert_nested_attribute(
+                id,
+                consumer_id,
+                status,
+                unless_finished=unless_finished,
+                unless_in_flight=unless_in_flight,
+            )
+        elif self.upsert_mode == "optimistic_locking":
+            return self.upsert_optimistic_locking(
+                id,
+                consumer_id,
+                status,
+                unless_finished=unless_finished,
+                unless_in_flight=unless_in_flight,
+            )
+        else:
+            raise ValueError(f"Unsupported upsert mode {self.upsert_mode}")
+
+    def upsert_nested_attribute(
+        self,
+        id: str,
+        consumer_id: str,
+        status: ConsumerStatus,
+        unless_finished: bool = False,
+        unless_in_flight: bool = False,
+    ) -> bool:
+        self.increment_statistic("attempts")
+
+        self.logger.debug("Updated status for %s is %s", id, status)
+
+        # Set only the status for this consumer, no prior read is required
+        try:
+            with self.tracer.subsegment(
+                    "update_consumer_status", job_id=id, retry=0):
+                self.update_consumer_status(
+                    id,
+                    consumer_id,
+                    status,
+                    overall_status="Running"
+                    if self.consumer_ids is not None else None,
+                    unless_finished=unless_finished,
+                    unless_in_flight=unless_in_flight,
+                )
+        except ConditionalCheckFailedError:
+            if not unless_finished and not unless_in_flight:
+                raise
+
+            # The job may not exist rather than be skipped
+            if not self.is_skipped(
+                    self.get_job(id).job_status.get(consumer_id),
+                    unless_finished=unless_finished,
+                    unless_in_flight=unless_in_flight):
+                raise
+
+            return False
+
+        # The statuses of the other consumers are unknown, so the overall
+        # status and the expiration of a job that this write may have
+        # finished are set after it
+        if self.consumer_ids is not None and \
+                status.status in TERMINAL_STATUSES:
+            self.update_overall_status(id)
+
+        return True
+
+    def upsert_optimistic_locking(
+        self,
+        id: str,
+        consumer_id: str,
+        status: ConsumerStatus,
+        unless_finished: bool = False,
+        unless_in_flight: bool = False,
+    ) -> bool:
+        delay = self.backoff_base
+
+        for retry in range(self.optimistic_locking_retry_attempts):
+            # Wait before retrying, so concurrent consumers do not collide
+            if retry > 0:
+                delay = backoff(
+                    self.backoff_strategy,
+                    retry,
+                    delay,
+                    base=self.backoff_base,
+                    cap=self.backoff_cap,
+                )
+                self.increment_statistic("wait_seconds", delay)
+
+                sleep(delay)
+
+            self.increment_statistic("attempts")
+
+            try:
+                self.logger.debug(
+                    "Retry number %d to update %s", retry + 1, id)
+
+                # Get existing item and its version
+                with self.tracer.subsegment("get_job", job_id=id, retry=retry):
+                    job = self.get_job(id)
+
+                self.logger.debug(
+                    "Current version for %s is %s", id, job.version)
+                self.logger.debug("Current status for %s is %s", id, status)
+
+                # The version condition of the write below ensures that the
+                # status of the consumer has not changed since this read
+                current_status = job.job_status.get(consumer_id)
+
+                if self.is_skipped(
+                        current_status,
+                        unless_finished=unless_finished,
+                        unless_in_flight=unless_in_flight):
+                    return False
+
+                # Set status for this consumer
+                job.job_status[consumer_id] = status
+
+                self.logger.debug("Updated status for %s is %s", id, status)
+
+                # Try update item, with optimistic locking
+                with self.tracer.subsegment(
+                        "update_job_status", job_id=id, retry=retry):
+                    self.update_job_status(
+                        id,
+                        job.job_status,
+                        job.version,
+                        expires_at=self.get_expires_at(job.job_status),
+                        overall_status=self.get_overall_status(
+                            job.job_status),
+                    )
+
+                # Return when update is successful
+                return True
+            except ConditionalCheckFailedError:
+                self.increment_statistic("conflicts")
+
+                self.logger.warning("Failed to acquire lock, retrying")
+
+        # Raise error when retry > max attempts
+        raise RuntimeError(
+            ("Max number of retries "
+             f"{self.optimistic_locking_retry_attempts} exceeded"))
+
+    def update_overall_status(self, id: str) -> None:
+        """
+        Sets the overall status and the expiration of a finished job. When
+        the job changes in the meantime, the writer of that change sets them
+        instead.
+        """
+        with self.tracer.subsegment("get_job", job_id=id, retry=0):
+            job = self.get_job(id)
+
+        overall_status = self.get_overall_status(job.job_status)
+
+        if overall_status == "Running":
+            return
+
+        self.increment_statistic("attempts")
+
+        try:
+            with self.tracer.subsegment(
+                    "update_job_status", job_id=id, retry=0):
+                self.update_job_status(
+                    id,
+                    job.job_status,
+                    job.version,
+                    expires_at=self.get_expires_at(job.job_status),
+                    overall_status=overall_status,
+                )
+        except ConditionalCheckFailedError:
+            self.increment_statistic("conflicts")
+
+            self.logger.debug("Overall status of %s changed, skipping", id)
@@ -0,0 +1,56 @@
+from __future__ import (
+    annotations,
+)
+from functools import (
+    lru_cache,
+)
+from os import (
+    getenv,
+)
+from typing import (
+    TYPE_CHECKING,
+)
+
+if TYPE_CHECKING:
+    from botocore.config import (
+        Config,
+    )
+
+
+def create_client_config() -> Config:
+    """
+    Creates the botocore configuration from the function's environment.
+    """
+    # botocore is imported on first use, to keep it out of the cold start
+    from botocore.config import (
+        Config,
+    )
+
+    return Config(
+        connect_timeout=int(
+            getenv("CLIENT_CONNECT_TIMEOUT_MILLISECONDS", "1000")) / 1000,
+        max_pool_connections=int(getenv("CLIENT_MAX_POOL_CONNECTIONS", "10")),
+        read_timeout=int(
+            getenv("CLIENT_READ_TIMEOUT_MILLISECONDS", "5000")) / 1000,
+        retries={
+            "max_attempts": int(getenv("CLIENT_MAX_ATTEMPTS", "3")),
+            "mode": getenv("CLIENT_RETRY_MODE", "standard"),
+        },
+        tcp_keepalive=getenv("CLIENT_TCP_KEEPALIVE", "true") == "true",
+    )
+
+
+@lru_cache(maxsize=None)
+def create_client(service_name: str):
+    """
+    Creates the client of the service once per execution environment, so
+    that its connection pool is reused across invocations and handlers.
+    """
+    from boto3 import (
+        client,
+    )
+
+    return client(
+        service_name,
+        config=create_client_config(),
+    )
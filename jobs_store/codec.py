@@ -0,0 +1,166 @@
+"""
+Schema-aware codec for the items of the jobs table.
+
+The jobs item has a fixed shape:
+
+    {
+        "id": {"S": "..."},
+        "job_status": {"M": {"consumer_1": {"M": {"status": {"S": "..."}}}}},
+        "seconds": {"N": "..."},
+        "version": {"N": "..."}
+    }
+
+so it is decoded and encoded directly, without the generic type dispatch
+of boto3's TypeDeserializer and TypeSerializer, and numbers are returned
+as int instead of Decimal.
+"""
+from typing import (
+    Dict,
+    Optional,
+)
+
+
+class ConsumerStatus:
+    __slots__ = (
+        "progress",
+        "results",
+        "seconds",
+        "status",
+    )
+
+    def __init__(
+        self,
+        status: str,
+        progress: Optional[str] = None,
+        results: Optional[str] = None,
+        seconds: Optional[str] = None,
+    ) -> None:
+        self.progress = progress
+        self.results = results
+        self.seconds = seconds
+        self.status = status
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ConsumerStatus):
+            return NotImplemented
+
+        return all(
+            getattr(self, attribute) == getattr(other, attribute)
+            for attribute in self.__slots__
+        )
+
+    def __repr__(self) -> str:
+        attributes = ", ".join(
+            f"{attribute}={getattr(self, attribute)!r}"
+            for attribute in self.__slots__
+            if getattr(self, attribute) is not None
+        )
+
+        return f"ConsumerStatus({attributes})"
+
+
+class Job:
+    __slots__ = (
+        "id",
+        "job_status",
+        "seconds",
+        "version",
+    )
+
+    def __init__(
+        self,
+        id: str,
+        job_status: Optional[Dict[str, ConsumerStatus]] = None,
+        seconds: Optional[int] = None,
+        version: Optional[int] = None,
+    ) -> None:
+        self.id = id
+        self.job_status = job_status if job_status is not None else {}
+        self.seconds = seconds
+        self.version = version
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Job):
+            return NotImplemented
+
+        return all(
+            getattr(self, attribute) == getattr(other, attribute)
+            for attribute in self.__slots__
+        )
+
+    def __repr__(self) -> str:
+        attributes = ", ".join(
+            f"{attribute}={getattr(self, attribute)!r}"
+            for attribute in self.__slots__
+        )
+
+        return f"Job({attributes})"
+
+
+def decode_consumer_status(value: dict) -> ConsumerStatus:
+    attributes = value["M"]
+    progress = attributes.get("progress")
+    results = attributes.get("results")
+    seconds = attributes.get("seconds")
+
+    return ConsumerStatus(
+        status=attributes["status"]["S"],
+        progress=progress["S"] if progress is not None else None,
+        results=results["S"] if results is not None else None,
+        seconds=seconds["S"] if seconds is not None else None,
+    )
+
+
+def decode_job(item: dict) -> Job:
+    """
+    Decodes a stream NewImage or a GetItem Item into a Job.
+    """
+    job_status = item.get("job_status")
+    seconds = item.get("seconds")
+    version = item.get("version")
+
+    return Job(
+        id=item["id"]["S"],
+        job_status={
+            consumer_id: decode_consumer_status(value)
+            for consumer_id, value in job_status["M"].items()
+        } if job_status is not None else {},
+        seconds=int(seconds["N"]) if seconds is not None else None,
+        version=int(version["N"]) if version is not None else None,
+    )
+
+
+def encode_consumer_status(consumer_status: ConsumerStatus) -> dict:
+    attributes = {
+        "status": {
+            "S": consumer_status.status,
+        },
+    }
+
+    if consumer_status.progress is not None:
+        attributes["progress"] = {
+            "S": consumer_status.progress,
+        }
+
+    if consumer_status.results is not None:
+        attributes["results"] = {
+            "S": consumer_status.results,
+        }
+
+    if consumer_status.seconds is not None:
+        attributes["seconds"] = {
+            "S": consumer_status.seconds,
+        }
+
+    return {
+        "M": attributes,
+    }
+
+
+def encode_job_status(job_status: Dict[str, ConsumerStatus]) -> dict:
+    return {
+        "M": {
+            consumer_id: encode_consumer_status(consumer_status)
+            for consumer_id, consumer_status in job_status.items()
+        },
+    }
@@ -0,0 +1,245 @@
+from jobs_store.base import (
+    TERMINAL_STATUSES,
+    JobStore,
+)
+from jobs_store.codec import (
+    ConsumerStatus,
+    Job,
+    decode_job,
+    encode_consumer_status,
+    encode_job_status,
+)
+from jobs_store.exceptions import (
+    ConditionalCheckFailedError,
+    JobNotFoundError,
+)
+from typing import (
+    Dict,
+    Optional,
+    Sequence,
+)
+
+
+class DynamoDBJobStore(JobStore):
+    def __init__(
+        self,
+        client,
+        table_name: str,
+        **kwargs,
+    ) -> None:
+        super().__init__(**kwargs)
+
+        self.client = client
+        self.table_name = table_name
+
+    def claim_notification(
+        self,
+        id: str,
+        consumer_ids: Sequence[str],
+    ) -> Optional[Job]:
+        conditions = ["attribute_not_exists(notified)"]
+        expression_attribute_names = {
+            "#status": "status",
+        }
+        expression_attribute_values = {
+            ":notified": {
+                "BOOL": True,
+            },
+        }
+        terminal_statuses = []
+
+        for index, status in enumerate(TERMINAL_STATUSES):
+            expression_attribute_values[f":terminal_{index}"] = {
+                "S": status,
+            }
+            terminal_statuses.append(f":terminal_{index}")
+
+        for index, consumer_id in enumerate(consumer_ids):
+            conditions.append((f"job_status.#consumer_{index}.#status IN "
+                               f"({', '.join(terminal_statuses)})"))
+            expression_attribute_names[f"#consumer_{index}"] = consumer_id
+
+        try:
+            response = self.client.update_item(
+                ConditionExpression=" AND ".join(conditions),
+                ExpressionAttributeNames=expression_attribute_names,
+                ExpressionAttributeValues=expression_attribute_values,
+                Key={
+                    "id": {
+                        "S": id,
+                    },
+                },
+                ReturnValues="ALL_NEW",
+                TableName=self.table_name,
+                UpdateExpression="SET notified = :notified",
+            )
+        except self.client.exceptions.ConditionalCheckFailedException:
+            return None
+
+        return decode_job(response["Attributes"])
+
+    def get_job(self, id: str) -> Job:
+        item = self.client.get_item(
+            Key={
+                "id": {
+                    "S": id,
+                }
+            },
+            TableName=self.table_name,
+        )
+
+        if "Item" not in item:
+            raise JobNotFoundError(f"Job {id} not found")
+
+        return decode_job(item["Item"])
+
+    def release_notification(self, id: str) -> None:
+        try:
+            self.client.update_item(
+                ConditionExpression="attribute_exists(notified)",
+                Key={
+                    "id": {
+                        "S": id,
+                    },
+                },
+                TableName=self.table_name,
+                UpdateExpression="REMOVE notified",
+            )
+        except self.client.exceptions.ConditionalCheckFailedException:
+            pass
+
+    def update_consumer_status(
+        self,
+        id: str,
+        consumer_id: str,
+        status: ConsumerStatus,
+        expected_status: Optional[ConsumerStatus] = None,
+        overall_status: Optional[str] = None,
+        unless_finished: bool = False,
+        unless_in_flight: bool = False,
+    ) -> None:
+        condition_expression = "attribute_exists(id)"
+        expression_attribute_names = {
+            "#consumer": consumer_id,
+        }
+        expression_attribute_values = {
+            ":one": {
+                "N": "1",
+            },
+            ":s": encode_consumer_status(status),
+        }
+
+        if expected_status is not None:
+            conditions = []
+
+            for attribute, value in encode_consumer_status(
+                    expected_status)["M"].items():
+                conditions.append((f"job_status.#consumer.#{attribute} = "
+                                   f":expected_{attribute}"))
+                expression_attribute_names[f"#{attribute}"] = attribute
+                expression_attribute_values[f":expected_{attribute}"] = value
+
+            condition_expression = " AND ".join(conditions)
+
+        # A missing status is not in the list, so the condition holds
+        if unless_finished:
+            terminal_statuses = []
+
+            for index, terminal_status in enumerate(TERMINAL_STATUSES):
+                expression_attribute_values[f":terminal_{index}"] = {
+                    "S": terminal_status,
+                }
+                terminal_statuses.append(f":terminal_{index}")
+
+            condition_expression += \
+                (" AND NOT job_status.#consumer.#status IN "
+                 f"({', '.join(terminal_statuses)})")
+            expression_attribute_names["#status"] = "status"
+
+        if unless_in_flight:
+            condition_expression += \
+                (" AND attribute_exists(job_status.#consumer.#status) AND "
+                 "job_status.#consumer.#status <> :running")
+            expression_attribute_names["#status"] = "status"
+            expression_attribute_values[":running"] = {
+                "S": "Running",
+            }
+
+        update_expression = "SET job_status.#consumer=:s"
+
+        if overall_status is not None:
+            expression_attribute_values[":o"] = {
+                "S": overall_status,
+            }
+            update_expression += ", overall_status=:o"
+
+        try:
+            self.client.update_item(
+                ConditionExpression=condition_expression,
+                ExpressionAttributeNames=expression_attribute_names,
+                ExpressionAttributeValues=expression_attribute_values,
+                Key={
+                    "id": {
+                        "S": id,
+                    },
+                },
+                ReturnValues="UPDATED_NEW",
+                TableName=self.table_name,
+                UpdateExpression=f"{update_expression} ADD version :one",
+            )
+        except (
+            self.client.exceptions.ConditionalCheckFailedException
+        ) as exception:
+            raise ConditionalCheckFailedError(
+                f"Job {id} not found or with another status") from exception
+
+    def update_job_status(
+        self,
+        id: str,
+        job_status: Dict[str, ConsumerStatus],
+        version: int,
+        expires_at: Optional[int] = None,
+        overall_status: Optional[str] = None,
+    ) -> None:
+        expression_attribute_values = {
+            ":cv": {
+                "N": str(version),
+            },
+            ":s": encode_job_status(job_status),
+            ":v": {
+                "N": str(version + 1),
+            },
+        }
+        update_expression = "SET job_status=:s, version=:v"
+
+        if expires_at is not None:
+            expression_attribute_values[":e"] = {
+                "N": str(expires_at),
+            }
+            update_expression += ", expires_at=:e"
+
+        if overall_status is not None:
+            expression_attribute_values[":o"] = {
+                "S": overall_status,
+            }
+            update_expression += ", overall_status=:o"
+
+        try:
+            self.client.update_item(
+                # Optimistic locking
+                ConditionExpression="version = :cv",
+                ExpressionAttributeValues=expression_attribute_values,
+                Key={
+                    "id": {
+                        "S": id,
+                    },
+                },
+                ReturnValues="UPDATED_NEW",
+                TableName=self.table_name,
+                UpdateExpression=update_expression,
+            )
+        except (
+            self.client.exceptions.ConditionalCheckFailedException
+        ) as exception:
+            raise ConditionalCheckFailedError(
+                f"Version {version} of job {id} is outdated") from exception
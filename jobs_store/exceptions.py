@@ -0,0 +1,11 @@
+class ConditionalCheckFailedError(Exception):
+    """
+    Raised when the condition of a write on the jobs table is not satisfied,
+    e.g. when the version of the job changed since it was read.
+    """
+
+
+class JobNotFoundError(Exception):
+    """
+    Raised when a job does not exist in the jobs table.
+    """
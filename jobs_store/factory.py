@@ -0,0 +1,98 @@
+from jobs_store.base import (
+    JobStore,
+)
+from jobs_store.client import (
+    create_client,
+)
+from jobs_store.dynamodb import (
+    DynamoDBJobStore,
+)
+from jobs_store.memory import (
+    InMemoryJobStore,
+)
+from jobs_store.notifications import (
+    CompletionNotifier,
+)
+from jobs_store.tracing import (
+    NoOpTracer,
+)
+from logging import (
+    Logger,
+)
+from os import (
+    getenv,
+)
+from typing import (
+    List,
+    Optional,
+)
+
+
+def get_consumer_ids() -> List[str]:
+    """
+    Returns the ids of every consumer of the jobs table.
+    """
+    return [
+        f"consumer_{consumer + 1}"
+        for consumer in range(int(getenv("CONSUMERS", "2")))
+    ]
+
+
+def create_job_store(
+    logger: Optional[Logger] = None,
+    tracer: Optional[NoOpTracer] = None,
+) -> JobStore:
+    """
+    Creates the job store configured by the function's environment.
+    """
+    backend = getenv("JOBS_STORE_BACKEND", "dynamodb")
+    retention_seconds = int(getenv("RETENTION_SECONDS", "0"))
+    configuration = {
+        "backoff_base": int(getenv("BACKOFF_BASE_MILLISECONDS", "50")) / 1000,
+        "backoff_cap": int(getenv("BACKOFF_CAP_MILLISECONDS", "1000")) / 1000,
+        "backoff_strategy": getenv("BACKOFF_STRATEGY", "full_jitter"),
+        # Both the status index and the expiration of finished jobs depend
+        # on the statuses of every consumer
+        "consumer_ids": get_consumer_ids()
+        if getenv("STATUS_INDEX", "false") == "true" or retention_seconds > 0
+        else None,
+        "logger": logger,
+        "optimistic_locking_retry_attempts": int(
+            getenv("OPTIMISTIC_LOCKING_RETRY_ATTEMPTS", "10")),
+        "retention_seconds": retention_seconds,
+        "tracer": tracer,
+        "upsert_mode": getenv("UPSERT_MODE", "optimistic_locking"),
+    }
+
+    if backend == "dynamodb":
+        return DynamoDBJobStore(
+            create_client("dynamodb"),
+            getenv("TABLE_NAME"),
+            **configuration,
+        )
+    elif backend == "memory":
+        return InMemoryJobStore(**configuration)
+    else:
+        raise ValueError(f"Unsupported jobs store backend {backend}")
+
+
+def create_completion_notifier(
+    job_store: JobStore,
+    logger: Optional[Logger] = None,
+) -> Optional[CompletionNotifier]:
+    """
+    Creates the completion notifier configured by the function's
+    environment, or returns None when notifications are disabled.
+    """
+    event_bus_name = getenv("NOTIFICATION_EVENT_BUS_NAME")
+
+    if event_bus_name is None:
+        return None
+
+    return CompletionNotifier(
+        create_client("events"),
+        get_consumer_ids(),
+        event_bus_name,
+        job_store,
+        logger=logger,
+    )
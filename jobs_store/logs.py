@@ -0,0 +1,69 @@
+from json import (
+    dumps,
+)
+from logging import (
+    Logger,
+)
+from os import (
+    getenv,
+)
+from random import (
+    random,
+)
+from typing import (
+    Any,
+)
+
+DEBUG_SAMPLE_RATE = float(getenv("DEBUG_SAMPLE_RATE", "0"))
+LOG_LEVEL = getenv("LOG_LEVEL", "INFO")
+LOG_MAX_PAYLOAD_BYTES = int(getenv("LOG_MAX_PAYLOAD_BYTES", "2048"))
+LOG_REDACTED_KEYS = frozenset(
+    key for key in getenv("LOG_REDACTED_KEYS", "").split(",") if key)
+
+
+class Payload:
+    """
+    Wraps a payload to log, so that it is serialized only if the message is
+    emitted, with the values of LOG_REDACTED_KEYS redacted and cut to
+    LOG_MAX_PAYLOAD_BYTES.
+    """
+    __slots__ = (
+        "payload",
+    )
+
+    def __init__(self, payload: Any) -> None:
+        self.payload = payload
+
+    def __str__(self) -> str:
+        text = dumps(redact(self.payload), default=str)
+
+        if len(text) > LOG_MAX_PAYLOAD_BYTES:
+            return (f"{text[:LOG_MAX_PAYLOAD_BYTES]}... "
+                    f"({len(text)} bytes truncated)")
+
+        return text
+
+
+def redact(payload: Any) -> Any:
+    if not LOG_REDACTED_KEYS:
+        return payload
+
+    if isinstance(payload, dict):
+        return {
+            key: "***" if key in LOG_REDACTED_KEYS else redact(value)
+            for key, value in payload.items()
+        }
+    elif isinstance(payload, list):
+        return [redact(value) for value in payload]
+
+    return payload
+
+
+def sample_log_level(logger: Logger) -> None:
+    """
+    Sets the level of the logger for an invocation: DEBUG for a sample of
+    DEBUG_SAMPLE_RATE of the invocations, LOG_LEVEL for the others.
+    """
+    sampled = random() < DEBUG_SAMPLE_RATE  # nosec B311
+
+    logger.setLevel("DEBUG" if sampled else LOG_LEVEL)
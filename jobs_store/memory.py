@@ -0,0 +1,196 @@
+from copy import (
+    deepcopy,
+)
+from jobs_store.base import (
+    TERMINAL_STATUSES,
+    JobStore,
+)
+from jobs_store.codec import (
+    ConsumerStatus,
+    Job,
+    decode_job,
+    encode_consumer_status,
+    encode_job_status,
+)
+from jobs_store.exceptions import (
+    ConditionalCheckFailedError,
+    JobNotFoundError,
+)
+from threading import (
+    Lock,
+)
+from typing import (
+    Callable,
+    Dict,
+    Optional,
+    Sequence,
+)
+
+
+class InMemoryJobStore(JobStore):
+    """
+    Thread-safe jobs table kept in memory, for tests and local profiling.
+
+    Items are stored in the DynamoDB wire format and every write has the
+    same conditions as the DynamoDB backend. When given, on_write is called
+    with the event name and the new image of every write, in write order,
+    like the records of a NEW_IMAGE stream.
+    """
+
+    def __init__(
+        self,
+        on_write: Optional[Callable[[str, dict], None]] = None,
+        **kwargs,
+    ) -> None:
+        super().__init__(**kwargs)
+
+        self.items = {}
+        self.lock = Lock()
+        self.on_write = on_write
+
+    def claim_notification(
+        self,
+        id: str,
+        consumer_ids: Sequence[str],
+    ) -> Optional[Job]:
+        with self.lock:
+            item = self.items.get(id)
+
+            if item is None or "notified" in item:
+                return None
+
+            job_status = item.get("job_status", {"M": {}})["M"]
+
+            if not all(
+                job_status.get(consumer_id, {"M": {}})["M"].get(
+                    "status", {}).get("S") in TERMINAL_STATUSES
+                for consumer_id in consumer_ids
+            ):
+                return None
+
+            item["notified"] = {
+                "BOOL": True,
+            }
+
+            self.write("MODIFY", item)
+
+            return decode_job(item)
+
+    def get_job(self, id: str) -> Job:
+        with self.lock:
+            item = self.items.get(id)
+
+            if item is None:
+                raise JobNotFoundError(f"Job {id} not found")
+
+            return decode_job(item)
+
+    def get_item(self, id: str) -> dict:
+        with self.lock:
+            return deepcopy(self.items[id])
+
+    def put_item(self, item: dict) -> None:
+        with self.lock:
+            event_name = "MODIFY" if item["id"]["S"] in self.items \
+                else "INSERT"
+            self.items[item["id"]["S"]] = deepcopy(item)
+
+            self.write(event_name, item)
+
+    def release_notification(self, id: str) -> None:
+        with self.lock:
+            item = self.items.get(id)
+
+            if item is None or "notified" not in item:
+                return
+
+            del item["notified"]
+
+            self.write("MODIFY", item)
+
+    def set_attributes(
+        self,
+        item: dict,
+        expires_at: Optional[int],
+        overall_status: Optional[str],
+    ) -> None:
+        if expires_at is not None:
+            item["expires_at"] = {
+                "N": str(expires_at),
+            }
+
+        if overall_status is not None:
+            item["overall_status"] = {
+                "S": overall_status,
+            }
+
+    def update_consumer_status(
+        self,
+        id: str,
+        consumer_id: str,
+        status: ConsumerStatus,
+        expected_status: Optional[ConsumerStatus] = None,
+        overall_status: Optional[str] = None,
+        unless_finished: bool = False,
+        unless_in_flight: bool = False,
+    ) -> None:
+        with self.lock:
+            item = self.items.get(id)
+
+            if item is None:
+                raise ConditionalCheckFailedError(f"Job {id} not found")
+
+            current_status = item.get("job_status", {"M": {}})["M"].get(
+                consumer_id, {"M": {}})["M"]
+
+            if unless_finished and current_status.get(
+                    "status", {}).get("S") in TERMINAL_STATUSES:
+                raise ConditionalCheckFailedError(f"Job {id} is finished")
+
+            if unless_in_flight and current_status.get(
+                    "status", {}).get("S") in (None, "Running"):
+                raise ConditionalCheckFailedError(f"Job {id} is in flight")
+
+            if expected_status is not None:
+                for attribute, value in encode_consumer_status(
+                        expected_status)["M"].items():
+                    if current_status.get(attribute) != value:
+                        raise ConditionalCheckFailedError(
+                            f"Job {id} has another status")
+
+            item.setdefault("job_status", {"M": {}})["M"][consumer_id] = \
+                encode_consumer_status(status)
+            self.set_attributes(item, None, overall_status)
+            item["version"] = {
+                "N": str(int(item.get("version", {"N": "0"})["N"]) + 1),
+            }
+
+            self.write("MODIFY", item)
+
+    def update_job_status(
+        self,
+        id: str,
+        job_status: Dict[str, ConsumerStatus],
+        version: int,
+        expires_at: Optional[int] = None,
+        overall_status: Optional[str] = None,
+    ) -> None:
+        with self.lock:
+            item = self.items.get(id)
+
+            if item is None or item.get("version") != {"N": str(version)}:
+                raise ConditionalCheckFailedError(
+                    f"Version {version} of job {id} is outdated")
+
+            item["job_status"] = encode_job_status(job_status)
+            self.set_attributes(item, expires_at, overall_status)
+            item["version"] = {
+                "N": str(version + 1),
+            }
+
+            self.write("MODIFY", item)
+
+    def write(self, event_name: str, item: dict) -> None:
+        # Called with the lock held, so that writes are seen in order
+        if self.on_write is not None:
+            self.on_write(event_name, deepcopy(item))
@@ -0,0 +1,101 @@
+from aws_lambda_powertools.metrics import (
+    MetricUnit,
+    Metrics,
+    single_metric,
+)
+from collections import (
+    Counter,
+)
+from contextlib import (
+    contextmanager,
+)
+from threading import (
+    Lock,
+)
+from time import (
+    perf_counter,
+)
+from typing import (
+    Iterator,
+)
+
+
+class MetricsBuffer:
+    """
+    Collects the metrics of an invocation from any thread, so that they are
+    added to Powertools Metrics only once the records are processed.
+
+    Metrics have the consumer dimension, and record outcomes are counted
+    with the consumer and outcome dimensions.
+    """
+
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.metrics = []
+        self.outcomes = Counter()
+
+    def add_metric(self, name: str, unit: MetricUnit, value: float) -> None:
+        with self.lock:
+            self.metrics.append((name, unit, value))
+
+    def add_outcome(self, outcome: str) -> None:
+        with self.lock:
+            self.outcomes[outcome] += 1
+
+    def add_statistics(self, statistics: dict) -> None:
+        """
+        Adds the upsert statistics of the job store.
+        """
+        self.add_metric(
+            "UpsertAttempts", MetricUnit.Count, statistics["attempts"])
+        self.add_metric(
+            "UpsertConflicts", MetricUnit.Count, statistics["conflicts"])
+        self.add_metric(
+            "UpsertWaitDuration",
+            MetricUnit.Milliseconds,
+            statistics["wait_seconds"] * 1000,
+        )
+
+    @contextmanager
+    def duration(self, name: str) -> Iterator[None]:
+        """
+        Adds the duration of the block, in milliseconds, even if it raises.
+        """
+        start = perf_counter()
+
+        try:
+            yield
+        finally:
+            self.add_metric(
+                name,
+                MetricUnit.Milliseconds,
+                (perf_counter() - start) * 1000,
+            )
+
+    def publish(self, metrics: Metrics, consumer_id: str) -> None:
+        with self.lock:
+            buffered_metrics = self.metrics
+            outcomes = self.outcomes
+            self.metrics = []
+            self.outcomes = Counter()
+
+        metrics.add_dimension(name="consumer", value=consumer_id)
+
+        for name, unit, value in buffered_metrics:
+            metrics.add_metric(name=name, unit=unit, value=value)
+
+        # Each outcome is a different dimension set, published on its own
+        for outcome, count in sorted(outcomes.items()):
+            with single_metric(
+                name="Records",
+                namespace=metrics.namespace,
+                unit=MetricUnit.Count,
+                value=count,
+            ) as metric:
+                metric.add_dimension(name="consumer", value=consumer_id)
+                metric.add_dimension(name="outcome", value=outcome)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.metrics = []
+            self.outcomes = Counter()
@@ -0,0 +1,171 @@
+from aws_lambda_powertools.metrics import (
+    MetricUnit,
+)
+from jobs_store.base import (
+    JobStore,
+)
+from jobs_store.codec import (
+    ConsumerStatus,
+    Job,
+)
+from jobs_store.metrics import (
+    MetricsBuffer,
+)
+from jobs_store.tracing import (
+    NoOpTracer,
+)
+from json import (
+    dumps,
+)
+from logging import (
+    Logger,
+    getLogger,
+)
+from threading import (
+    Lock,
+)
+from typing import (
+    Callable,
+    Optional,
+    Sequence,
+)
+
+DETAIL_TYPE = "Job Finished"
+SOURCE = "jobs"
+
+
+def encode_detail(job: Job) -> str:
+    """
+    Encodes the job as the detail of its completion event, with the same
+    per-consumer attributes as GET /jobs/{jobId}.
+    """
+    return dumps({
+        "id": job.id,
+        "job_status": {
+            consumer_id: {
+                attribute: getattr(consumer_status, attribute)
+                for attribute in ConsumerStatus.__slots__
+                if getattr(consumer_status, attribute) is not None
+            }
+            for consumer_id, consumer_status in job.job_status.items()
+        },
+    })
+
+
+class CompletionNotifier:
+    """
+    Sends a single event to the event bus once every consumer has finished
+    a job.
+
+    Every writer of a terminal status calls notify, and only the one whose
+    claim of the job succeeds sends the event, so that it is sent once
+    however the final writes of the consumers interleave.
+    """
+
+    def __init__(
+        self,
+        client,
+        consumer_ids: Sequence[str],
+        event_bus_name: str,
+        job_store: JobStore,
+        logger: Optional[Logger] = None,
+    ) -> None:
+        self.client = client
+        self.consumer_ids = consumer_ids
+        self.event_bus_name = event_bus_name
+        self.job_store = job_store
+        self.logger = logger if logger is not None else getLogger(__name__)
+
+    def notify(self, id: str) -> bool:
+        """
+        Sends the completion event of the job if this call claims it, and
+        returns whether it did.
+        """
+        job = self.job_store.claim_notification(id, self.consumer_ids)
+
+        if job is None:
+            return False
+
+        self.logger.debug("Notifying completion of %s", id)
+
+        # The claim is released when the event is not sent, so that the
+        # record is failed and the notification is claimed again on retry
+        try:
+            response = self.client.put_events(
+                Entries=[
+                    {
+                        "Detail": encode_detail(job),
+                        "DetailType": DETAIL_TYPE,
+                        "EventBusName": self.event_bus_name,
+                        "Resources": [],
+                        "Source": SOURCE,
+                    },
+                ],
+            )
+
+            if response.get("FailedEntryCount", 0) > 0:
+                raise RuntimeError((f"Failed to notify completion of {id}: "
+                                    f"{response['Entries']}"))
+        except Exception:
+            self.job_store.release_notification(id)
+
+            raise
+
+        return True
+
+
+class LazyCompletionNotifier:
+    """
+    Notifies the completion of the jobs of a function, with its completion
+    notifier created on first use, so that its client is not created during
+    the cold start, and counts the notifications in the metrics buffer.
+    """
+
+    def __init__(
+        self,
+        create_completion_notifier: Callable[
+            [], Optional[CompletionNotifier]],
+        logger: Logger,
+        metrics_buffer: MetricsBuffer,
+        tracer: NoOpTracer,
+    ) -> None:
+        self.completion_notifier: Optional[CompletionNotifier] = None
+        self.create_completion_notifier = create_completion_notifier
+        self.created = False
+        self.lock = Lock()
+        self.logger = logger
+        self.metrics_buffer = metrics_buffer
+        self.tracer = tracer
+
+    def notify(self, id: str) -> None:
+        """
+        Sends the completion event of the job when notifications are
+        enabled and this write finished it. Failures are logged and raised,
+        so that the record fails and the released notification is sent when
+        it is retried.
+        """
+        # The jobs are notified from the threads of an executor, which must
+        # not create the notifier more than once. No notifier is created
+        # when notifications are disabled
+        with self.lock:
+            if not self.created:
+                self.completion_notifier = self.create_completion_notifier()
+                self.created = True
+
+        if self.completion_notifier is None:
+            return
+
+        try:
+            with self.tracer.subsegment("notify_completion", job_id=id):
+                notified = self.completion_notifier.notify(id)
+        except Exception:
+            self.metrics_buffer.add_metric(
+                "NotificationFailures", MetricUnit.Count, 1)
+
+            self.logger.exception(f"Failed to notify completion of {id}")
+
+            raise
+
+        if notified:
+            self.metrics_buffer.add_metric(
+                "Notifications", MetricUnit.Count, 1)
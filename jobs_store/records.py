@@ -0,0 +1,50 @@
+"""
+Records of the changes to the jobs table, as read from its DynamoDB stream
+or from its Kinesis data stream.
+
+Kinesis records carry the change in their data, with the same eventName
+and dynamodb attributes as a DynamoDB Streams record, except that
+ApproximateCreationDateTime is in milliseconds and that there is no
+SequenceNumber. They are decoded into DynamoDB Streams records, with the
+sequence number of the Kinesis record, so that the functions handle both
+in the same way.
+"""
+from base64 import (
+    b64decode,
+)
+from json import (
+    loads,
+)
+from typing import (
+    Union,
+)
+
+
+def decode_kinesis_data(
+    data: Union[bytes, str],
+    sequence_number: str,
+) -> dict:
+    record = loads(data)
+    stream_record = record["dynamodb"]
+
+    if "ApproximateCreationDateTime" in stream_record:
+        stream_record["ApproximateCreationDateTime"] = \
+            stream_record["ApproximateCreationDateTime"] / 1000
+
+    stream_record["SequenceNumber"] = sequence_number
+
+    return record
+
+
+def decode_record(record: dict) -> dict:
+    """
+    Decodes a record of the event of a stream consumer into a DynamoDB
+    Streams record.
+    """
+    if "kinesis" not in record:
+        return record
+
+    return decode_kinesis_data(
+        b64decode(record["kinesis"]["data"]),
+        record["kinesis"]["sequenceNumber"],
+    )
@@ -0,0 +1,62 @@
+from contextlib import (
+    contextmanager,
+)
+from os import (
+    getenv,
+)
+from typing import (
+    Iterator,
+    Union,
+)
+
+
+class NoOpTracer:
+    """
+    Tracer used when active tracing is off, e.g. in local tests, so that
+    neither the X-Ray SDK nor a trace context is required.
+    """
+
+    @contextmanager
+    def subsegment(
+        self,
+        name: str,
+        **annotations: Union[bool, float, str],
+    ) -> Iterator[None]:
+        yield
+
+
+class XRayTracer(NoOpTracer):
+    """
+    Opens Powertools Tracer subsegments, annotated so that slow calls can
+    be searched by job id and retry.
+    """
+
+    def __init__(self, service: str) -> None:
+        # The X-Ray SDK is only imported when tracing is on
+        from aws_lambda_powertools import (
+            Tracer,
+        )
+
+        self.tracer = Tracer(service=service)
+
+    @contextmanager
+    def subsegment(
+        self,
+        name: str,
+        **annotations: Union[bool, float, str],
+    ) -> Iterator[None]:
+        with self.tracer.provider.in_subsegment(f"## {name}") as subsegment:
+            for key, value in annotations.items():
+                subsegment.put_annotation(key=key, value=value)
+
+            yield
+
+
+def create_tracer(service: str) -> NoOpTracer:
+    """
+    Creates the tracer configured by the function's environment.
+    """
+    if getenv("TRACING", "false") == "true":
+        return XRayTracer(service)
+
+    return NoOpTracer()
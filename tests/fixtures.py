@@ -4,6 +4,9 @@ from awslambdaric.lambda_context import (
 from pytest import (
     fixture,
 )
+from time import (
+    time,
+)
 
 
 @fixture(scope="module")
@@ -23,7 +26,7 @@ def context() -> LambdaContext:
             "custom": str(),
             "env": str(),
         },
-        epoch_deadline_time_in_ms=str(),
+        epoch_deadline_time_in_ms=int(time() * 1000) + 900000,
         invoke_id=str(),
     )
 
@@ -0,0 +1,625 @@
+"""
+Local end-to-end harness for the event processing functions.
+
+The jobs table is an InMemoryJobStore whose writes feed a NEW_IMAGE stream
+emulator with shards and sequence numbers. Each simulated consumer loads
+its own copy of the consumer and error handling modules, as separate
+Lambda functions would, polls the stream like an event source mapping and
+invokes handler with the same event shapes as Lambda. Records reported in
+batchItemFailures are sent to the error handler in an SNS message with the
+DDBStreamBatchInfo of the failed range, and the error handler reads them
+back from the emulator through the DynamoDB Streams API.
+
+Under a parallelization factor, each shard is polled by as many concurrent
+pollers, each taking the records of the jobs whose id hashes to it, so that
+the records of a job keep their order as with the event source mapping.
+
+Run with:
+
+    python -m tests.harness --consumers 2 --jobs 200 --failure-rate 0.05
+    python -m tests.harness --parallelization-factor 4 --slow-rate 0.1
+"""
+from argparse import (
+    ArgumentParser,
+)
+from contextlib import (
+    redirect_stdout,
+)
+from hashlib import (
+    sha256,
+)
+from importlib.util import (
+    module_from_spec,
+    spec_from_file_location,
+)
+from io import (
+    StringIO,
+)
+from jobs_store.memory import (
+    InMemoryJobStore,
+)
+from json import (
+    dumps,
+)
+from os import (
+    environ,
+)
+from pathlib import (
+    Path,
+)
+from statistics import (
+    quantiles,
+)
+from threading import (
+    Event,
+    Lock,
+    Thread,
+)
+from time import (
+    monotonic,
+    sleep,
+    time,
+)
+from types import (
+    ModuleType,
+)
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+from zlib import (
+    crc32,
+)
+
+ROOT = Path(__file__).parent.parent
+STREAM_ARN = "arn:aws:dynamodb:us-east-1:012356789012:table/jobs/stream/0"
+TERMINAL_STATUSES = frozenset(["Failure", "Success"])
+TIMEOUT = 300
+
+
+class DiscardedMetrics:
+    """
+    Stands in for Powertools Metrics, whose metric set is shared by every
+    instance in the process, so that concurrent simulated functions do not
+    publish into it.
+    """
+    namespace = "Harness"
+
+    def add_dimension(self, name: str, value: str) -> None:
+        pass
+
+    def add_metric(self, name: str, unit: str, value: float) -> None:
+        pass
+
+
+class ExpiredIteratorException(Exception):
+    pass
+
+
+class Context:
+    """
+    Lambda context with the remaining time of a fresh invocation.
+    """
+
+    def __init__(self, timeout: int) -> None:
+        self.deadline = monotonic() + timeout
+
+    def get_remaining_time_in_millis(self) -> int:
+        return int((self.deadline - monotonic()) * 1000)
+
+
+class StreamEmulator:
+    """
+    Emulates the NEW_IMAGE stream of the jobs table, with records spread
+    across shards by job id, and the DynamoDB Streams API that the error
+    handler reads it with.
+    """
+
+    class exceptions:
+        ExpiredIteratorException = ExpiredIteratorException
+
+    def __init__(self, shards: int = 2) -> None:
+        self.lock = Lock()
+        self.sequence_number = 0
+        self.shards = {
+            f"shardId-{shard:020d}": []
+            for shard in range(shards)
+        }
+
+    def append(self, event_name: str, item: dict) -> None:
+        id = item["id"]["S"]
+        shard_id = list(self.shards)[crc32(id.encode()) % len(self.shards)]
+
+        with self.lock:
+            self.sequence_number += 1
+
+            self.shards[shard_id].append({
+                "awsRegion": "us-east-1",
+                "dynamodb": {
+                    "ApproximateCreationDateTime": time(),
+                    "Keys": {
+                        "id": item["id"],
+                    },
+                    "NewImage": item,
+                    "SequenceNumber": f"{self.sequence_number:021d}",
+                    "SizeBytes": len(dumps(item)),
+                    "StreamViewType": "NEW_IMAGE",
+                },
+                "eventID": str(self.sequence_number),
+                "eventName": event_name,
+                "eventSource": "aws:dynamodb",
+                "eventSourceARN": STREAM_ARN,
+                "eventVersion": "1.1",
+            })
+
+    def get_records(self, Limit: int, ShardIterator: str) -> dict:
+        shard_id, position = ShardIterator.rsplit(":", 1)
+        position = int(position)
+
+        with self.lock:
+            records = self.shards[shard_id][position:position + Limit]
+
+        return {
+            "NextShardIterator": f"{shard_id}:{position + len(records)}",
+            "Records": records,
+        }
+
+    def get_shard_iterator(
+        self,
+        SequenceNumber: str,
+        ShardId: str,
+        ShardIteratorType: str,
+        StreamArn: str,
+    ) -> dict:
+        with self.lock:
+            position = next(
+                (
+                    position
+                    for position, record in enumerate(self.shards[ShardId])
+                    if int(record["dynamodb"]["SequenceNumber"]) >=
+                    int(SequenceNumber)
+                ),
+                len(self.shards[ShardId]),
+            )
+
+        return {
+            "ShardIterator": f"{ShardId}:{position}",
+        }
+
+    def read(self, shard_id: str, position: int, limit: int) -> List[dict]:
+        with self.lock:
+            return self.shards[shard_id][position:position + limit]
+
+
+def get_lane(id: str, parallelization_factor: int) -> int:
+    """
+    Returns the concurrent poller of its shard that the records of the job
+    are processed by, hashed independently of the shard.
+    """
+    digest = sha256(id.encode()).digest()
+
+    return int.from_bytes(digest[:4], "big") % parallelization_factor
+
+
+class SimulatedConsumer:
+    """
+    A consumer function, its error handling function and the event source
+    mapping that polls every shard of the stream for it.
+    """
+
+    def __init__(
+        self,
+        consumer_id: str,
+        job_store: InMemoryJobStore,
+        stream: StreamEmulator,
+        batch_size: int = 1,
+        parallelization_factor: int = 1,
+        time_scale: float = 0.001,
+    ) -> None:
+        self.batch_size = batch_size
+        self.consumer_id = consumer_id
+        self.error_handler_errors = 0
+        self.error_handler_invocations = 0
+        self.invocations = 0
+        self.lock = Lock()
+        self.parallelization_factor = parallelization_factor
+        self.positions = {
+            (shard_id, lane): 0
+            for shard_id in stream.shards
+            for lane in range(parallelization_factor)
+        }
+        self.stream = stream
+
+        environment = {
+            "CONSUMER_ID": consumer_id,
+            "JOBS_STORE_BACKEND": "memory",
+            "LOG_LEVEL": "ERROR",
+            "PARALLELIZATION_FACTOR": str(parallelization_factor),
+            "TIMEOUT": str(TIMEOUT),
+        }
+
+        self.consumer = load_module(
+            f"event_processing_{consumer_id}",
+            ROOT.joinpath("event_processing", "main.py"),
+            environment,
+        )
+        self.error_handling = load_module(
+            f"error_handling_{consumer_id}",
+            ROOT.joinpath("error_handling", "main.py"),
+            environment,
+        )
+
+        for module in [self.consumer, self.error_handling]:
+            module.handler = module.handler.__wrapped__
+            module.metrics = DiscardedMetrics()
+
+        # Jobs last time_scale of their seconds
+        self.consumer.sleep = lambda seconds: sleep(seconds * time_scale)
+        self.consumer.job_store = job_store
+        self.error_handling.dynamodbstreams = stream
+        self.error_handling.job_store = job_store
+
+    def poll(self, lane: int = 0) -> bool:
+        """
+        Invokes the consumer with the next batch of the lane of every shard,
+        and returns whether any batch was found.
+        """
+        polled = False
+
+        for shard_id in self.stream.shards:
+            key = (shard_id, lane)
+            records = []
+
+            # Filtered out records, and the records of the other lanes, are
+            # skipped, as by the event source
+            while len(records) < self.batch_size:
+                scanned = self.stream.read(
+                    shard_id,
+                    self.positions[key],
+                    self.batch_size - len(records),
+                )
+
+                if not scanned:
+                    break
+
+                self.positions[key] += len(scanned)
+                records.extend(
+                    record
+                    for record in scanned
+                    if self.error_handling.is_consumer_record(record) and
+                    get_lane(
+                        record["dynamodb"]["Keys"]["id"]["S"],
+                        self.parallelization_factor,
+                    ) == lane
+                )
+
+            if records:
+                polled = True
+
+                self.invoke(shard_id, records)
+
+        return polled
+
+    def invoke(self, shard_id: str, records: List[dict]) -> None:
+        with self.lock:
+            self.invocations += 1
+
+        response = self.consumer.handler(
+            {
+                "Records": records,
+            },
+            Context(TIMEOUT),
+        )
+        failed_sequence_numbers = {
+            failure["itemIdentifier"]
+            for failure in response["batchItemFailures"]
+        }
+
+        if not failed_sequence_numbers:
+            return
+
+        # Without retries, the batch from the first failed record on is sent
+        # to the on-failure destination
+        failed_records = records[
+            min(
+                position
+                for position, record in enumerate(records)
+                if record["dynamodb"]["SequenceNumber"] in
+                failed_sequence_numbers
+            ):
+        ]
+        message = {
+            "DDBStreamBatchInfo": {
+                "batchSize": len(failed_records),
+                "endSequenceNumber":
+                    failed_records[-1]["dynamodb"]["SequenceNumber"],
+                "shardId": shard_id,
+                "startSequenceNumber":
+                    failed_records[0]["dynamodb"]["SequenceNumber"],
+                "streamArn": STREAM_ARN,
+            },
+        }
+
+        with self.lock:
+            self.error_handler_invocations += 1
+
+        try:
+            self.error_handling.handler(
+                {
+                    "Records": [
+                        {
+                            "Sns": {
+                                "Message": dumps(message),
+                            },
+                        },
+                    ],
+                },
+                Context(TIMEOUT),
+            )
+        except Exception:
+            # Without retries, the event goes to the failed jobs event bus
+            with self.lock:
+                self.error_handler_errors += 1
+
+
+class Harness:
+    """
+    Submits jobs to the jobs table, runs the simulated consumers until every
+    job has a terminal status for each of them and reports throughput,
+    submit-to-complete latency and write amplification.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 1,
+        consumers: int = 2,
+        parallelization_factor: int = 1,
+        shards: int = 2,
+        time_scale: float = 0.001,
+    ) -> None:
+        self.completed: Dict[str, float] = {}
+        self.consumer_ids = [
+            f"consumer_{consumer + 1}"
+            for consumer in range(consumers)
+        ]
+        self.failed = set()
+        self.lock = Lock()
+        # Consumer statuses set to Failure after Success
+        self.overwritten_successes = 0
+        self.statuses: Dict[Tuple[str, str], str] = {}
+        self.stream = StreamEmulator(shards=shards)
+        self.submitted: Dict[str, float] = {}
+        self.writes = 0
+        self.job_store = InMemoryJobStore(
+            backoff_strategy="none",
+            on_write=self.on_write,
+            upsert_mode="nested_attribute",
+        )
+        self.consumers = [
+            SimulatedConsumer(
+                consumer_id,
+                self.job_store,
+                self.stream,
+                batch_size=batch_size,
+                parallelization_factor=parallelization_factor,
+                time_scale=time_scale,
+            )
+            for consumer_id in self.consumer_ids
+        ]
+
+    def on_write(self, event_name: str, item: dict) -> None:
+        id = item["id"]["S"]
+        job_status = item.get("job_status", {"M": {}})["M"]
+        statuses = [
+            job_status.get(consumer_id, {"M": {}})["M"].get(
+                "status", {}).get("S")
+            for consumer_id in self.consumer_ids
+        ]
+
+        with self.lock:
+            self.writes += 1
+
+            for consumer_id, status in zip(self.consumer_ids, statuses):
+                previous_status = self.statuses.get((id, consumer_id))
+
+                if previous_status == "Success" and status == "Failure":
+                    self.overwritten_successes += 1
+
+                if status is not None:
+                    self.statuses[(id, consumer_id)] = status
+
+            if event_name == "INSERT":
+                self.submitted[id] = monotonic()
+            elif id not in self.completed and \
+                    all(status in TERMINAL_STATUSES for status in statuses):
+                self.completed[id] = monotonic()
+
+                if "Failure" in statuses:
+                    self.failed.add(id)
+
+        self.stream.append(event_name, item)
+
+    def run(
+        self,
+        jobs: int = 100,
+        failure_rate: float = 0.0,
+        seconds: int = 1,
+        slow_rate: float = 0.0,
+        slow_seconds: int = 100,
+        timeout: float = 60.0,
+    ) -> dict:
+        """
+        Submits the jobs, one in every 1 / failure_rate lasting more than
+        the consumers' TIMEOUT so that they fail, and one in every
+        1 / slow_rate of the others lasting slow_seconds so that they block
+        the jobs behind them, and waits for them to complete.
+        """
+        failures = int(jobs * failure_rate)
+        failing_every = jobs // failures if failures else 0
+        slow_jobs = int(jobs * slow_rate)
+        slow_every = jobs // slow_jobs if slow_jobs else 0
+        stopped = Event()
+
+        def poll(consumer: SimulatedConsumer, lane: int) -> None:
+            while not stopped.is_set():
+                if not consumer.poll(lane):
+                    sleep(0.001)
+
+        threads = [
+            Thread(target=poll, args=(consumer, lane), daemon=True)
+            for consumer in self.consumers
+            for lane in range(consumer.parallelization_factor)
+        ]
+        start = monotonic()
+
+        for thread in threads:
+            thread.start()
+
+        for job in range(jobs):
+            failing = failing_every and job % failing_every == 0
+            slow = slow_every and job % slow_every == slow_every // 2
+
+            if failing:
+                job_seconds = TIMEOUT + 1
+            elif slow:
+                job_seconds = slow_seconds
+            else:
+                job_seconds = seconds
+
+            self.job_store.put_item({
+                "id": {
+                    "S": str(job),
+                },
+                "job_status": {
+                    "M": dict(),
+                },
+                "seconds": {
+                    "N": str(job_seconds),
+                },
+                "version": {
+                    "N": "0",
+                },
+            })
+
+        while len(self.completed) < jobs and monotonic() - start < timeout:
+            sleep(0.01)
+
+        stopped.set()
+
+        for thread in threads:
+            thread.join()
+
+        return self.report(jobs, monotonic() - start)
+
+    def report(self, jobs: int, elapsed: float) -> dict:
+        with self.lock:
+            latencies = [
+                completed - self.submitted[id]
+                for id, completed in self.completed.items()
+            ]
+            writes = self.writes
+            failed = len(self.failed)
+            overwritten_successes = self.overwritten_successes
+
+        percentiles = quantiles(latencies, n=100) \
+            if len(latencies) > 1 else latencies * 99
+
+        return {
+            "completed": len(latencies),
+            "error_handler_errors": sum(
+                consumer.error_handler_errors
+                for consumer in self.consumers
+            ),
+            "error_handler_invocations": sum(
+                consumer.error_handler_invocations
+                for consumer in self.consumers
+            ),
+            "failed": failed,
+            "invocations": sum(
+                consumer.invocations
+                for consumer in self.consumers
+            ),
+            "jobs": jobs,
+            "jobs_per_second": len(latencies) / elapsed,
+            "overwritten_successes": overwritten_successes,
+            "p50_milliseconds": percentiles[49] * 1000 if latencies else None,
+            "p99_milliseconds": percentiles[98] * 1000 if latencies else None,
+            # Table writes per job, the submission included
+            "write_amplification": writes / jobs,
+        }
+
+
+def load_module(
+    name: str,
+    path: Path,
+    environment: Dict[str, str],
+) -> ModuleType:
+    """
+    Loads a new copy of a handler module, with its own module-level
+    configuration read from the given environment.
+    """
+    previous_environment: Dict[str, Optional[str]] = {
+        key: environ.get(key)
+        for key in environment
+    }
+
+    environ.update(environment)
+
+    try:
+        spec = spec_from_file_location(name, path)
+        module = module_from_spec(spec)
+
+        spec.loader.exec_module(module)
+    finally:
+        for key, value in previous_environment.items():
+            if value is None:
+                environ.pop(key)
+            else:
+                environ[key] = value
+
+    return module
+
+
+def main(arguments: Optional[List[str]] = None) -> Tuple[dict, str]:
+    parser = ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--batch-size", default=1, type=int)
+    parser.add_argument("--consumers", default=2, type=int)
+    parser.add_argument("--failure-rate", default=0.0, type=float)
+    parser.add_argument("--jobs", default=100, type=int)
+    parser.add_argument("--parallelization-factor", default=1, type=int)
+    parser.add_argument("--seconds", default=1, type=int)
+    parser.add_argument("--shards", default=2, type=int)
+    parser.add_argument("--slow-rate", default=0.0, type=float)
+    parser.add_argument("--slow-seconds", default=100, type=int)
+    parser.add_argument("--time-scale", default=0.001, type=float)
+    parser.add_argument("--timeout", default=60.0, type=float)
+    arguments = parser.parse_args(arguments)
+    output = StringIO()
+
+    # The functions' logs and metrics are kept out of the report
+    with redirect_stdout(output):
+        harness = Harness(
+            batch_size=arguments.batch_size,
+            consumers=arguments.consumers,
+            parallelization_factor=arguments.parallelization_factor,
+            shards=arguments.shards,
+            time_scale=arguments.time_scale,
+        )
+        report = harness.run(
+            failure_rate=arguments.failure_rate,
+            jobs=arguments.jobs,
+            seconds=arguments.seconds,
+            slow_rate=arguments.slow_rate,
+            slow_seconds=arguments.slow_seconds,
+            timeout=arguments.timeout,
+        )
+
+    return report, output.getvalue()
+
+
+if __name__ == "__main__":
+    report, _ = main()
+
+    print(dumps(report, indent=2))
@@ -0,0 +1,178 @@
+from archiving import (
+    main,
+)
+from archiving.main import (
+    get_s3,
+    handler,
+)
+from base64 import (
+    b64encode,
+)
+from botocore.stub import (
+    ANY,
+    Stubber,
+)
+from gzip import (
+    decompress,
+)
+from json import (
+    dumps,
+    loads,
+)
+from pytest import (
+    MonkeyPatch,
+    fixture,
+)
+from tests.fixtures import (
+    context,
+)
+
+
+@fixture
+def event() -> dict:
+    old_image = {
+        "expires_at": {
+            "N": "1689605602",
+        },
+        "id": {
+            "S": "1",
+        },
+        "job_status": {
+            "M": {
+                "consumer_1": {
+                    "M": {
+                        "status": {
+                            "S": "Success",
+                        },
+                    },
+                },
+            },
+        },
+        "seconds": {
+            "N": "1",
+        },
+        "version": {
+            "N": "1",
+        },
+    }
+    event = {
+        "Records": [
+            {
+                "dynamodb": {
+                    "ApproximateCreationDateTime": 1689605602,
+                    "Keys": {
+                        "id": {
+                            "S": "2",
+                        },
+                    },
+                    "OldImage": old_image,
+                    "SequenceNumber": "100",
+                },
+                "eventName": "REMOVE",
+            },
+            {
+                "dynamodb": {
+                    "ApproximateCreationDateTime": 1689605602,
+                    "Keys": {
+                        "id": {
+                            "S": "1",
+                        },
+                    },
+                    "OldImage": old_image,
+                    "SequenceNumber": "101",
+                },
+                "eventName": "REMOVE",
+                "userIdentity": {
+                    "principalId": "dynamodb.amazonaws.com",
+                    "type": "Service",
+                },
+            },
+        ],
+    }
+
+    yield event
+
+
+def test_archiving(
+    context: object,
+    event: dict,
+    monkeypatch: MonkeyPatch,
+) -> None:
+    requests = []
+    monkeypatch.setattr(main, "ARCHIVE_BUCKET_NAME", "archive")
+
+    def record_request(params: dict, **kwargs) -> None:
+        # The parameters are then changed in place, the body into a file
+        requests.append(dict(params))
+
+    with Stubber(get_s3()) as s3_stub:
+        s3_stub.add_response(
+            "put_object",
+            expected_params={
+                "Body": ANY,
+                "Bucket": "archive",
+                "ContentEncoding": "gzip",
+                "ContentType": "application/x-ndjson",
+                "Key": "jobs/2023/07/17/101.jsonl.gz",
+            },
+            service_response={},
+        )
+        get_s3().meta.events.register(
+            "provide-client-params.s3.PutObject", record_request)
+
+        handler(event, context)
+
+        s3_stub.assert_no_pending_responses()
+
+    lines = decompress(requests[0]["Body"]).decode().splitlines()
+
+    # Only the job deleted by TTL is archived
+    assert [loads(line)["id"]["S"] for line in lines] == ["1"]  # nosec
+
+
+def test_archiving_nothing_expired(context: object, event: dict) -> None:
+    event["Records"] = event["Records"][:1]
+
+    with Stubber(get_s3()) as s3_stub:
+        handler(event, context)
+
+        s3_stub.assert_no_pending_responses()
+
+
+def test_archiving_kinesis(
+    context: object,
+    event: dict,
+    monkeypatch: MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(main, "ARCHIVE_BUCKET_NAME", "archive")
+
+    # Kinesis records have no SequenceNumber and a creation time in ms
+    record = event["Records"][1]
+    record["dynamodb"]["ApproximateCreationDateTime"] *= 1000
+    del record["dynamodb"]["SequenceNumber"]
+    event["Records"] = [
+        {
+            "kinesis": {
+                "data": b64encode(dumps(record).encode()).decode(),
+                "sequenceNumber": "49640912821178817833517986466168945147",
+            },
+        },
+    ]
+
+    with Stubber(get_s3()) as s3_stub:
+        s3_stub.add_response(
+            "put_object",
+            expected_params={
+                "Body": ANY,
+                "Bucket": "archive",
+                "ContentEncoding": "gzip",
+                "ContentType": "application/x-ndjson",
+                "Key": ("jobs/2023/07/17/"
+                        "49640912821178817833517986466168945147.jsonl.gz"),
+            },
+            service_response={},
+        )
+
+        handler(event, context)
+
+        s3_stub.assert_no_pending_responses()
@@ -0,0 +1,144 @@
+from boto3 import (
+    client,
+)
+from botocore.config import (
+    Config,
+)
+from concurrent.futures import (
+    ThreadPoolExecutor,
+)
+from http.server import (
+    BaseHTTPRequestHandler,
+    ThreadingHTTPServer,
+)
+from jobs_store.client import (
+    create_client_config,
+)
+from json import (
+    dumps,
+)
+from pytest import (
+    MonkeyPatch,
+    fixture,
+)
+from statistics import (
+    quantiles,
+)
+from threading import (
+    Thread,
+)
+from time import (
+    perf_counter,
+    sleep,
+)
+
+LATENCY = 0.005  # Each request to the stand-in lasts 5 milliseconds
+REQUESTS = 256
+WIDTH = 16
+
+
+class DynamoDBStandInHandler(BaseHTTPRequestHandler):
+    """
+    Answers every request as a GetItem of a job, after LATENCY seconds.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers["Content-Length"]))
+
+        sleep(LATENCY)
+
+        body = dumps({
+            "Item": {
+                "id": {
+                    "S": "1",
+                },
+                "version": {
+                    "N": "0",
+                },
+            },
+        }).encode()
+
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Content-Type", "application/x-amz-json-1.0")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+@fixture
+def endpoint_url() -> str:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), DynamoDBStandInHandler)
+    server.daemon_threads = True
+    thread = Thread(target=server.serve_forever, daemon=True)
+
+    thread.start()
+
+    yield f"http://127.0.0.1:{server.server_port}"
+
+    server.shutdown()
+    server.server_close()
+
+
+def get_item_latencies(dynamodb) -> list:
+    def get_item(_: int) -> float:
+        start = perf_counter()
+
+        dynamodb.get_item(
+            Key={
+                "id": {
+                    "S": "1",
+                },
+            },
+            TableName="jobs",
+        )
+
+        return perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=WIDTH) as executor:
+        return list(executor.map(get_item, range(REQUESTS)))
+
+
+def test_client_benchmark(
+    endpoint_url: str,
+    monkeypatch: MonkeyPatch,
+) -> None:
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+
+    configs = {
+        "botocore defaults": Config(),
+    }
+
+    for retry_mode in ["standard", "adaptive"]:
+        monkeypatch.setenv("CLIENT_MAX_POOL_CONNECTIONS", str(WIDTH))
+        monkeypatch.setenv("CLIENT_RETRY_MODE", retry_mode)
+
+        configs[f"tuned, {retry_mode} retries"] = create_client_config()
+
+    for name, config in configs.items():
+        dynamodb = client(
+            "dynamodb",
+            config=config,
+            endpoint_url=endpoint_url,
+            region_name="us-east-1",
+        )
+
+        # Open the connections before measuring
+        get_item_latencies(dynamodb)
+
+        latencies = get_item_latencies(dynamodb)
+        percentiles = quantiles(latencies, n=100)
+
+        assert len(latencies) == REQUESTS  # nosec
+
+        print(
+            f"{name:<26}: "
+            f"p50 {percentiles[49] * 1000:.1f} ms, "
+            f"p90 {percentiles[89] * 1000:.1f} ms, "
+            f"p99 {percentiles[98] * 1000:.1f} ms "
+            f"over {REQUESTS} requests, {WIDTH} at a time"
+        )
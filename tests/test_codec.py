@@ -0,0 +1,130 @@
+from boto3.dynamodb.types import (
+    TypeDeserializer,
+    TypeSerializer,
+)
+from jobs_store.codec import (
+    ConsumerStatus,
+    Job,
+    decode_job,
+    encode_consumer_status,
+    encode_job_status,
+)
+from pytest import (
+    fixture,
+)
+from timeit import (
+    timeit,
+)
+
+
+@fixture
+def item() -> dict:
+    item = {
+        "id": {
+            "S": "1",
+        },
+        "job_status": {
+            "M": {
+                f"consumer_{consumer_id}": {
+                    "M": {
+                        "results": {
+                            "S": "I slept for 1 seconds",
+                        },
+                        "status": {
+                            "S": "Success",
+                        },
+                    },
+                }
+                for consumer_id in range(1, 101)
+            },
+        },
+        "seconds": {
+            "N": "1",
+        },
+        "version": {
+            "N": "100",
+        },
+    }
+
+    yield item
+
+
+def test_decode_job(item: dict) -> None:
+    job = decode_job(item)
+
+    assert job.id == "1"  # nosec
+    assert job.seconds == 1  # nosec
+    assert job.version == 100  # nosec
+    assert len(job.job_status) == 100  # nosec
+    assert job.job_status["consumer_1"] == ConsumerStatus(  # nosec
+        results="I slept for 1 seconds",
+        status="Success",
+    )
+
+
+def test_decode_job_new_image() -> None:
+    job = decode_job({
+        "id": {
+            "S": "2",
+        },
+        "seconds": {
+            "N": "301",
+        },
+    })
+
+    assert job == Job(  # nosec
+        id="2",
+        seconds=301,
+    )
+
+
+def test_encode_consumer_status() -> None:
+    assert encode_consumer_status(ConsumerStatus(  # nosec
+        seconds="301",
+        status="Failure",
+    )) == {
+        "M": {
+            "seconds": {
+                "S": "301",
+            },
+            "status": {
+                "S": "Failure",
+            },
+        },
+    }
+
+
+def test_encode_job_status(item: dict) -> None:
+    job = decode_job(item)
+
+    assert encode_job_status(job.job_status) == item["job_status"]  # nosec
+
+
+def test_codec_benchmark(item: dict) -> None:
+    number = 200
+
+    def boto3_round_trip() -> None:
+        deserializer = TypeDeserializer()
+        serializer = TypeSerializer()
+        item_python = {
+            k: deserializer.deserialize(v)
+            for k, v in item.items()
+        }
+        {
+            k: serializer.serialize(v)
+            for k, v in item_python["job_status"].items()
+        }
+
+    def codec_round_trip() -> None:
+        encode_job_status(decode_job(item).job_status)
+
+    boto3_seconds = timeit(boto3_round_trip, number=number)
+    codec_seconds = timeit(codec_round_trip, number=number)
+
+    print(
+        f"boto3: {boto3_seconds / number * 1e6:.1f} us/item, "
+        f"codec: {codec_seconds / number * 1e6:.1f} us/item, "
+        f"speedup: {boto3_seconds / codec_seconds:.1f}x"
+    )
+
+    assert codec_seconds < boto3_seconds  # nosec
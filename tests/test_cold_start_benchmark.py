@@ -0,0 +1,112 @@
+from os import (
+    environ,
+)
+from pathlib import (
+    Path,
+)
+from pytest import (
+    fixture,
+    mark,
+)
+from subprocess import (  # nosec
+    run,
+)
+from sys import (
+    executable,
+)
+
+FIRST_INVOCATION_BUDGET = 1.5  # Seconds from import to the first response
+IMPORT_TIME_BUDGET = 1.0  # Seconds to import the handler module
+# Imports the handler module and invokes it once with an empty event, as on
+# a cold start, then prints the elapsed seconds and whether boto3 is loaded
+FIRST_INVOCATION_SCRIPT = """
+from time import perf_counter
+
+start = perf_counter()
+
+from importlib import import_module
+from sys import argv, modules
+
+
+class Context:
+    def get_remaining_time_in_millis(self) -> int:
+        return 900000
+
+
+module = import_module(argv[1])
+loaded_on_import = "boto3" in modules
+
+module.handler({"Records": []}, Context())
+
+print(perf_counter() - start)
+print(loaded_on_import)
+"""
+
+
+@fixture
+def environment() -> dict:
+    environment = {
+        **environ,
+        "AWS_DEFAULT_REGION": "us-east-1",
+        "CONSUMER_ID": "consumer_1",
+        "JOBS_STORE_BACKEND": "memory",
+        "LOG_LEVEL": "ERROR",
+        "TABLE_NAME": "jobs",
+        "TIMEOUT": "300",
+    }
+
+    yield environment
+
+
+def import_time(module: str, environment: dict) -> float:
+    """
+    Returns the cumulative import time of the module, in seconds, reported
+    by python -X importtime.
+    """
+    result = run(  # nosec
+        [executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        check=True,
+        cwd=Path(__file__).parent.parent,
+        env=environment,
+        text=True,
+    )
+
+    # The lines are "import time: self [us] | cumulative | imported package"
+    for line in result.stderr.splitlines():
+        columns = line.split("|")
+
+        if len(columns) == 3 and columns[2].strip() == module:
+            return int(columns[1]) / 1000000
+
+    raise ValueError(f"No import time reported for {module}")
+
+
+@mark.parametrize("module", [
+    "archiving.main",
+    "error_handling.main",
+    "event_processing.main",
+])
+def test_cold_start_benchmark(module: str, environment: dict) -> None:
+    result = run(  # nosec
+        [executable, "-c", FIRST_INVOCATION_SCRIPT, module],
+        capture_output=True,
+        check=True,
+        cwd=Path(__file__).parent.parent,
+        env=environment,
+        text=True,
+    )
+    first_invocation_seconds, loaded_on_import = \
+        result.stdout.splitlines()[-2:]
+    import_seconds = import_time(module, environment)
+
+    print(
+        f"{module}: "
+        f"import {import_seconds * 1000:.1f} ms, "
+        f"first invocation {float(first_invocation_seconds) * 1000:.1f} ms"
+    )
+
+    # Clients are created on first use, not on import
+    assert loaded_on_import == "False"  # nosec
+    assert import_seconds < IMPORT_TIME_BUDGET  # nosec
+    assert float(first_invocation_seconds) < FIRST_INVOCATION_BUDGET  # nosec
@@ -0,0 +1,98 @@
+from awslambdaric.lambda_context import (
+    LambdaContext,
+)
+from event_processing.main import (
+    handler,
+)
+from jobs_store.memory import (
+    InMemoryJobStore,
+)
+from pytest import (
+    MonkeyPatch,
+    fixture,
+)
+from tests.fixtures import (
+    context,
+)
+from time import (
+    perf_counter,
+    sleep,
+)
+
+RECORDS = 32
+TIME_SCALE = 0.01  # Each job second lasts 10 milliseconds
+
+
+@fixture
+def event() -> dict:
+    event = {
+        "Records": [
+            {
+                "dynamodb": {
+                    "NewImage": {
+                        "id": {
+                            "S": str(record),
+                        },
+                        "seconds": {
+                            "N": "1",
+                        },
+                    },
+                    "SequenceNumber": str(record),
+                },
+            }
+            for record in range(RECORDS)
+        ],
+    }
+
+    yield event
+
+
+@fixture
+def job_store(event: dict) -> InMemoryJobStore:
+    job_store = InMemoryJobStore(backoff_strategy="none")
+
+    for record in event["Records"]:
+        job_store.put_item({
+            **record["dynamodb"]["NewImage"],
+            "job_status": {
+                "M": dict(),
+            },
+            "version": {
+                "N": "0",
+            },
+        })
+
+    yield job_store
+
+
+def test_concurrency_benchmark(
+    context: LambdaContext,
+    event: dict,
+    job_store: InMemoryJobStore,
+    monkeypatch: MonkeyPatch,
+) -> None:
+    monkeypatch.setattr("event_processing.main.job_store", job_store)
+    monkeypatch.setattr("event_processing.main.sleep",
+                        lambda seconds: sleep(seconds * TIME_SCALE))
+
+    wall_clock_seconds = {}
+
+    for record_concurrency in [1, 2, 4, 8, 16]:
+        monkeypatch.setattr("event_processing.main.RECORD_CONCURRENCY",
+                            record_concurrency)
+
+        start = perf_counter()
+        response = handler(event, context)
+        wall_clock_seconds[record_concurrency] = perf_counter() - start
+
+        assert response == {  # nosec
+            "batchItemFailures": [],
+        }
+
+        print(
+            f"width {record_concurrency:>2}: "
+            f"{wall_clock_seconds[record_concurrency] * 1000:.1f} ms "
+            f"per batch of {RECORDS} records"
+        )
+
+    assert wall_clock_seconds[8] < wall_clock_seconds[1]  # nosec
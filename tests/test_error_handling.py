@@ -5,16 +5,23 @@ from botocore.stub import (
     Stubber,
 )
 from error_handling.main import (
-    dynamodb,
-    dynamodbstreams,
+    get_dynamodbstreams,
+    get_job_store,
+    get_kinesis,
     handler,
+    shard_iterators,
+)
+from jobs_store.memory import (
+    InMemoryJobStore,
 )
 from json import (
     dumps,
     loads,
 )
 from pytest import (
+    MonkeyPatch,
     fixture,
+    raises,
 )
 from tests.fixtures import (
     context,
@@ -23,7 +30,7 @@ from tests.fixtures import (
 
 @fixture
 def dynamodb_stub(event: dict) -> Stubber:
-    dynamodb_stub = Stubber(dynamodb)
+    dynamodb_stub = Stubber(get_job_store().client)
     id = "1"
 
     dynamodb_stub.add_response(
@@ -91,9 +98,61 @@ def dynamodb_stub(event: dict) -> Stubber:
     yield dynamodb_stub
 
 
+@fixture
+def dynamodb_stub_nested_attribute(event: dict) -> Stubber:
+    dynamodb_stub_nested_attribute = Stubber(get_job_store().client)
+    id = "1"
+
+    dynamodb_stub_nested_attribute.add_response(
+        "update_item",
+        expected_params={
+            "ConditionExpression": ("attribute_exists(id) AND NOT "
+                                    "job_status.#consumer.#status IN "
+                                    "(:terminal_0, :terminal_1)"),
+            "ExpressionAttributeNames": {
+                "#consumer": "consumer_1",
+                "#status": "status",
+            },
+            "ExpressionAttributeValues": {
+                ":one": {
+                    "N": "1",
+                },
+                ":s": {
+                    "M": {
+                        "seconds": {
+                            "S": "301",
+                        },
+                        "status": {
+                            "S": "Failure",
+                        },
+                    },
+                },
+                ":terminal_0": {
+                    "S": "Failure",
+                },
+                ":terminal_1": {
+                    "S": "Success",
+                },
+            },
+            "Key": {
+                "id": {
+                    "S": id,
+                },
+            },
+            "ReturnValues": "UPDATED_NEW",
+            "TableName": "jobs",
+            "UpdateExpression": ("SET job_status.#consumer=:s "
+                                 "ADD version :one"),
+        },
+        service_response=dict(),
+    )
+
+    yield dynamodb_stub_nested_attribute
+
+
 @fixture
 def dynamodbstreams_stub(event: dict) -> Stubber:
-    dynamodbstreams_stub = Stubber(dynamodbstreams)
+    dynamodbstreams_stub = Stubber(get_dynamodbstreams())
     message = loads(event["Records"][0]["Sns"]["Message"])
     batch_info = message["DDBStreamBatchInfo"]
     shard_iterator = "000000000000000000000000"
@@ -117,19 +176,9 @@ def dynamodbstreams_stub(event: dict) -> Stubber:
             "ShardIterator": shard_iterator,
         },
         service_response={
+            "NextShardIterator": "000000000000000000000001",
             "Records": [
-                {
-                    "dynamodb": {
-                        "NewImage": {
-                            "id": {
-                                "S": "1",
-                            },
-                            "seconds": {
-                                "N": "301",
-                            },
-                        },
-                    },
-                },
+                stream_record("INSERT", "1", "000000000000000000000000"),
             ],
         },
     )
@@ -141,6 +190,8 @@ def dynamodbstreams_stub(event: dict) -> Stubber:
 def event() -> dict:
     message = {
         "DDBStreamBatchInfo": {
+            "batchSize": 1,
+            "endSequenceNumber": "000000000000000000000000",
             "startSequenceNumber": "000000000000000000000000",
             "shardId": "shardId-00000000000000000000",
             "streamArn": "arn:aws:dynamodb:us-east-1:012356789012:table/jobs/stream/0",
@@ -159,6 +210,120 @@ def event() -> dict:
     yield event
 
 
+@fixture(autouse=True)
+def shard_iterators_cache() -> dict:
+    shard_iterators.clear()
+
+    yield shard_iterators
+
+    shard_iterators.clear()
+
+
+def message_event(
+    start_sequence_number: str,
+    end_sequence_number: str,
+    batch_size: int,
+) -> dict:
+    message = {
+        "DDBStreamBatchInfo": {
+            "batchSize": batch_size,
+            "endSequenceNumber": end_sequence_number,
+            "startSequenceNumber": start_sequence_number,
+            "shardId": "shardId-00000000000000000000",
+            "streamArn": "arn:aws:dynamodb:us-east-1:012356789012:table/jobs/stream/0",
+        },
+    }
+
+    return {
+        "Records": [
+            {
+                "Sns": {
+                    "Message": dumps(message),
+                },
+            },
+        ],
+    }
+
+
+def stream_record(
+    event_name: str,
+    id: str,
+    sequence_number: str,
+    status: str = "Running",
+) -> dict:
+    return {
+        "dynamodb": {
+            "NewImage": {
+                "id": {
+                    "S": id,
+                },
+                "job_status": {
+                    "M": {
+                        "consumer_1": {
+                            "M": {
+                                "status": {
+                                    "S": status,
+                                },
+                            },
+                        },
+                    } if event_name == "MODIFY" else dict(),
+                },
+                "seconds": {
+                    "N": "301",
+                },
+            },
+            "SequenceNumber": sequence_number,
+        },
+        "eventName": event_name,
+    }
+
+
+def add_failure_response(dynamodb_stub: Stubber, id: str) -> None:
+    dynamodb_stub.add_response(
+        "update_item",
+        expected_params={
+            "ConditionExpression": ("attribute_exists(id) AND NOT "
+                                    "job_status.#consumer.#status IN "
+                                    "(:terminal_0, :terminal_1)"),
+            "ExpressionAttributeNames": {
+                "#consumer": "consumer_1",
+                "#status": "status",
+            },
+            "ExpressionAttributeValues": {
+                ":one": {
+                    "N": "1",
+                },
+                ":s": {
+                    "M": {
+                        "seconds": {
+                            "S": "301",
+                        },
+                        "status": {
+                            "S": "Failure",
+                        },
+                    },
+                },
+                ":terminal_0": {
+                    "S": "Failure",
+                },
+                ":terminal_1": {
+                    "S": "Success",
+                },
+            },
+            "Key": {
+                "id": {
+                    "S": id,
+                },
+            },
+            "ReturnValues": "UPDATED_NEW",
+            "TableName": "jobs",
+            "UpdateExpression": ("SET job_status.#consumer=:s "
+                                 "ADD version :one"),
+        },
+        service_response=dict(),
+    )
+
+
 def test_error_handling(
     context: LambdaContext,
     dynamodb_stub: Stubber,
@@ -167,3 +332,537 @@ def test_error_handling(
 ) -> None:
     with dynamodb_stub, dynamodbstreams_stub:
         handler(event, context)
+
+
+def test_error_handling_nested_attribute(
+    context: LambdaContext,
+    dynamodb_stub_nested_attribute: Stubber,
+    dynamodbstreams_stub: Stubber,
+    event: dict,
+    monkeypatch: MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(get_job_store(), "upsert_mode", "nested_attribute")
+
+    with dynamodb_stub_nested_attribute, dynamodbstreams_stub:
+        handler(event, context)
+
+    dynamodb_stub_nested_attribute.assert_no_pending_responses()
+
+
+def test_error_handling_batch(
+    context: LambdaContext,
+    monkeypatch: MonkeyPatch,
+) -> None:
+    """
+    Every record of the failed batch is read, across pages, except the
+    ones filtered out of the consumer's event source.
+    """
+    monkeypatch.setattr(get_job_store(), "upsert_mode", "nested_attribute")
+
+    dynamodb_stub = Stubber(get_job_store().client)
+    dynamodbstreams_stub = Stubber(get_dynamodbstreams())
+
+    dynamodbstreams_stub.add_response(
+        "get_shard_iterator",
+        expected_params={
+            "SequenceNumber": "000000000000000000100",
+            "ShardId": "shardId-00000000000000000000",
+            "ShardIteratorType": "AT_SEQUENCE_NUMBER",
+            "StreamArn": "arn:aws:dynamodb:us-east-1:012356789012:table/jobs/stream/0",
+        },
+        service_response={
+            "ShardIterator": "iterator-100",
+        },
+    )
+    dynamodbstreams_stub.add_response(
+        "get_records",
+        expected_params={
+            "Limit": 3,
+            "ShardIterator": "iterator-100",
+        },
+        service_response={
+            "NextShardIterator": "iterator-300",
+            "Records": [
+                stream_record("INSERT", "1", "000000000000000000100"),
+                stream_record("MODIFY", "1", "000000000000000000200"),
+                stream_record("INSERT", "2", "000000000000000000300"),
+            ],
+        },
+    )
+    dynamodbstreams_stub.add_response(
+        "get_records",
+        expected_params={
+            "Limit": 1,
+            "ShardIterator": "iterator-300",
+        },
+        service_response={
+            "NextShardIterator": "iterator-400",
+            "Records": [
+                stream_record(
+                    "MODIFY",
+                    "3",
+                    "000000000000000000400",
+                    status="Checkpointed",
+                ),
+            ],
+        },
+    )
+
+    for id in ("1", "2", "3"):
+        add_failure_response(dynamodb_stub, id)
+
+    with dynamodb_stub, dynamodbstreams_stub:
+        handler(message_event(
+            "000000000000000000100", "000000000000000000400", 3), context)
+
+    dynamodb_stub.assert_no_pending_responses()
+    dynamodbstreams_stub.assert_no_pending_responses()
+
+
+def test_error_handling_bulk(
+    context: LambdaContext,
+    monkeypatch: MonkeyPatch,
+) -> None:
+    """
+    The jobs of every SNS record are set as failed independently, and the
+    event fails once all of them are done if any could not be set.
+    """
+    in_memory_job_store = InMemoryJobStore(upsert_mode="nested_attribute")
+    dynamodbstreams_stub = Stubber(get_dynamodbstreams())
+    event = {
+        "Records": [],
+    }
+
+    monkeypatch.setattr("error_handling.main.job_store", in_memory_job_store)
+
+    for id in ("1", "2"):
+        in_memory_job_store.put_item({
+            "id": {
+                "S": id,
+            },
+            "job_status": {
+                "M": dict(),
+            },
+            "seconds": {
+                "N": "301",
+            },
+            "version": {
+                "N": "0",
+            },
+        })
+
+    # The job 3 is not in the table, so its status cannot be set
+    for id, sequence_number in (
+            ("1", "000000000000000000100"),
+            ("3", "000000000000000000200"),
+            ("2", "000000000000000000300")):
+        shard_id = f"shardId-{id:0>20}"
+
+        dynamodbstreams_stub.add_response(
+            "get_shard_iterator",
+            expected_params={
+                "SequenceNumber": sequence_number,
+                "ShardId": shard_id,
+                "ShardIteratorType": "AT_SEQUENCE_NUMBER",
+                "StreamArn": "arn:aws:dynamodb:us-east-1:012356789012:table/jobs/stream/0",
+            },
+            service_response={
+                "ShardIterator": f"iterator-{sequence_number}",
+            },
+        )
+        dynamodbstreams_stub.add_response(
+            "get_records",
+            expected_params={
+                "Limit": 1,
+                "ShardIterator": f"iterator-{sequence_number}",
+            },
+            service_response={
+                "Records": [
+                    stream_record("INSERT", id, sequence_number),
+                ],
+            },
+        )
+
+        message = loads(message_event(sequence_number, sequence_number, 1)[
+            "Records"][0]["Sns"]["Message"])
+        message["DDBStreamBatchInfo"]["shardId"] = shard_id
+
+        event["Records"].append({
+            "Sns": {
+                "Message": dumps(message),
+            },
+        })
+
+    with dynamodbstreams_stub, raises(RuntimeError):
+        handler(event, context)
+
+    for id in ("1", "2"):
+        assert in_memory_job_store.get_item(id)["job_status"]["M"][  # nosec
+            "consumer_1"]["M"]["status"] == {"S": "Failure"}
+
+
+def test_error_handling_finished_jobs(
+    context: LambdaContext,
+    monkeypatch: MonkeyPatch,
+) -> None:
+    """
+    The failed range runs from the first failed record to the end of the
+    batch, and the jobs in it that the consumer finished are not failed.
+    """
+    in_memory_job_store = InMemoryJobStore(upsert_mode="nested_attribute")
+    dynamodbstreams_stub = Stubber(get_dynamodbstreams())
+
+    monkeypatch.setattr("error_handling.main.job_store", in_memory_job_store)
+
+    for id, job_status in (("1", {"status": {"S": "Success"}}), ("2", None)):
+        in_memory_job_store.put_item({
+            "id": {
+                "S": id,
+            },
+            "job_status": {
+                "M": {
+                    "consumer_1": {
+                        "M": job_status,
+                    },
+                } if job_status is not None else dict(),
+            },
+            "seconds": {
+                "N": "301",
+            },
+            "version": {
+                "N": "0",
+            },
+        })
+
+    dynamodbstreams_stub.add_response(
+        "get_shard_iterator",
+        expected_params={
+            "SequenceNumber": "000000000000000000100",
+            "ShardId": "shardId-00000000000000000000",
+            "ShardIteratorType": "AT_SEQUENCE_NUMBER",
+            "StreamArn": "arn:aws:dynamodb:us-east-1:012356789012:table/jobs/stream/0",
+        },
+        service_response={
+            "ShardIterator": "iterator-100",
+        },
+    )
+    dynamodbstreams_stub.add_response(
+        "get_records",
+        expected_params={
+            "Limit": 2,
+            "ShardIterator": "iterator-100",
+        },
+        service_response={
+            "Records": [
+                stream_record("INSERT", "2", "000000000000000000100"),
+                stream_record("INSERT", "1", "000000000000000000200"),
+            ],
+        },
+    )
+
+    with dynamodbstreams_stub:
+        handler(message_event(
+            "000000000000000000100", "000000000000000000200", 2), context)
+
+    dynamodbstreams_stub.assert_no_pending_responses()
+
+    for id, status in (("1", "Success"), ("2", "Failure")):
+        assert in_memory_job_store.get_item(id)["job_status"]["M"][  # nosec
+            "consumer_1"]["M"]["status"] == {"S": status}
+
+
+def test_error_handling_parallelized(
+    context: LambdaContext,
+    monkeypatch: MonkeyPatch,
+) -> None:
+    """
+    Under a parallelization factor, the range also spans the records of the
+    batches processed concurrently from the same shard, so it is read up to
+    its end, past the batchSize records, and the failed job at its end is
+    not missed.
+    """
+    in_memory_job_store = InMemoryJobStore(upsert_mode="nested_attribute")
+    dynamodbstreams_stub = Stubber(get_dynamodbstreams())
+
+    monkeypatch.setattr("error_handling.main.PARALLELIZATION_FACTOR", 2)
+    monkeypatch.setattr("error_handling.main.job_store", in_memory_job_store)
+
+    for id, job_status in (("1", {"status": {"S": "Success"}}), ("2", None)):
+        in_memory_job_store.put_item({
+            "id": {
+                "S": id,
+            },
+            "job_status": {
+                "M": {
+                    "consumer_1": {
+                        "M": job_status,
+                    },
+                } if job_status is not None else dict(),
+            },
+            "seconds": {
+                "N": "301",
+            },
+            "version": {
+                "N": "0",
+            },
+        })
+
+    dynamodbstreams_stub.add_response(
+        "get_shard_iterator",
+        expected_params={
+            "SequenceNumber": "000000000000000000100",
+            "ShardId": "shardId-00000000000000000000",
+            "ShardIteratorType": "AT_SEQUENCE_NUMBER",
+            "StreamArn": "arn:aws:dynamodb:us-east-1:012356789012:table/jobs/stream/0",
+        },
+        service_response={
+            "ShardIterator": "iterator-100",
+        },
+    )
+    dynamodbstreams_stub.add_response(
+        "get_records",
+        expected_params={
+            "Limit": 1000,
+            "ShardIterator": "iterator-100",
+        },
+        service_response={
+            "Records": [
+                stream_record("INSERT", "1", "000000000000000000100"),
+                stream_record("INSERT", "2", "000000000000000000200"),
+            ],
+        },
+    )
+
+    with dynamodbstreams_stub:
+        handler(message_event(
+            "000000000000000000100", "000000000000000000200", 1), context)
+
+    dynamodbstreams_stub.assert_no_pending_responses()
+
+    for id, status in (("1", "Success"), ("2", "Failure")):
+        assert in_memory_job_store.get_item(id)["job_status"]["M"][  # nosec
+            "consumer_1"]["M"]["status"] == {"S": status}
+
+
+def test_error_handling_parallelized_in_flight(
+    context: LambdaContext,
+    monkeypatch: MonkeyPatch,
+) -> None:
+    """
+    Under a parallelization factor, the jobs between the first and the last
+    records of the range may be in flight in the batches of other lanes, so
+    they are failed only when they are neither finished, nor Running, nor
+    not started yet.
+    """
+    in_memory_job_store = InMemoryJobStore(upsert_mode="nested_attribute")
+    dynamodbstreams_stub = Stubber(get_dynamodbstreams())
+
+    monkeypatch.setattr("error_handling.main.PARALLELIZATION_FACTOR", 2)
+    monkeypatch.setattr("error_handling.main.job_store", in_memory_job_store)
+
+    for id, job_status in (
+            ("1", None),
+            ("2", {"status": {"S": "Running"}}),
+            ("3", None),
+            ("4", {"progress": {"S": "60"}, "status": {"S": "Checkpointed"}}),
+            ("5", {"status": {"S": "Running"}})):
+        in_memory_job_store.put_item({
+            "id": {
+                "S": id,
+            },
+            "job_status": {
+                "M": {
+                    "consumer_1": {
+                        "M": job_status,
+                    },
+                } if job_status is not None else dict(),
+            },
+            "seconds": {
+                "N": "301",
+            },
+            "version": {
+                "N": "0",
+            },
+        })
+
+    dynamodbstreams_stub.add_response(
+        "get_shard_iterator",
+        expected_params={
+            "SequenceNumber": "000000000000000000100",
+            "ShardId": "shardId-00000000000000000000",
+            "ShardIteratorType": "AT_SEQUENCE_NUMBER",
+            "StreamArn": "arn:aws:dynamodb:us-east-1:012356789012:table/jobs/stream/0",
+        },
+        service_response={
+            "ShardIterator": "iterator-100",
+        },
+    )
+    dynamodbstreams_stub.add_response(
+        "get_records",
+        expected_params={
+            "Limit": 1000,
+            "ShardIterator": "iterator-100",
+        },
+        service_response={
+            "Records": [
+                stream_record("INSERT", "1", "000000000000000000100"),
+                stream_record("INSERT", "2", "000000000000000000200"),
+                stream_record("INSERT", "3", "000000000000000000300"),
+                stream_record("INSERT", "4", "000000000000000000400"),
+                stream_record("INSERT", "5", "000000000000000000500"),
+            ],
+        },
+    )
+
+    with dynamodbstreams_stub:
+        handler(message_event(
+            "000000000000000000100", "000000000000000000500", 2), context)
+
+    dynamodbstreams_stub.assert_no_pending_responses()
+
+    for id, status in (
+            ("1", {"S": "Failure"}),
+            ("2", {"S": "Running"}),
+            ("3", None),
+            ("4", {"S": "Failure"}),
+            ("5", {"S": "Failure"})):
+        assert in_memory_job_store.get_item(id)["job_status"][  # nosec
+            "M"].get("consumer_1", {"M": {}})["M"].get("status") == status
+
+
+def test_error_handling_cached_shard_iterator(
+    context: LambdaContext,
+    monkeypatch: MonkeyPatch,
+    shard_iterators_cache: dict,
+) -> None:
+    """
+    A later batch of the same shard is read from the iterator cached by the
+    previous invocation, without getting a new one.
+    """
+    monkeypatch.setattr(get_job_store(), "upsert_mode", "nested_attribute")
+
+    dynamodb_stub = Stubber(get_job_store().client)
+    dynamodbstreams_stub = Stubber(get_dynamodbstreams())
+
+    dynamodbstreams_stub.add_response(
+        "get_shard_iterator",
+        expected_params={
+            "SequenceNumber": "000000000000000000100",
+            "ShardId": "shardId-00000000000000000000",
+            "ShardIteratorType": "AT_SEQUENCE_NUMBER",
+            "StreamArn": "arn:aws:dynamodb:us-east-1:012356789012:table/jobs/stream/0",
+        },
+        service_response={
+            "ShardIterator": "iterator-100",
+        },
+    )
+    dynamodbstreams_stub.add_response(
+        "get_records",
+        expected_params={
+            "Limit": 1,
+            "ShardIterator": "iterator-100",
+        },
+        service_response={
+            "NextShardIterator": "iterator-200",
+            "Records": [
+                stream_record("INSERT", "1", "000000000000000000100"),
+            ],
+        },
+    )
+    dynamodbstreams_stub.add_response(
+        "get_records",
+        expected_params={
+            "Limit": 1,
+            "ShardIterator": "iterator-200",
+        },
+        service_response={
+            "NextShardIterator": "iterator-300",
+            "Records": [
+                stream_record("INSERT", "2", "000000000000000000300"),
+            ],
+        },
+    )
+
+    for id in ("1", "2"):
+        add_failure_response(dynamodb_stub, id)
+
+    with dynamodb_stub, dynamodbstreams_stub:
+        handler(message_event(
+            "000000000000000000100", "000000000000000000100", 1), context)
+        handler(message_event(
+            "000000000000000000300", "000000000000000000300", 1), context)
+
+    dynamodb_stub.assert_no_pending_responses()
+    dynamodbstreams_stub.assert_no_pending_responses()
+    assert len(shard_iterators_cache) == 1  # nosec
+
+
+def test_error_handling_kinesis(
+    context: LambdaContext,
+    monkeypatch: MonkeyPatch,
+) -> None:
+    """
+    The records of a failed batch of the Kinesis data stream are read from
+    it, and decoded like the ones of the DynamoDB stream.
+    """
+    monkeypatch.setattr(get_job_store(), "upsert_mode", "nested_attribute")
+
+    dynamodb_stub = Stubber(get_job_store().client)
+    kinesis_stub = Stubber(get_kinesis())
+    message = {
+        "KinesisBatchInfo": {
+            "batchSize": 1,
+            "endSequenceNumber": "100",
+            "shardId": "shardId-000000000000",
+            "startSequenceNumber": "100",
+            "streamArn": "arn:aws:kinesis:us-east-1:012356789012:stream/jobs",
+        },
+    }
+    record = stream_record("INSERT", "1", "100")
+
+    del record["dynamodb"]["SequenceNumber"]
+
+    kinesis_stub.add_response(
+        "get_shard_iterator",
+        expected_params={
+            "ShardId": "shardId-000000000000",
+            "ShardIteratorType": "AT_SEQUENCE_NUMBER",
+            "StartingSequenceNumber": "100",
+            "StreamARN": "arn:aws:kinesis:us-east-1:012356789012:stream/jobs",
+        },
+        service_response={
+            "ShardIterator": "iterator-100",
+        },
+    )
+    kinesis_stub.add_response(
+        "get_records",
+        expected_params={
+            "Limit": 1,
+            "ShardIterator": "iterator-100",
+        },
+        service_response={
+            "NextShardIterator": "iterator-200",
+            "Records": [
+                {
+                    "Data": dumps(record).encode(),
+                    "PartitionKey": "1",
+                    "SequenceNumber": "100",
+                },
+            ],
+        },
+    )
+    add_failure_response(dynamodb_stub, "1")
+
+    with dynamodb_stub, kinesis_stub:
+        handler({
+            "Records": [
+                {
+                    "Sns": {
+                        "Message": dumps(message),
+                    },
+                },
+            ],
+        }, context)
+
+    dynamodb_stub.assert_no_pending_responses()
+    kinesis_stub.assert_no_pending_responses()
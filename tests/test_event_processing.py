@@ -1,27 +1,41 @@
 from awslambdaric.lambda_context import (
     LambdaContext,
 )
+from base64 import (
+    b64encode,
+)
 from botocore.stub import (
     Stubber,
 )
 from event_processing.main import (
-    dynamodb,
+    get_job_store,
     handler,
 )
-from os import (
-    getenv,
+from jobs_store.memory import (
+    InMemoryJobStore,
+)
+from json import (
+    dumps,
+    loads,
 )
 from pytest import (
+    CaptureFixture,
+    MonkeyPatch,
     fixture,
+    mark,
 )
 from tests.fixtures import (
     context,
 )
+from time import (
+    sleep,
+    time,
+)
 
 
 @fixture
 def dynamodb_stub_failure(event_failure: dict) -> Stubber:
-    dynamodb_stub_failure = Stubber(dynamodb)
+    dynamodb_stub_failure = Stubber(get_job_store().client)
     id = event_failure["Records"][0]["dynamodb"]["NewImage"]["id"]["S"]
 
     dynamodb_stub_failure.add_response(
@@ -86,9 +100,236 @@ def dynamodb_stub_failure(event_failure: dict) -> Stubber:
     yield dynamodb_stub_failure
 
 
+@fixture
+def dynamodb_stub_folded_running(event_success: dict) -> Stubber:
+    dynamodb_stub_folded_running = Stubber(get_job_store().client)
+    id = event_success["Records"][0]["dynamodb"]["NewImage"]["id"]["S"]
+    seconds = event_success["Records"][0]["dynamodb"]["NewImage"]["seconds"]["N"]
+
+    dynamodb_stub_folded_running.add_response(
+        "get_item",
+        expected_params={
+            "Key": {
+                "id": {
+                    "S": id,
+                },
+            },
+            "TableName": "jobs",
+        },
+        service_response={
+            "Item": {
+                "id": {
+                    "S": id,
+                },
+                "job_status": {
+                    "M": dict(),
+                },
+                "version": {
+                    "N": "1",
+                },
+            },
+        },
+    )
+    dynamodb_stub_folded_running.add_response(
+        "update_item",
+        expected_params={
+            "ConditionExpression": "version = :cv",
+            "ExpressionAttributeValues": {
+                ":cv": {
+                    "N": "1",
+                },
+                ":s": {
+                    "M": {
+                        "consumer_1": {
+                            "M": {
+                                "results": {
+                                    "S": f"I slept for {seconds} seconds",
+                                },
+                                "status": {
+                                    "S": "Success",
+                                },
+                            },
+                        },
+                    },
+                },
+                ":v": {
+                    "N": "2",
+                },
+            },
+            "Key": {
+                "id": {
+                    "S": id,
+                },
+            },
+            "ReturnValues": "UPDATED_NEW",
+            "TableName": "jobs",
+            "UpdateExpression": f"SET job_status=:s, version=:v",
+        },
+        service_response=dict(),
+    )
+
+    yield dynamodb_stub_folded_running
+
+
+@fixture
+def dynamodb_stub_nested_attribute(event_success: dict) -> Stubber:
+    dynamodb_stub_nested_attribute = Stubber(get_job_store().client)
+    id = event_success["Records"][0]["dynamodb"]["NewImage"]["id"]["S"]
+    seconds = event_success["Records"][0]["dynamodb"]["NewImage"]["seconds"]["N"]
+
+    # The Running status is not written over a terminal one
+    dynamodb_stub_nested_attribute.add_response(
+        "update_item",
+        expected_params={
+            "ConditionExpression": ("attribute_exists(id) AND NOT "
+                                    "job_status.#consumer.#status IN "
+                                    "(:terminal_0, :terminal_1)"),
+            "ExpressionAttributeNames": {
+                "#consumer": "consumer_1",
+                "#status": "status",
+            },
+            "ExpressionAttributeValues": {
+                ":one": {
+                    "N": "1",
+                },
+                ":s": {
+                    "M": {
+                        "status": {
+                            "S": "Running",
+                        },
+                    },
+                },
+                ":terminal_0": {
+                    "S": "Failure",
+                },
+                ":terminal_1": {
+                    "S": "Success",
+                },
+            },
+            "Key": {
+                "id": {
+                    "S": id,
+                },
+            },
+            "ReturnValues": "UPDATED_NEW",
+            "TableName": "jobs",
+            "UpdateExpression": ("SET job_status.#consumer=:s "
+                                 "ADD version :one"),
+        },
+        service_response=dict(),
+    )
+
+    dynamodb_stub_nested_attribute.add_response(
+        "update_item",
+        expected_params={
+            "ConditionExpression": "attribute_exists(id)",
+            "ExpressionAttributeNames": {
+                "#consumer": "consumer_1",
+            },
+            "ExpressionAttributeValues": {
+                ":one": {
+                    "N": "1",
+                },
+                ":s": {
+                    "M": {
+                        "results": {
+                            "S": f"I slept for {seconds} seconds",
+                        },
+                        "status": {
+                            "S": "Success",
+                        },
+                    },
+                },
+            },
+            "Key": {
+                "id": {
+                    "S": id,
+                },
+            },
+            "ReturnValues": "UPDATED_NEW",
+            "TableName": "jobs",
+            "UpdateExpression": ("SET job_status.#consumer=:s "
+                                 "ADD version :one"),
+        },
+        service_response=dict(),
+    )
+
+    yield dynamodb_stub_nested_attribute
+
+
+@fixture
+def dynamodb_stub_partial_failure(
+    dynamodb_stub_success: Stubber,
+    event_failure: dict,
+) -> Stubber:
+    dynamodb_stub_partial_failure = dynamodb_stub_success
+    id = event_failure["Records"][0]["dynamodb"]["NewImage"]["id"]["S"]
+
+    dynamodb_stub_partial_failure.add_response(
+        "get_item",
+        expected_params={
+            "Key": {
+                "id": {
+                    "S": id,
+                },
+            },
+            "TableName": "jobs",
+        },
+        service_response={
+            "Item": {
+                "id": {
+                    "S": id,
+                },
+                "job_status": {
+                    "M": dict(),
+                },
+                "version": {
+                    "N": "1",
+                },
+            },
+        },
+    )
+    dynamodb_stub_partial_failure.add_response(
+        "update_item",
+        expected_params={
+            "ConditionExpression": "version = :cv",
+            "ExpressionAttributeValues": {
+                ":cv": {
+                    "N": "1",
+                },
+                ":s": {
+                    "M": {
+                        "consumer_1": {
+                            "M": {
+                                "status": {
+                                    "S": "Running",
+                                },
+                            },
+                        },
+                    },
+                },
+                ":v": {
+                    "N": "2",
+                },
+            },
+            "Key": {
+                "id": {
+                    "S": id,
+                },
+            },
+            "ReturnValues": "UPDATED_NEW",
+            "TableName": "jobs",
+            "UpdateExpression": f"SET job_status=:s, version=:v",
+        },
+        service_response=dict(),
+    )
+
+    yield dynamodb_stub_partial_failure
+
+
 @fixture
 def dynamodb_stub_success(event_success: dict) -> Stubber:
-    dynamodb_stub_success = Stubber(dynamodb)
+    dynamodb_stub_success = Stubber(get_job_store().client)
     id = event_success["Records"][0]["dynamodb"]["NewImage"]["id"]["S"]
     seconds = event_success["Records"][0]["dynamodb"]["NewImage"]["seconds"]["N"]
 
@@ -237,6 +478,7 @@ def event_failure() -> dict:
                             "N": "301",
                         },
                     },
+                    "SequenceNumber": "100000000000000000000000001",
                 },
             },
         ],
@@ -259,6 +501,7 @@ def event_success() -> dict:
                             "N": "1",
                         },
                     },
+                    "SequenceNumber": "100000000000000000000000002",
                 },
             },
         ],
@@ -267,22 +510,480 @@ def event_success() -> dict:
     yield event_success
 
 
+def test_job_processing_checkpointed(monkeypatch: MonkeyPatch) -> None:
+    in_memory_job_store = InMemoryJobStore()
+    item = {
+        "id": {
+            "S": "4",
+        },
+        "job_status": {
+            "M": dict(),
+        },
+        "seconds": {
+            "N": "3",
+        },
+        "version": {
+            "N": "0",
+        },
+    }
+    progresses = []
+
+    monkeypatch.setattr("event_processing.main.CHECKPOINTING", True)
+    monkeypatch.setattr("event_processing.main.job_store", in_memory_job_store)
+    monkeypatch.setattr("event_processing.main.sleep", lambda seconds: None)
+    in_memory_job_store.put_item(item)
+
+    # Every invocation has time for a slice of one second only
+    while item["job_status"]["M"].get("consumer_1", {}).get(
+            "M", {}).get("status") != {"S": "Success"}:
+        context = LambdaContext(
+            client_context=None,
+            cognito_identity=None,
+            epoch_deadline_time_in_ms=int(time() * 1000) + 2500,
+            invoke_id=str(),
+        )
+        event = {
+            "Records": [
+                {
+                    "dynamodb": {
+                        "NewImage": item,
+                        "SequenceNumber": str(len(progresses)),
+                    },
+                },
+            ],
+        }
+
+        assert handler(event, context) == {  # nosec
+            "batchItemFailures": [],
+        }
+
+        item = in_memory_job_store.get_item("4")
+
+        progresses.append(
+            item["job_status"]["M"]["consumer_1"]["M"].get("progress"))
+
+    assert progresses == [{"S": "1"}, {"S": "2"}, None]  # nosec
+
+    # Stale checkpoints are not processed again
+    event["Records"][0]["dynamodb"]["NewImage"]["job_status"]["M"][
+        "consumer_1"] = {
+        "M": {
+            "progress": {
+                "S": "2",
+            },
+            "status": {
+                "S": "Checkpointed",
+            },
+        },
+    }
+
+    handler(event, context)
+
+    assert in_memory_job_store.get_item("4") == item  # nosec
+
+
 def test_job_processing_failure(
     context: LambdaContext,
     dynamodb_stub_failure: Stubber,
     event_failure: dict,
 ) -> None:
-    try:
-        record = event_failure["Records"][0]["dynamodb"]["NewImage"]
-        seconds = record["seconds"]["N"]
-        timeout = int(getenv("TIMEOUT"))
+    sequence_number = event_failure["Records"][0]["dynamodb"]["SequenceNumber"]
+
+    with dynamodb_stub_failure:
+        response = handler(event_failure, context)
+
+    assert response == {  # nosec
+        "batchItemFailures": [
+            {
+                "itemIdentifier": sequence_number,
+            },
+        ],
+    }
+
+
+def test_job_processing_running_status_deferred(
+    context: LambdaContext,
+    dynamodb_stub_success: Stubber,
+    event_success: dict,
+    monkeypatch: MonkeyPatch,
+) -> None:
+    monkeypatch.setattr("event_processing.main.RUNNING_STATUS_THRESHOLD", 0)
+    monkeypatch.setattr("event_processing.main.RUNNING_STATUS_WRITE_POLICY",
+                        "deferred")
+
+    with dynamodb_stub_success:
+        response = handler(event_success, context)
+
+    dynamodb_stub_success.assert_no_pending_responses()
+
+    assert response == {  # nosec
+        "batchItemFailures": [],
+    }
+
+
+@mark.parametrize("running_status_write_policy", [
+    "deferred",
+    "threshold",
+])
+def test_job_processing_running_status_folded(
+    context: LambdaContext,
+    dynamodb_stub_folded_running: Stubber,
+    event_success: dict,
+    monkeypatch: MonkeyPatch,
+    running_status_write_policy: str,
+) -> None:
+    monkeypatch.setattr("event_processing.main.RUNNING_STATUS_WRITE_POLICY",
+                        running_status_write_policy)
+
+    with dynamodb_stub_folded_running:
+        response = handler(event_success, context)
+
+    dynamodb_stub_folded_running.assert_no_pending_responses()
+
+    assert response == {  # nosec
+        "batchItemFailures": [],
+    }
+
+
+def test_job_processing_finished(
+    context: LambdaContext,
+    event_success: dict,
+    monkeypatch: MonkeyPatch,
+) -> None:
+    """
+    A record delivered again once the consumer has finished its job, as
+    after a partial batch failure, does not process the job again.
+    """
+    in_memory_job_store = InMemoryJobStore()
+    item = {
+        "id": {
+            "S": "2",
+        },
+        "job_status": {
+            "M": {
+                "consumer_1": {
+                    "M": {
+                        "results": {
+                            "S": "I slept for 1 seconds",
+                        },
+                        "status": {
+                            "S": "Success",
+                        },
+                    },
+                },
+            },
+        },
+        "seconds": {
+            "N": "1",
+        },
+        "version": {
+            "N": "1",
+        },
+    }
+
+    monkeypatch.setattr("event_processing.main.event_processing", None)
+    monkeypatch.setattr("event_processing.main.job_store", in_memory_job_store)
+    in_memory_job_store.put_item(item)
+
+    response = handler(event_success, context)
+
+    assert response == {  # nosec
+        "batchItemFailures": [],
+    }
+    assert in_memory_job_store.get_item("2") == item  # nosec
+
+
+@mark.parametrize("running_status_write_policy", [
+    "deferred",
+    "threshold",
+])
+def test_job_processing_kinesis_duplicate(
+    context: LambdaContext,
+    monkeypatch: MonkeyPatch,
+    running_status_write_policy: str,
+) -> None:
+    """
+    Kinesis can deliver a record twice, and the job is not processed again
+    even when no Running status is written before it starts.
+    """
+    in_memory_job_store = InMemoryJobStore()
+    processed = []
+    record = {
+        "dynamodb": {
+            "ApproximateCreationDateTime": 1689605602000,
+            "NewImage": {
+                "id": {
+                    "S": "2",
+                },
+                "job_status": {
+                    "M": dict(),
+                },
+                "seconds": {
+                    "N": "1",
+                },
+                "version": {
+                    "N": "0",
+                },
+            },
+        },
+        "eventName": "INSERT",
+    }
+    event = {
+        "Records": [
+            {
+                "kinesis": {
+                    "data": b64encode(dumps(record).encode()).decode(),
+                    "sequenceNumber": sequence_number,
+                },
+            }
+            for sequence_number in [
+                "49640912821178817833517986466168945147",
+                "49640912821178817833517986466168945148",
+            ]
+        ],
+    }
+
+    def event_processing(seconds: int) -> str:
+        processed.append(seconds)
+
+        return f"I slept for {seconds} seconds"
+
+    monkeypatch.setattr("event_processing.main.RUNNING_STATUS_WRITE_POLICY",
+                        running_status_write_policy)
+    monkeypatch.setattr("event_processing.main.TRANSPORT", "kinesis")
+    monkeypatch.setattr(
+        "event_processing.main.event_processing", event_processing)
+    monkeypatch.setattr("event_processing.main.job_store", in_memory_job_store)
+    in_memory_job_store.put_item(record["dynamodb"]["NewImage"])
+
+    response = handler(event, context)
+
+    assert processed == [1]  # nosec
+    assert response == {  # nosec
+        "batchItemFailures": [],
+    }
+    assert in_memory_job_store.get_item("2")["job_status"]["M"][  # nosec
+        "consumer_1"]["M"]["status"] == {"S": "Success"}
+
+
+def test_job_processing_job_order(
+    context: LambdaContext,
+    monkeypatch: MonkeyPatch,
+) -> None:
+    processed = []
+
+    def process_record(record: dict, deadline: float) -> None:
+        sequence_number = record["dynamodb"]["SequenceNumber"]
+
+        sleep(0.01)
+        processed.append(sequence_number)
+
+        if sequence_number == "1":
+            raise ValueError(f"Failed to process {sequence_number}")
+
+    monkeypatch.setattr("event_processing.main.RECORD_CONCURRENCY", 3)
+    monkeypatch.setattr("event_processing.main.process_record", process_record)
+
+    event = {
+        "Records": [
+            {
+                "dynamodb": {
+                    "NewImage": {
+                        "id": {
+                            "S": id,
+                        },
+                    },
+                    "SequenceNumber": sequence_number,
+                },
+            }
+            for id, sequence_number in [("5", "1"), ("6", "2"), ("5", "3")]
+        ],
+    }
+
+    response = handler(event, context)
+
+    # The second record of the failed job is not processed out of order
+    assert processed == ["1", "2"]  # nosec
+    assert response == {  # nosec
+        "batchItemFailures": [
+            {
+                "itemIdentifier": "1",
+            },
+            {
+                "itemIdentifier": "3",
+            },
+        ],
+    }
+
+
+def test_job_processing_metrics(
+    capsys: CaptureFixture,
+    context: LambdaContext,
+    monkeypatch: MonkeyPatch,
+) -> None:
+    in_memory_job_store = InMemoryJobStore()
+    item = {
+        "id": {
+            "S": "5",
+        },
+        "job_status": {
+            "M": dict(),
+        },
+        "seconds": {
+            "N": "0",
+        },
+        "version": {
+            "N": "0",
+        },
+    }
+    event = {
+        "Records": [
+            {
+                "dynamodb": {
+                    "ApproximateCreationDateTime": int(time()) - 2,
+                    "NewImage": item,
+                    "SequenceNumber": "500",
+                    "SizeBytes": 106,
+                },
+            },
+        ],
+    }
+
+    monkeypatch.setattr("event_processing.main.job_store", in_memory_job_store)
+    in_memory_job_store.put_item(item)
+    capsys.readouterr()
+
+    handler(event, context)
+
+    # Embedded metric format objects are the output lines with _aws
+    emf_objects = [
+        loads(line)
+        for line in capsys.readouterr().out.splitlines()
+        if line.startswith("{") and "_aws" in loads(line)
+    ]
+    metrics = {
+        metric["Name"]: emf_object
+        for emf_object in emf_objects
+        for directive in emf_object["_aws"]["CloudWatchMetrics"]
+        for metric in directive["Metrics"]
+    }
+
+    for name in [
+        "BatchSize",
+        "FinalUpsertDuration",
+        "PayloadSize",
+        "ProcessingDuration",
+        "RecordAge",
+        "RunningUpsertDuration",
+        "UpsertAttempts",
+        "UpsertConflicts",
+    ]:
+        assert metrics[name]["consumer"] == "consumer_1"  # nosec
+
+    # The value of a metric is the list of the values added to it
+    assert metrics["BatchSize"]["BatchSize"] == [1.0]  # nosec
+    assert metrics["PayloadSize"]["PayloadSize"] == [106.0]  # nosec
+    assert metrics["RecordAge"]["RecordAge"][0] >= 2000  # nosec
+    assert metrics["Records"]["outcome"] == "Success"  # nosec
+    assert metrics["Records"]["Records"] == [1.0]  # nosec
+    assert metrics["UpsertAttempts"]["UpsertAttempts"] == [2.0]  # nosec
+
+
+def test_job_processing_nested_attribute(
+    context: LambdaContext,
+    dynamodb_stub_nested_attribute: Stubber,
+    event_success: dict,
+    monkeypatch: MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(get_job_store(), "upsert_mode", "nested_attribute")
+
+    with dynamodb_stub_nested_attribute:
+        response = handler(event_success, context)
+
+    dynamodb_stub_nested_attribute.assert_no_pending_responses()
+
+    assert response == {  # nosec
+        "batchItemFailures": [],
+    }
+
+
+def test_job_processing_partial_failure(
+    context: LambdaContext,
+    dynamodb_stub_partial_failure: Stubber,
+    event_failure: dict,
+    event_success: dict,
+) -> None:
+    event = {
+        "Records": event_success["Records"] + event_failure["Records"],
+    }
+    sequence_number = event_failure["Records"][0]["dynamodb"]["SequenceNumber"]
 
-        with dynamodb_stub_failure:
-            handler(event_failure, context)
-    except ValueError as value_error:
-        error_message = value_error.args[0]
+    with dynamodb_stub_partial_failure:
+        response = handler(event, context)
 
-        assert error_message == f"{seconds} major then {timeout}"  # nosec
+    dynamodb_stub_partial_failure.assert_no_pending_responses()
+
+    assert response == {  # nosec
+        "batchItemFailures": [
+            {
+                "itemIdentifier": sequence_number,
+            },
+        ],
+    }
+
+
+def test_job_processing_timeout(event_success: dict) -> None:
+    context = LambdaContext(
+        client_context=None,
+        cognito_identity=None,
+        epoch_deadline_time_in_ms=int(time() * 1000) + 500,
+        invoke_id=str(),
+    )
+    sequence_number = event_success["Records"][0]["dynamodb"]["SequenceNumber"]
+
+    with Stubber(get_job_store().client):
+        response = handler(event_success, context)
+
+    assert response == {  # nosec
+        "batchItemFailures": [
+            {
+                "itemIdentifier": sequence_number,
+            },
+        ],
+    }
+
+
+def test_job_processing_tumbling_window(
+    context: LambdaContext,
+    event_success: dict,
+    monkeypatch: MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(
+        "event_processing.main.process_record",
+        lambda record, deadline: None,
+    )
+
+    event = {
+        **event_success,
+        "isFinalInvokeForWindow": False,
+        "shardId": "shardId-00000000000000000000",
+        "state": {
+            "Success": 1,
+        },
+        "window": {
+            "end": "2023-07-17T15:01:00Z",
+            "start": "2023-07-17T15:00:00Z",
+        },
+    }
+
+    assert handler(event, context) == {  # nosec
+        "batchItemFailures": [],
+        "state": {
+            "Failure": 0,
+            "Success": 2,
+            "Timeout": 0,
+        },
+    }
 
 
 def test_job_processing_success(
@@ -291,4 +992,8 @@ def test_job_processing_success(
     event_success: dict,
 ) -> None:
     with dynamodb_stub_success:
-        handler(event_success, context)
+        response = handler(event_success, context)
+
+    assert response == {  # nosec
+        "batchItemFailures": [],
+    }
@@ -0,0 +1,64 @@
+from tests.harness import (
+    main,
+)
+
+
+def test_harness() -> None:
+    jobs = 40
+    report, _ = main([
+        "--batch-size", "4",
+        "--consumers", "2",
+        "--failure-rate", "0.1",
+        "--jobs", str(jobs),
+        "--time-scale", "0.001",
+    ])
+
+    print(report)
+
+    assert report["completed"] == jobs  # nosec
+    # Only the jobs failed on purpose fail, the other jobs of their batches
+    # keep their Success
+    assert report["failed"] == int(jobs * 0.1)  # nosec
+    assert report["overwritten_successes"] == 0  # nosec
+    assert report["error_handler_invocations"] > 0  # nosec
+    assert report["error_handler_errors"] == 0  # nosec
+    # A submission, then a Running and a final status per consumer, except
+    # for the failed jobs, which time out before they are Running and only
+    # get the Failure status of the error handler
+    assert report["write_amplification"] == (  # nosec
+        jobs * 5 - int(jobs * 0.1) * 2) / jobs
+
+
+def test_harness_parallelization_factor() -> None:
+    """
+    One in every ten jobs lasts 200 times longer than the others, and blocks
+    the jobs behind it in its shard unless they are in another lane.
+    """
+    jobs = 40
+    reports = {}
+
+    for parallelization_factor in [1, 4]:
+        report, _ = main([
+            "--consumers", "1",
+            "--jobs", str(jobs),
+            "--parallelization-factor", str(parallelization_factor),
+            "--shards", "1",
+            "--slow-rate", "0.1",
+            "--slow-seconds", "200",
+            "--time-scale", "0.001",
+        ])
+
+        reports[parallelization_factor] = report
+
+        print(
+            f"parallelization factor {parallelization_factor}: "
+            f"p50 {report['p50_milliseconds']:.1f} ms, "
+            f"p99 {report['p99_milliseconds']:.1f} ms"
+        )
+
+    for report in reports.values():
+        assert report["completed"] == jobs  # nosec
+        assert report["failed"] == 0  # nosec
+
+    assert reports[4][  # nosec
+        "p50_milliseconds"] < reports[1]["p50_milliseconds"]
@@ -5,11 +5,14 @@ from aws_cdk import (
     App,
 )
 from aws_cdk.assertions import (
+    Annotations,
     Match,
     Template,
 )
 from pytest import (
     fixture,
+    mark,
+    raises,
 )
 
 
@@ -25,6 +28,205 @@ def template() -> Template:
     yield template
 
 
+@fixture
+def template_archive() -> Template:
+    app = App()
+    stack = InfrastructureStack(
+        app,
+        "AsynchronousProcessingAPIGatewayDynamoDBStream",
+        archive=True,
+        consumers=1,
+        description="Asynchronous Processing with API Gateway and DynamoDB Streams",
+        job_retention_days=30)
+    template_archive = Template.from_stack(stack)
+
+    yield template_archive
+
+
+@fixture
+def template_archive_kinesis() -> Template:
+    app = App()
+    stack = InfrastructureStack(
+        app,
+        "AsynchronousProcessingAPIGatewayDynamoDBStream",
+        archive=True,
+        description="Asynchronous Processing with API Gateway and DynamoDB Streams",
+        job_retention_days=30,
+        transport="kinesis")
+    template_archive_kinesis = Template.from_stack(stack)
+
+    yield template_archive_kinesis
+
+
+@fixture
+def template_autoscaling() -> Template:
+    app = App()
+    stack = InfrastructureStack(
+        app,
+        "AsynchronousProcessingAPIGatewayDynamoDBStream",
+        description="Asynchronous Processing with API Gateway and DynamoDB Streams",
+        max_read_capacity=50,
+        max_write_capacity=100,
+        target_utilization=60)
+    template_autoscaling = Template.from_stack(stack)
+
+    yield template_autoscaling
+
+
+@fixture
+def template_cached() -> Template:
+    app = App()
+    stack = InfrastructureStack(
+        app,
+        "AsynchronousProcessingAPIGatewayDynamoDBStream",
+        cache_ttl=300,
+        description="Asynchronous Processing with API Gateway and DynamoDB Streams")
+    template_cached = Template.from_stack(stack)
+
+    yield template_cached
+
+
+@fixture
+def template_on_demand() -> Template:
+    app = App()
+    stack = InfrastructureStack(
+        app,
+        "AsynchronousProcessingAPIGatewayDynamoDBStream",
+        billing_mode="pay_per_request",
+        description="Asynchronous Processing with API Gateway and DynamoDB Streams")
+    template_on_demand = Template.from_stack(stack)
+
+    yield template_on_demand
+
+
+@fixture
+def template_parallelized() -> Template:
+    app = App()
+    stack = InfrastructureStack(
+        app,
+        "AsynchronousProcessingAPIGatewayDynamoDBStream",
+        description="Asynchronous Processing with API Gateway and DynamoDB Streams",
+        max_batching_window=5,
+        parallelization_factor=10,
+        tumbling_window=60)
+    template_parallelized = Template.from_stack(stack)
+
+    yield template_parallelized
+
+
+@fixture
+def template_status_index() -> Template:
+    app = App()
+    stack = InfrastructureStack(
+        app,
+        "AsynchronousProcessingAPIGatewayDynamoDBStream",
+        description="Asynchronous Processing with API Gateway and DynamoDB Streams",
+        max_write_capacity=100,
+        status_index=True)
+    template_status_index = Template.from_stack(stack)
+
+    yield template_status_index
+
+
+@fixture
+def template_kinesis() -> Template:
+    app = App()
+    stack = InfrastructureStack(
+        app,
+        "AsynchronousProcessingAPIGatewayDynamoDBStream",
+        consumers=4,
+        description="Asynchronous Processing with API Gateway and DynamoDB Streams",
+        transport="kinesis")
+    template_kinesis = Template.from_stack(stack)
+
+    yield template_kinesis
+
+
+@fixture
+def template_notifications() -> Template:
+    app = App()
+    stack = InfrastructureStack(
+        app,
+        "AsynchronousProcessingAPIGatewayDynamoDBStream",
+        description="Asynchronous Processing with API Gateway and DynamoDB Streams",
+        notifications=True)
+    template_notifications = Template.from_stack(stack)
+
+    yield template_notifications
+
+
+def test_jobs_api_cache_is_setup(template_cached: Template) -> None:
+    template_cached.has_resource("AWS::ApiGateway::Method", {
+        "Properties": {
+            "HttpMethod": "GET",
+            "Integration": Match.object_like({
+                "CacheKeyParameters": [
+                    "method.request.path.jobId",
+                ],
+                "IntegrationResponses": [
+                    Match.object_like({
+                        "ResponseTemplates": {
+                            "application/json": Match.string_like_regexp(
+                                "#set\\(\\$cacheTtl = 300\\)"),
+                        },
+                    }),
+                ],
+            }),
+            "MethodResponses": Match.array_with([
+                Match.object_like({
+                    "ResponseParameters": {
+                        "method.response.header.Cache-Control": True,
+                        "method.response.header.Content-Type": True,
+                    },
+                    "StatusCode": "202",
+                }),
+            ]),
+            "RequestParameters": {
+                "method.request.path.jobId": True,
+            },
+        },
+    })
+    template_cached.has_resource("AWS::ApiGateway::Stage", {
+        "Properties": {
+            "CacheClusterEnabled": True,
+            "CacheClusterSize": "0.5",
+            "MethodSettings": Match.array_with([
+                Match.object_like({
+                    "CacheDataEncrypted": True,
+                    "CacheTtlInSeconds": 300,
+                    "CachingEnabled": True,
+                    "HttpMethod": "GET",
+                    "ResourcePath": "/~1jobs~1{jobId}",
+                }),
+                Match.object_like({
+                    "CachingEnabled": False,
+                    "HttpMethod": "GET",
+                    "ResourcePath": "/~1jobs~1{jobId}~1status",
+                }),
+            ]),
+        },
+    })
+    template_cached.has_resource("AWS::ApiGateway::Method", {
+        "Properties": {
+            "HttpMethod": "GET",
+            "Integration": Match.object_like({
+                "CacheKeyParameters": Match.absent(),
+                "IntegrationResponses": [
+                    Match.object_like({
+                        "ResponseTemplates": {
+                            "application/json": Match.string_like_regexp(
+                                "#set\\(\\$cacheTtl = 0\\)"),
+                        },
+                    }),
+                ],
+            }),
+            "RequestParameters": {
+                "method.request.path.jobId": True,
+            },
+        },
+    })
+
+
 def test_jobs_api_is_setup(template: Template) -> None:
     template.has_resource("AWS::ApiGateway::Method", {
         "Properties": {
@@ -137,12 +339,140 @@ def test_jobs_api_is_setup(template: Template) -> None:
     template.resource_count_is("AWS::ApiGateway::Account", 1)
 
 
+def test_jobs_batch_api_is_setup(template: Template) -> None:
+    template.has_resource("AWS::ApiGateway::Method", {
+        "Properties": {
+            "AuthorizationType": "AWS_IAM",
+            "HttpMethod": "POST",
+            "Integration": Match.object_like({
+                "IntegrationResponses": [
+                    Match.object_like({
+                        "ResponseTemplates": {
+                            "application/json": Match.string_like_regexp(
+                                "\\$response.Error.Code"),
+                        },
+                    }),
+                ],
+                "RequestTemplates": {
+                    "application/json": Match.object_like({
+                        "Fn::Join": [
+                            "",
+                            Match.array_with([
+                                Match.string_like_regexp(
+                                    "\"Statement\": \"INSERT INTO"),
+                            ]),
+                        ],
+                    }),
+                },
+                "Uri": Match.object_like({
+                    "Fn::Join": [
+                        "",
+                        Match.array_with([
+                            ":dynamodb:action/BatchExecuteStatement",
+                        ]),
+                    ],
+                }),
+            }),
+        },
+    })
+    template.has_resource("AWS::IAM::Policy", {
+        "Properties": {
+            "PolicyDocument": {
+                "Statement": Match.array_with([
+                    Match.object_like({
+                        "Action": "dynamodb:PartiQLInsert",
+                    }),
+                ]),
+            },
+        },
+    })
+    template.has_resource("AWS::ApiGateway::Model", {
+        "Properties": {
+            "Name": "JobsBatchRequest",
+            "Schema": Match.object_like({
+                "properties": {
+                    "jobs": Match.object_like({
+                        "maxItems": 25,
+                    }),
+                },
+            }),
+        },
+    })
+    template.has_resource("AWS::ApiGateway::Resource", {
+        "Properties": {
+            "PathPart": "batch",
+        },
+    })
+
+
+def test_jobs_status_api_is_setup(template: Template) -> None:
+    template.has_resource("AWS::ApiGateway::Method", {
+        "Properties": {
+            "AuthorizationType": "AWS_IAM",
+            "HttpMethod": "POST",
+            "Integration": Match.object_like({
+                "IntegrationResponses": [
+                    Match.object_like({
+                        "ResponseTemplates": {
+                            "application/json": Match.string_like_regexp(
+                                "\"unprocessed\""),
+                        },
+                    }),
+                ],
+                "Uri": Match.object_like({
+                    "Fn::Join": [
+                        "",
+                        Match.array_with([
+                            ":dynamodb:action/BatchGetItem",
+                        ]),
+                    ],
+                }),
+            }),
+        },
+    })
+    template.has_resource("AWS::ApiGateway::Model", {
+        "Properties": {
+            "Name": "JobsStatusRequest",
+            "Schema": Match.object_like({
+                "properties": {
+                    "ids": Match.object_like({
+                        "maxItems": 100,
+                        "uniqueItems": True,
+                    }),
+                },
+                "required": [
+                    "ids",
+                ],
+            }),
+        },
+    })
+    template.has_resource("AWS::ApiGateway::RequestValidator", {
+        "Properties": {
+            "ValidateRequestBody": True,
+            "ValidateRequestParameters": True,
+        },
+    })
+    template.has_resource("AWS::ApiGateway::Resource", {
+        "Properties": {
+            "PathPart": "status",
+        },
+    })
+
+
 def test_jobs_functions_are_setup(template: Template) -> None:
     template.has_resource("AWS::Events::Archive", {
         "Properties": {
             "RetentionDays": 0,
         },
     })
+    template.has_resource("AWS::Lambda::EventSourceMapping", {
+        "Properties": {
+            "BatchSize": 1,
+            "FunctionResponseTypes": [
+                "ReportBatchItemFailures",
+            ],
+        },
+    })
     template.has_resource("AWS::Lambda::Function", {
         "Properties": {
             "Timeout": 300,
@@ -154,9 +484,324 @@ def test_jobs_functions_are_setup(template: Template) -> None:
         },
     })
     template.resource_count_is("AWS::Events::EventBus", 1)
+    template.resource_count_is("AWS::Lambda::LayerVersion", 2)
     template.resource_count_is("AWS::Lambda::EventInvokeConfig", 2)
 
 
+def test_jobs_kinesis_transport_is_setup(template_kinesis: Template) -> None:
+    template_kinesis.has_resource("AWS::DynamoDB::Table", {
+        "Properties": Match.object_like({
+            "KinesisStreamSpecification": Match.object_like({
+                "StreamArn": Match.any_value(),
+            }),
+            "StreamSpecification": Match.absent(),
+        }),
+    })
+    template_kinesis.has_resource("AWS::Lambda::EventSourceMapping", {
+        "Properties": Match.object_like({
+            "EventSourceArn": {
+                "Fn::GetAtt": [
+                    Match.string_like_regexp("Consumer4StreamConsumer"),
+                    "ConsumerARN",
+                ],
+            },
+            "FilterCriteria": {
+                "Filters": [
+                    {
+                        "Pattern": Match.string_like_regexp(
+                            "\"data\":{\"eventName\":\\[\"INSERT\"\\]}"),
+                    },
+                ],
+            },
+        }),
+    })
+    template_kinesis.has_resource("AWS::Lambda::Function", {
+        "Properties": {
+            "Environment": {
+                "Variables": Match.object_like({
+                    "TRANSPORT": "kinesis",
+                }),
+            },
+        },
+    })
+    template_kinesis.resource_count_is("AWS::Kinesis::Stream", 1)
+    template_kinesis.resource_count_is("AWS::Kinesis::StreamConsumer", 4)
+    template_kinesis.resource_count_is("AWS::Lambda::EventSourceMapping", 4)
+
+
+def test_jobs_parallelization_is_setup(
+    template_parallelized: Template,
+) -> None:
+    template_parallelized.has_resource("AWS::Lambda::EventSourceMapping", {
+        "Properties": Match.object_like({
+            "MaximumBatchingWindowInSeconds": 5,
+            "ParallelizationFactor": 10,
+            "TumblingWindowInSeconds": 60,
+        }),
+    })
+
+
+@mark.parametrize("parameters", [
+    {
+        "parallelization_factor": 0,
+    },
+    {
+        "parallelization_factor": 11,
+    },
+    {
+        "tumbling_window": -1,
+    },
+    {
+        "tumbling_window": 901,
+    },
+])
+def test_jobs_parallelization_is_validated(parameters: dict) -> None:
+    with raises(ValueError):
+        InfrastructureStack(
+            App(),
+            "AsynchronousProcessingAPIGatewayDynamoDBStream",
+            description="Asynchronous Processing with API Gateway and DynamoDB Streams",
+            **parameters)
+
+
+def test_jobs_notifications_are_setup(
+    template_notifications: Template,
+) -> None:
+    template_notifications.has_resource("AWS::Lambda::Function", {
+        "Properties": {
+            "Environment": {
+                "Variables": Match.object_like({
+                    "CONSUMERS": "2",
+                    "NOTIFICATION_EVENT_BUS_NAME": Match.any_value(),
+                }),
+            },
+        },
+    })
+    template_notifications.resource_count_is("AWS::Events::EventBus", 2)
+
+
+def test_jobs_table_archive_is_setup(template_archive: Template) -> None:
+    template_archive.has_resource("AWS::DynamoDB::Table", {
+        "Properties": Match.object_like({
+            "StreamSpecification": {
+                "StreamViewType": "NEW_AND_OLD_IMAGES",
+            },
+            "TimeToLiveSpecification": {
+                "AttributeName": "expires_at",
+                "Enabled": True,
+            },
+        }),
+    })
+    template_archive.has_resource("AWS::Lambda::EventSourceMapping", {
+        "Properties": Match.object_like({
+            "BatchSize": 100,
+            "FilterCriteria": {
+                "Filters": [
+                    {
+                        "Pattern": Match.string_like_regexp(
+                            "dynamodb.amazonaws.com"),
+                    },
+                ],
+            },
+            "MaximumBatchingWindowInSeconds": 60,
+        }),
+    })
+    template_archive.has_resource("AWS::Lambda::Function", {
+        "Properties": {
+            "Environment": {
+                "Variables": Match.object_like({
+                    "RETENTION_SECONDS": "2592000",
+                }),
+            },
+        },
+    })
+    template_archive.has_resource("AWS::S3::Bucket", {
+        "Properties": Match.object_like({
+            "LifecycleConfiguration": {
+                "Rules": [
+                    Match.object_like({
+                        "Transitions": [
+                            {
+                                "StorageClass": "GLACIER",
+                                "TransitionInDays": 0,
+                            },
+                        ],
+                    }),
+                ],
+            },
+        }),
+    })
+
+
+def test_jobs_table_archive_kinesis_is_setup(
+    template_archive_kinesis: Template,
+) -> None:
+    template_archive_kinesis.has_resource("AWS::DynamoDB::Table", {
+        "Properties": Match.object_like({
+            "StreamSpecification": Match.absent(),
+        }),
+    })
+    template_archive_kinesis.has_resource("AWS::Lambda::EventSourceMapping", {
+        "Properties": Match.object_like({
+            "EventSourceArn": {
+                "Fn::GetAtt": [
+                    Match.string_like_regexp("JobsStream"),
+                    "Arn",
+                ],
+            },
+            "FilterCriteria": {
+                "Filters": [
+                    {
+                        "Pattern": Match.string_like_regexp(
+                            "\"data\":{\"eventName\":\\[\"REMOVE\"\\]"),
+                    },
+                ],
+            },
+        }),
+    })
+
+
+def test_jobs_table_archive_readers_are_warned() -> None:
+    # Two consumers and the archive read each shard of the stream
+    stack = InfrastructureStack(
+        App(),
+        "AsynchronousProcessingAPIGatewayDynamoDBStream",
+        archive=True,
+        description="Asynchronous Processing with API Gateway and DynamoDB Streams",
+        job_retention_days=30)
+
+    Annotations.from_stack(stack).has_warning(
+        "*",
+        Match.string_like_regexp("3 readers of the DynamoDB stream"),
+    )
+
+
+def test_jobs_table_autoscaling_is_setup(
+    template_autoscaling: Template,
+) -> None:
+    for dimension, max_capacity in [
+        ("dynamodb:table:ReadCapacityUnits", 50),
+        ("dynamodb:table:WriteCapacityUnits", 100),
+    ]:
+        template_autoscaling.has_resource(
+            "AWS::ApplicationAutoScaling::ScalableTarget", {
+                "Properties": Match.object_like({
+                    "MaxCapacity": max_capacity,
+                    "MinCapacity": 5,
+                    "ScalableDimension": dimension,
+                    "ServiceNamespace": "dynamodb",
+                }),
+            })
+    template_autoscaling.has_resource(
+        "AWS::ApplicationAutoScaling::ScalingPolicy", {
+            "Properties": Match.object_like({
+                "PolicyType": "TargetTrackingScaling",
+                "TargetTrackingScalingPolicyConfiguration": Match.object_like({
+                    "PredefinedMetricSpecification": {
+                        "PredefinedMetricType":
+                        "DynamoDBReadCapacityUtilization",
+                    },
+                    "TargetValue": 60,
+                }),
+            }),
+        })
+    template_autoscaling.has_resource(
+        "AWS::ApplicationAutoScaling::ScalingPolicy", {
+            "Properties": Match.object_like({
+                "PolicyType": "TargetTrackingScaling",
+                "TargetTrackingScalingPolicyConfiguration": Match.object_like({
+                    "PredefinedMetricSpecification": {
+                        "PredefinedMetricType":
+                        "DynamoDBWriteCapacityUtilization",
+                    },
+                    "TargetValue": 60,
+                }),
+            }),
+        })
+    template_autoscaling.resource_count_is(
+        "AWS::ApplicationAutoScaling::ScalingPolicy", 2)
+
+
+def test_jobs_table_on_demand_is_setup(template_on_demand: Template) -> None:
+    template_on_demand.has_resource("AWS::DynamoDB::Table", {
+        "Properties": Match.object_like({
+            "BillingMode": "PAY_PER_REQUEST",
+            "ProvisionedThroughput": Match.absent(),
+        }),
+    })
+    template_on_demand.resource_count_is(
+        "AWS::ApplicationAutoScaling::ScalableTarget", 0)
+
+
+def test_jobs_table_status_index_is_setup(
+    template_status_index: Template,
+) -> None:
+    template_status_index.has_resource("AWS::ApiGateway::Method", {
+        "Properties": Match.object_like({
+            "AuthorizationType": "AWS_IAM",
+            "HttpMethod": "GET",
+            "Integration": Match.object_like({
+                "Uri": Match.object_like({
+                    "Fn::Join": [
+                        "",
+                        Match.array_with([
+                            ":dynamodb:action/Query",
+                        ]),
+                    ],
+                }),
+            }),
+            "RequestParameters": {
+                "method.request.querystring.cursor": False,
+                "method.request.querystring.limit": False,
+                "method.request.querystring.since": False,
+                "method.request.querystring.status": True,
+            },
+        }),
+    })
+    template_status_index.has_resource("AWS::ApiGateway::RequestValidator", {
+        "Properties": {
+            "ValidateRequestBody": False,
+            "ValidateRequestParameters": True,
+        },
+    })
+    template_status_index.has_resource(
+        "AWS::ApplicationAutoScaling::ScalableTarget", {
+            "Properties": Match.object_like({
+                "ResourceId": Match.object_like({
+                    "Fn::Join": [
+                        "",
+                        Match.array_with([
+                            "/index/StatusIndex",
+                        ]),
+                    ],
+                }),
+                "ScalableDimension": "dynamodb:index:WriteCapacityUnits",
+            }),
+        })
+    template_status_index.has_resource("AWS::DynamoDB::Table", {
+        "Properties": Match.object_like({
+            "GlobalSecondaryIndexes": [
+                Match.object_like({
+                    "IndexName": "StatusIndex",
+                    "KeySchema": [
+                        {
+                            "AttributeName": "overall_status",
+                            "KeyType": "HASH",
+                        },
+                        {
+                            "AttributeName": "submitted_at",
+                            "KeyType": "RANGE",
+                        },
+                    ],
+                    "Projection": {
+                        "ProjectionType": "KEYS_ONLY",
+                    },
+                }),
+            ],
+        }),
+    })
+
+
 def test_jobs_table_is_setup(template: Template) -> None:
     template.has_resource("AWS::DynamoDB::Table", {
         "DeletionPolicy": "Delete",
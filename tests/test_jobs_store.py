@@ -0,0 +1,373 @@
+from boto3 import (
+    client,
+)
+from botocore.stub import (
+    Stubber,
+)
+from concurrent.futures import (
+    ThreadPoolExecutor,
+)
+from contextlib import (
+    contextmanager,
+)
+from jobs_store.backoff import (
+    backoff,
+)
+from jobs_store.codec import (
+    ConsumerStatus,
+)
+from jobs_store.dynamodb import (
+    DynamoDBJobStore,
+)
+from jobs_store.exceptions import (
+    ConditionalCheckFailedError,
+    JobNotFoundError,
+)
+from jobs_store.memory import (
+    InMemoryJobStore,
+)
+from jobs_store.tracing import (
+    NoOpTracer,
+)
+from pytest import (
+    fixture,
+    mark,
+    raises,
+)
+from time import (
+    time,
+)
+from typing import (
+    Iterator,
+)
+
+
+class RecordingTracer(NoOpTracer):
+    def __init__(self) -> None:
+        self.subsegments = []
+
+    @contextmanager
+    def subsegment(self, name: str, **annotations) -> Iterator[None]:
+        self.subsegments.append((name, annotations))
+
+        yield
+
+
+@fixture
+def dynamodb_job_store() -> DynamoDBJobStore:
+    dynamodb_job_store = DynamoDBJobStore(
+        client("dynamodb"),
+        "jobs",
+        backoff_strategy="capped_exponential",
+        optimistic_locking_retry_attempts=2,
+    )
+
+    yield dynamodb_job_store
+
+
+@fixture
+def dynamodb_stub_conflict(dynamodb_job_store: DynamoDBJobStore) -> Stubber:
+    dynamodb_stub_conflict = Stubber(dynamodb_job_store.client)
+    id = "1"
+
+    for version in ["1", "2"]:
+        dynamodb_stub_conflict.add_response(
+            "get_item",
+            expected_params={
+                "Key": {
+                    "id": {
+                        "S": id,
+                    },
+                },
+                "TableName": "jobs",
+            },
+            service_response={
+                "Item": {
+                    "id": {
+                        "S": id,
+                    },
+                    "job_status": {
+                        "M": dict(),
+                    },
+                    "version": {
+                        "N": version,
+                    },
+                },
+            },
+        )
+
+        if version == "1":
+            dynamodb_stub_conflict.add_client_error(
+                "update_item",
+                service_error_code="ConditionalCheckFailedException",
+            )
+        else:
+            dynamodb_stub_conflict.add_response(
+                "update_item",
+                service_response=dict(),
+            )
+
+    yield dynamodb_stub_conflict
+
+
+@fixture
+def in_memory_job_store() -> InMemoryJobStore:
+    in_memory_job_store = InMemoryJobStore(
+        backoff_strategy="none",
+        optimistic_locking_retry_attempts=1000,
+    )
+
+    in_memory_job_store.put_item({
+        "id": {
+            "S": "1",
+        },
+        "job_status": {
+            "M": dict(),
+        },
+        "seconds": {
+            "N": "1",
+        },
+        "version": {
+            "N": "0",
+        },
+    })
+
+    yield in_memory_job_store
+
+
+@mark.parametrize("strategy", [
+    "capped_exponential",
+    "decorrelated_jitter",
+    "full_jitter",
+    "none",
+])
+def test_backoff(strategy: str) -> None:
+    delay = backoff(strategy, 1, 0.05, base=0.05, cap=1.0)
+
+    for retry in range(2, 20):
+        delay = backoff(strategy, retry, delay, base=0.05, cap=1.0)
+
+        assert 0 <= delay <= 1.0  # nosec
+
+
+def test_backoff_unsupported_strategy() -> None:
+    with raises(ValueError):
+        backoff("linear", 1, 0.05, base=0.05, cap=1.0)
+
+
+def test_dynamodb_upsert_conflict(
+    dynamodb_job_store: DynamoDBJobStore,
+    dynamodb_stub_conflict: Stubber,
+) -> None:
+    with dynamodb_stub_conflict:
+        dynamodb_job_store.upsert(
+            "1",
+            "consumer_1",
+            ConsumerStatus(status="Running"),
+        )
+
+    assert dynamodb_job_store.statistics["attempts"] == 2  # nosec
+    assert dynamodb_job_store.statistics["conflicts"] == 1  # nosec
+    assert dynamodb_job_store.statistics["wait_seconds"] > 0  # nosec
+
+
+def test_dynamodb_upsert_conflict_traced(
+    dynamodb_job_store: DynamoDBJobStore,
+    dynamodb_stub_conflict: Stubber,
+) -> None:
+    dynamodb_job_store.tracer = RecordingTracer()
+
+    with dynamodb_stub_conflict:
+        dynamodb_job_store.upsert(
+            "1",
+            "consumer_1",
+            ConsumerStatus(status="Running"),
+        )
+
+    assert dynamodb_job_store.tracer.subsegments == [  # nosec
+        ("get_job", {"job_id": "1", "retry": 0}),
+        ("update_job_status", {"job_id": "1", "retry": 0}),
+        ("get_job", {"job_id": "1", "retry": 1}),
+        ("update_job_status", {"job_id": "1", "retry": 1}),
+    ]
+
+
+@mark.parametrize("upsert_mode", [
+    "nested_attribute",
+    "optimistic_locking",
+])
+def test_in_memory_overall_status(
+    in_memory_job_store: InMemoryJobStore,
+    upsert_mode: str,
+) -> None:
+    in_memory_job_store.consumer_ids = ["consumer_1", "consumer_2"]
+    in_memory_job_store.upsert_mode = upsert_mode
+
+    for consumer_id, status, overall_status in [
+        ("consumer_1", "Running", "Running"),
+        ("consumer_1", "Success", "Running"),
+        ("consumer_2", "Failure", "Failure"),
+    ]:
+        in_memory_job_store.upsert(
+            "1", consumer_id, ConsumerStatus(status=status))
+
+        item = in_memory_job_store.get_item("1")
+
+        assert item["overall_status"]["S"] == overall_status  # nosec
+
+
+@mark.parametrize("upsert_mode", [
+    "nested_attribute",
+    "optimistic_locking",
+])
+def test_in_memory_retention(
+    in_memory_job_store: InMemoryJobStore,
+    upsert_mode: str,
+) -> None:
+    in_memory_job_store.consumer_ids = ["consumer_1", "consumer_2"]
+    in_memory_job_store.retention_seconds = 3600
+    in_memory_job_store.upsert_mode = upsert_mode
+
+    # The job does not expire while consumer_2 is still processing it
+    for consumer_id, status in [
+        ("consumer_1", "Running"),
+        ("consumer_2", "Running"),
+        ("consumer_1", "Success"),
+    ]:
+        in_memory_job_store.upsert(
+            "1", consumer_id, ConsumerStatus(status=status))
+
+        assert "expires_at" not in in_memory_job_store.get_item(  # nosec
+            "1")
+
+    in_memory_job_store.upsert(
+        "1", "consumer_2", ConsumerStatus(status="Success"))
+
+    expires_at = int(in_memory_job_store.get_item("1")["expires_at"]["N"])
+
+    assert 0 < expires_at - time() <= 3600  # nosec
+
+
+def test_retention_requires_consumer_ids() -> None:
+    with raises(ValueError):
+        InMemoryJobStore(retention_seconds=3600)
+
+
+@mark.parametrize("upsert_mode", [
+    "nested_attribute",
+    "optimistic_locking",
+])
+def test_in_memory_unless_finished(
+    in_memory_job_store: InMemoryJobStore,
+    upsert_mode: str,
+) -> None:
+    in_memory_job_store.upsert_mode = upsert_mode
+
+    for status, upserted in [
+        ("Running", True),
+        ("Success", True),
+        ("Failure", False),
+    ]:
+        assert in_memory_job_store.upsert(  # nosec
+            "1",
+            "consumer_1",
+            ConsumerStatus(status=status),
+            unless_finished=True,
+        ) == upserted
+
+    assert in_memory_job_store.get_item("1")["job_status"]["M"][  # nosec
+        "consumer_1"]["M"]["status"] == {"S": "Success"}
+
+    # A job that does not exist is not mistaken for a finished one
+    with raises(JobNotFoundError):
+        in_memory_job_store.upsert(
+            "2",
+            "consumer_1",
+            ConsumerStatus(status="Failure"),
+            unless_finished=True,
+        )
+
+
+@mark.parametrize("upsert_mode", [
+    "nested_attribute",
+    "optimistic_locking",
+])
+def test_in_memory_unless_in_flight(
+    in_memory_job_store: InMemoryJobStore,
+    upsert_mode: str,
+) -> None:
+    in_memory_job_store.upsert_mode = upsert_mode
+
+    for status, upserted in [
+        (None, False),
+        ("Running", False),
+        ("Checkpointed", True),
+    ]:
+        if status is not None:
+            in_memory_job_store.upsert(
+                "1", "consumer_1", ConsumerStatus(status=status))
+
+        assert in_memory_job_store.upsert(  # nosec
+            "1",
+            "consumer_1",
+            ConsumerStatus(status="Failure"),
+            unless_in_flight=True,
+        ) == upserted
+
+    assert in_memory_job_store.get_item("1")["job_status"]["M"][  # nosec
+        "consumer_1"]["M"]["status"] == {"S": "Failure"}
+
+
+def test_in_memory_version_condition(
+    in_memory_job_store: InMemoryJobStore,
+) -> None:
+    job = in_memory_job_store.get_job("1")
+
+    in_memory_job_store.update_job_status("1", job.job_status, job.version)
+
+    with raises(ConditionalCheckFailedError):
+        in_memory_job_store.update_job_status(
+            "1", job.job_status, job.version)
+
+    with raises(ConditionalCheckFailedError):
+        in_memory_job_store.update_consumer_status(
+            "2", "consumer_1", ConsumerStatus(status="Running"))
+
+    with raises(JobNotFoundError):
+        in_memory_job_store.get_job("2")
+
+
+@mark.parametrize("upsert_mode", [
+    "nested_attribute",
+    "optimistic_locking",
+])
+def test_in_memory_concurrent_upserts(
+    in_memory_job_store: InMemoryJobStore,
+    upsert_mode: str,
+) -> None:
+    consumers = 8
+    upserts = 50
+    in_memory_job_store.upsert_mode = upsert_mode
+
+    def upsert_consumer(consumer_id: str) -> None:
+        for upsert in range(upserts):
+            in_memory_job_store.upsert(
+                "1",
+                consumer_id,
+                ConsumerStatus(results=str(upsert), status="Running"),
+            )
+
+    with ThreadPoolExecutor(max_workers=consumers) as executor:
+        list(executor.map(
+            upsert_consumer,
+            [f"consumer_{consumer}" for consumer in range(consumers)],
+        ))
+
+    job = in_memory_job_store.get_job("1")
+
+    assert job.version == consumers * upserts  # nosec
+    assert len(job.job_status) == consumers  # nosec
+    assert all(  # nosec
+        status.results == str(upserts - 1)
+        for status in job.job_status.values()
+    )
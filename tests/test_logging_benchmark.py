@@ -0,0 +1,101 @@
+from awslambdaric.lambda_context import (
+    LambdaContext,
+)
+from event_processing.main import (
+    handler,
+)
+from jobs_store.memory import (
+    InMemoryJobStore,
+)
+from pytest import (
+    MonkeyPatch,
+    fixture,
+)
+from tests.fixtures import (
+    context,
+)
+from time import (
+    perf_counter,
+)
+
+RECORDS = 64
+ROUNDS = 5
+
+
+@fixture
+def event() -> dict:
+    event = {
+        "Records": [
+            {
+                "dynamodb": {
+                    "NewImage": {
+                        "id": {
+                            "S": str(record),
+                        },
+                        "seconds": {
+                            "N": "0",
+                        },
+                    },
+                    "SequenceNumber": str(record),
+                },
+            }
+            for record in range(RECORDS)
+        ],
+    }
+
+    yield event
+
+
+@fixture
+def job_store(event: dict) -> InMemoryJobStore:
+    job_store = InMemoryJobStore(backoff_strategy="none")
+
+    for record in event["Records"]:
+        job_store.put_item({
+            **record["dynamodb"]["NewImage"],
+            "job_status": {
+                "M": dict(),
+            },
+            "version": {
+                "N": "0",
+            },
+        })
+
+    yield job_store
+
+
+def test_logging_benchmark(
+    context: LambdaContext,
+    event: dict,
+    job_store: InMemoryJobStore,
+    monkeypatch: MonkeyPatch,
+) -> None:
+    monkeypatch.setattr("event_processing.main.job_store", job_store)
+    monkeypatch.setattr("jobs_store.logs.LOG_LEVEL", "INFO")
+
+    wall_clock_seconds = {}
+
+    for name, debug_sample_rate in [("off", 0.0), ("on", 1.0)]:
+        monkeypatch.setattr("jobs_store.logs.DEBUG_SAMPLE_RATE",
+                            debug_sample_rate)
+
+        rounds = []
+
+        for _ in range(ROUNDS):
+            start = perf_counter()
+            response = handler(event, context)
+            rounds.append(perf_counter() - start)
+
+            assert response == {  # nosec
+                "batchItemFailures": [],
+            }
+
+        wall_clock_seconds[name] = min(rounds)
+
+        print(
+            f"debug logging {name:>3}: "
+            f"{wall_clock_seconds[name] * 1000:.1f} ms "
+            f"per batch of {RECORDS} records"
+        )
+
+    assert wall_clock_seconds["off"] < wall_clock_seconds["on"]  # nosec
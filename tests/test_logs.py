@@ -0,0 +1,58 @@
+from jobs_store.logs import (
+    Payload,
+    sample_log_level,
+)
+from logging import (
+    DEBUG,
+    INFO,
+    getLogger,
+)
+from pytest import (
+    MonkeyPatch,
+)
+
+
+def test_payload_redacted(monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setattr("jobs_store.logs.LOG_REDACTED_KEYS",
+                        frozenset(["NewImage"]))
+
+    payload = {
+        "Records": [
+            {
+                "dynamodb": {
+                    "NewImage": {
+                        "id": {
+                            "S": "1",
+                        },
+                    },
+                    "SequenceNumber": "1",
+                },
+            },
+        ],
+    }
+
+    assert str(Payload(payload)) == (  # nosec
+        '{"Records": [{"dynamodb": {"NewImage": "***", '
+        '"SequenceNumber": "1"}}]}')
+
+
+def test_payload_truncated(monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setattr("jobs_store.logs.LOG_MAX_PAYLOAD_BYTES", 10)
+
+    assert str(Payload("x" * 100)) == (  # nosec
+        '"xxxxxxxxx... (102 bytes truncated)')
+
+
+def test_sample_log_level(monkeypatch: MonkeyPatch) -> None:
+    logger = getLogger(__name__)
+
+    monkeypatch.setattr("jobs_store.logs.LOG_LEVEL", "INFO")
+    monkeypatch.setattr("jobs_store.logs.DEBUG_SAMPLE_RATE", 1.0)
+    sample_log_level(logger)
+
+    assert logger.level == DEBUG  # nosec
+
+    monkeypatch.setattr("jobs_store.logs.DEBUG_SAMPLE_RATE", 0.0)
+    sample_log_level(logger)
+
+    assert logger.level == INFO  # nosec
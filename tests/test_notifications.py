@@ -0,0 +1,244 @@
+from boto3 import (
+    client,
+)
+from botocore.exceptions import (
+    ClientError,
+)
+from botocore.stub import (
+    Stubber,
+)
+from concurrent.futures import (
+    ThreadPoolExecutor,
+)
+from jobs_store.codec import (
+    ConsumerStatus,
+)
+from jobs_store.memory import (
+    InMemoryJobStore,
+)
+from jobs_store.metrics import (
+    MetricsBuffer,
+)
+from jobs_store.notifications import (
+    CompletionNotifier,
+    LazyCompletionNotifier,
+)
+from jobs_store.tracing import (
+    NoOpTracer,
+)
+from logging import (
+    getLogger,
+)
+from json import (
+    dumps,
+)
+from pytest import (
+    fixture,
+    raises,
+)
+from time import (
+    sleep,
+)
+
+
+@fixture
+def completion_notifier() -> CompletionNotifier:
+    job_store = InMemoryJobStore()
+
+    job_store.put_item({
+        "id": {
+            "S": "1",
+        },
+        "job_status": {
+            "M": dict(),
+        },
+        "seconds": {
+            "N": "1",
+        },
+        "version": {
+            "N": "0",
+        },
+    })
+
+    completion_notifier = CompletionNotifier(
+        client("events"),
+        ["consumer_1", "consumer_2"],
+        "jobs",
+        job_store,
+    )
+
+    yield completion_notifier
+
+
+def test_claim_notification(completion_notifier: CompletionNotifier) -> None:
+    job_store = completion_notifier.job_store
+    consumer_ids = completion_notifier.consumer_ids
+
+    job_store.update_consumer_status(
+        "1", "consumer_1", ConsumerStatus(status="Success"))
+    job_store.update_consumer_status(
+        "1", "consumer_2", ConsumerStatus(status="Running"))
+
+    assert job_store.claim_notification("1", consumer_ids) is None  # nosec
+
+    job_store.update_consumer_status(
+        "1", "consumer_2", ConsumerStatus(status="Failure"))
+
+    job = job_store.claim_notification("1", consumer_ids)
+
+    assert job is not None and job.id == "1"  # nosec
+    assert job_store.claim_notification("1", consumer_ids) is None  # nosec
+    assert job_store.claim_notification("2", consumer_ids) is None  # nosec
+
+
+def test_notify(completion_notifier: CompletionNotifier) -> None:
+    job_store = completion_notifier.job_store
+
+    for consumer_id in completion_notifier.consumer_ids:
+        job_store.update_consumer_status(
+            "1",
+            consumer_id,
+            ConsumerStatus(results="I slept for 1 seconds", status="Success"),
+        )
+
+    with Stubber(completion_notifier.client) as events_stub:
+        events_stub.add_response(
+            "put_events",
+            expected_params={
+                "Entries": [
+                    {
+                        "Detail": dumps({
+                            "id": "1",
+                            "job_status": {
+                                consumer_id: {
+                                    "results": "I slept for 1 seconds",
+                                    "status": "Success",
+                                }
+                                for consumer_id in
+                                completion_notifier.consumer_ids
+                            },
+                        }),
+                        "DetailType": "Job Finished",
+                        "EventBusName": "jobs",
+                        "Resources": [],
+                        "Source": "jobs",
+                    },
+                ],
+            },
+            service_response={
+                "Entries": [
+                    {
+                        "EventId": "1",
+                    },
+                ],
+                "FailedEntryCount": 0,
+            },
+        )
+
+        assert completion_notifier.notify("1")  # nosec
+        assert not completion_notifier.notify("1")  # nosec
+
+        events_stub.assert_no_pending_responses()
+
+
+def test_notify_failed_entry(completion_notifier: CompletionNotifier) -> None:
+    job_store = completion_notifier.job_store
+
+    for consumer_id in completion_notifier.consumer_ids:
+        job_store.update_consumer_status(
+            "1", consumer_id, ConsumerStatus(status="Failure"))
+
+    with Stubber(completion_notifier.client) as events_stub:
+        events_stub.add_response(
+            "put_events",
+            service_response={
+                "Entries": [
+                    {
+                        "ErrorCode": "InternalFailure",
+                    },
+                ],
+                "FailedEntryCount": 1,
+            },
+        )
+
+        with raises(RuntimeError):
+            completion_notifier.notify("1")
+
+        # The claim is released, so that the retry sends the event
+        assert "notified" not in job_store.get_item("1")  # nosec
+
+        events_stub.add_response(
+            "put_events",
+            service_response={
+                "Entries": [
+                    {
+                        "EventId": "1",
+                    },
+                ],
+                "FailedEntryCount": 0,
+            },
+        )
+
+        assert completion_notifier.notify("1")  # nosec
+        assert "notified" in job_store.get_item("1")  # nosec
+
+
+def test_lazy_completion_notifier(
+    completion_notifier: CompletionNotifier,
+) -> None:
+    created = []
+    job_store = completion_notifier.job_store
+    metrics_buffer = MetricsBuffer()
+
+    def create_completion_notifier() -> CompletionNotifier:
+        created.append(completion_notifier)
+
+        return completion_notifier
+
+    lazy_completion_notifier = LazyCompletionNotifier(
+        create_completion_notifier,
+        logger=getLogger(__name__),
+        metrics_buffer=metrics_buffer,
+        tracer=NoOpTracer(),
+    )
+
+    for consumer_id in completion_notifier.consumer_ids:
+        job_store.update_consumer_status(
+            "1", consumer_id, ConsumerStatus(status="Success"))
+
+    with Stubber(completion_notifier.client) as events_stub:
+        events_stub.add_client_error("put_events")
+
+        with raises(ClientError):
+            lazy_completion_notifier.notify("1")
+
+        lazy_completion_notifier.notify("2")
+
+    assert len(created) == 1  # nosec
+    assert [name for name, _, _ in metrics_buffer.metrics] == [  # nosec
+        "NotificationFailures",
+    ]
+
+
+def test_lazy_completion_notifier_concurrent() -> None:
+    """
+    Concurrent first notifications create the notifier once.
+    """
+    created = []
+
+    def create_completion_notifier() -> None:
+        created.append(None)
+        sleep(0.01)
+
+    lazy_completion_notifier = LazyCompletionNotifier(
+        create_completion_notifier,
+        logger=getLogger(__name__),
+        metrics_buffer=MetricsBuffer(),
+        tracer=NoOpTracer(),
+    )
+
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        for id in range(10):
+            executor.submit(lazy_completion_notifier.notify, str(id))
+
+    assert len(created) == 1  # nosec
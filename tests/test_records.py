@@ -0,0 +1,44 @@
+from base64 import (
+    b64encode,
+)
+from jobs_store.records import (
+    decode_record,
+)
+from json import (
+    dumps,
+)
+
+
+def test_decode_record() -> None:
+    stream_record = {
+        "dynamodb": {
+            "ApproximateCreationDateTime": 1689605602,
+            "NewImage": {
+                "id": {
+                    "S": "1",
+                },
+            },
+            "SequenceNumber": "100",
+        },
+        "eventName": "INSERT",
+    }
+    kinesis_record = {
+        "eventSource": "aws:kinesis",
+        "kinesis": {
+            "data": b64encode(dumps({
+                "dynamodb": {
+                    "ApproximateCreationDateTime": 1689605602000,
+                    "NewImage": {
+                        "id": {
+                            "S": "1",
+                        },
+                    },
+                },
+                "eventName": "INSERT",
+            }).encode()).decode(),
+            "sequenceNumber": "100",
+        },
+    }
+
+    assert decode_record(stream_record) is stream_record  # nosec
+    assert decode_record(kinesis_record) == stream_record  # nosec